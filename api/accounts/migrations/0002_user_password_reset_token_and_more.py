@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-16 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='password_reset_token',
+            field=models.CharField(blank=True, max_length=128, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='password_reset_token_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
 import os
+import shutil
+import tempfile
 from django.urls import reverse
 from rest_framework.test import APITestCase # type: ignore
 from rest_framework import status # type: ignore
@@ -7,9 +9,14 @@ from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import RefreshToken # type: ignore
 from ..models import User
 from django.core.cache import cache
+from django.test import override_settings
+
+# Uploaded files are written here instead of the project's media root
+MEDIA_ROOT = tempfile.mkdtemp()
 
 User = get_user_model()
 
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
 class UserSignupTests(APITestCase):
     """
     Test suite for user signup functionality.
@@ -26,6 +33,11 @@ class UserSignupTests(APITestCase):
             Tests that attempting to sign up with invalid data returns a 400 status code and appropriate error message.
     """
 
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
     def setUp(self):
         self.signup_url = reverse('signup_user')
         cache.clear()
@@ -60,11 +72,17 @@ class UserSignupTests(APITestCase):
         self.assertIn('errors', response.data)
 
 
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
 class BusinessOwnerSignupTests(APITestCase):
     """
     Test suite for business owner signup functionality.
     """
 
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
     def setUp(self):
         self.signup_url = reverse('signup_business_owner')
         self.image_path = os.path.join(os.path.dirname(__file__), 'media', 'test_1.png')
@@ -50,7 +50,13 @@ env = environ.Env(
     DEFAULT_FROM_EMAIL=(str, ''),
     EMAIL_SUBJECT_PREFIX=(str, '[Sudamall] '),
     EMAIL_TIMEOUT=(int, 5),
-    FRONTEND_ACTIVATION_URL=(str, '')
+    FRONTEND_ACTIVATION_URL=(str, ''),
+    HOT_STOCK_ENABLED=(bool, False),
+    HOT_STOCK_INCLUDE_ACTIVE_OFFERS=(bool, False),
+    HOT_STOCK_SYNC_SECONDS=(int, 30),
+    STOCK_RESERVATION_TTL_MINUTES=(int, 15),
+    PRODUCT_LIST_CACHE_SECONDS=(int, 300),
+    SEARCH_INDEX_DELAY_SECONDS=(int, 2),
 )
 
 # Quick-start development (settings - unsuitable for production
@@ -171,6 +177,8 @@ ELASTICSEARCH_DSL = {
         'hosts': os.getenv("ELASTICSEARCH_URL", "elasticsearch://elasticsearch:9200")
     },
 }
+# Index changes from a Celery task instead of within the request
+ELASTICSEARCH_DSL_SIGNAL_PROCESSOR = 'search.signals.QueuedSignalProcessor'
 
 
 CACHES = {
@@ -238,6 +246,7 @@ CELERY_IMPORTS = (
     "authentication.tasks",
     "notifications.tasks",
     "accounts.tasks",
+    "products.tasks",
 )
 
 # Set Celery to use the same time zone as Django
@@ -258,8 +267,45 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'users.celery_tasks.clean_expired_blacklisted_tokens',
         'schedule': crontab(minute='*',),  # Runs at the start of every hour
     },
+    'sync_hot_stock': {
+        'task': 'products.tasks.sync_hot_stock_task',
+        'schedule': timedelta(seconds=env('HOT_STOCK_SYNC_SECONDS')),
+    },
+    'release_expired_reservations_every_minute': {
+        'task': 'products.tasks.release_expired_reservations_task',
+        'schedule': crontab(minute='*',),
+    },
+    'refresh_offer_pricing_every_minute': {
+        'task': 'products.tasks.refresh_offer_pricing_task',
+        'schedule': crontab(minute='*',),
+    },
 }
 
+#### HOT STOCK ####
+# Reserve the stock of hot products (flagged or, optionally, on an active
+# offer) in Redis and write it back to the database in batches.
+HOT_STOCK_ENABLED = env('HOT_STOCK_ENABLED')
+HOT_STOCK_INCLUDE_ACTIVE_OFFERS = env('HOT_STOCK_INCLUDE_ACTIVE_OFFERS')
+# Interval of the sync that loads and unloads them (see `sync_hot_stock`)
+HOT_STOCK_SYNC_SECONDS = env('HOT_STOCK_SYNC_SECONDS')
+
+#### STOCK RESERVATIONS ####
+# Lifetime of a stock hold before the expiry sweep returns it to stock
+STOCK_RESERVATION_TTL_MINUTES = env('STOCK_RESERVATION_TTL_MINUTES')
+
+#### PRODUCT LIST CACHE ####
+# Lifetime of cached product list responses; entries are also invalidated
+# whenever a product, size, offer or stock level changes. 0 disables the cache.
+PRODUCT_LIST_CACHE_SECONDS = env('PRODUCT_LIST_CACHE_SECONDS')
+if 'test' in sys.argv or 'pytest' in sys.argv:
+    # Tests enable it explicitly
+    PRODUCT_LIST_CACHE_SECONDS = 0
+
+#### SEARCH INDEX ####
+# Changed products are re-indexed in one batch this many seconds after
+# their first change; later changes within the window join that batch.
+SEARCH_INDEX_DELAY_SECONDS = env('SEARCH_INDEX_DELAY_SECONDS')
+
 # (Optional) Track started tasks
 CELERY_TRACK_STARTED = True
 
@@ -525,6 +571,11 @@ LOGGING = {
             'level': 'DEBUG',  # Set to DEBUG for detailed logs
             'propagate': False,
         },
+        'products_tasks': {
+            'handlers': ['file', 'console'],
+            'level': 'DEBUG',  # Set to DEBUG for detailed logs
+            'propagate': False,
+        },
         'notifications_models': {
            'handlers': ['file', 'console'],
             'level': 'DEBUG',  # Set to DEBUG for detailed logs
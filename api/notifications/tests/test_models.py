@@ -1,9 +1,21 @@
+import shutil
+import tempfile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.utils import timezone
 from ..models import EmailTemplate, EmailAttachment, EmailImage, EmailStyle
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
+# Uploaded files are written here instead of the project's media root
+MEDIA_ROOT = tempfile.mkdtemp()
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
 class EmailModelsTestCase(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
     def test_email_template_creation(self):
         html_file = SimpleUploadedFile("template.html", b"<html></html>", content_type="text/html")
         plain_file = SimpleUploadedFile("template.txt", b"plain text", content_type="text/plain")
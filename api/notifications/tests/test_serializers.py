@@ -1,4 +1,6 @@
 import io
+import shutil
+import tempfile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.exceptions import ValidationError
 from ..serializers import (
@@ -13,18 +15,28 @@ from ..models import (
     EmailStyle,
     EmailTemplate,
 )
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from io import BytesIO
 from PIL import Image
 
+# Uploaded files are written here instead of the project's media root
+MEDIA_ROOT = tempfile.mkdtemp()
+
 def get_test_image():
     image = BytesIO()
     Image.new("RGB", (10, 10)).save(image, format="JPEG")
     image.seek(0)
     return SimpleUploadedFile("img.jpg", image.read(), content_type="image/jpeg")
 
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
 class TestSerializersUnityTestCase(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
     def setUp(self):
         # Use a unique name for each test run
         self.template = EmailTemplate.objects.create(
@@ -1,15 +1,27 @@
+import shutil
 import tempfile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
+from django.test import override_settings
 from notifications.models import EmailTemplate
 from notifications.serializers import EmailTemplateSerializer
 
+# Uploaded files are written here instead of the project's media root
+MEDIA_ROOT = tempfile.mkdtemp()
+
 User = get_user_model()
 
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
 class EmailTemplateViewSetTestCase(APITestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
     def setUp(self):
         self.admin_user = User.objects.create_superuser(
             email='admin@example.com', password='password123'
@@ -4,7 +4,7 @@ from django.utils.html import mark_safe
 from django.contrib import admin
 from .models import (
     Category, Tag, Product, ProductHistory, Offer,
-    Size
+    Size, StockReservation, ProductImport, MediaFile
 )
 
 
@@ -33,11 +33,16 @@ class ProductAdmin(admin.ModelAdmin):
     inlines = [SizeInline]
     list_display = [
         "id", "product_name", "category", "price",
-        "available_quantity", "has_sizes", "is_deleted"
+        "available_quantity", "has_sizes", "availability_status", "is_deleted"
+    ]
+    list_filter = [
+        "category", "has_sizes", "availability_status", "hot_stock", "is_deleted"
     ]
-    list_filter = ["category", "has_sizes", "is_deleted"]
     search_fields = ["product_name", "brand", "category"]
-    readonly_fields = ["created_at", "updated_at", "image_preview"]
+    readonly_fields = [
+        "created_at", "updated_at", "image_preview",
+        "availability_status", "active_sizes_count", "in_stock_sizes_count"
+    ]
 
     def get_fields(self, request, obj=None):
         fields = [field.name for field in self.model._meta.fields]
@@ -99,3 +104,30 @@ class SizeAdmin(admin.ModelAdmin):
     list_filter = ["is_deleted"]
     search_fields = ["product__product_name", "size"]
     readonly_fields = ["deleted_at"]
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = [
+        "id", "product", "size", "quantity", "status", "expires_at", "released_at"
+    ]
+    list_filter = ["status"]
+    search_fields = ["product__product_name", "size"]
+    readonly_fields = ["created_at", "released_at"]
+
+
+@admin.register(ProductImport)
+class ProductImportAdmin(admin.ModelAdmin):
+    list_display = [
+        "id", "owner", "store", "file_format", "status",
+        "processed_rows", "created_count", "error_count", "created_at"
+    ]
+    list_filter = ["status", "file_format"]
+    readonly_fields = ["created_at", "finished_at"]
+
+
+@admin.register(MediaFile)
+class MediaFileAdmin(admin.ModelAdmin):
+    search_fields = ["name"]
+    list_display = ["id", "name", "references", "created_at"]
+    readonly_fields = ["name", "references", "created_at"]
@@ -0,0 +1,41 @@
+# products/management/commands/audit_hot_stock.py
+from django.core.management.base import BaseCommand
+from products.services.hot_stock_service import HotStockService
+
+
+class Command(BaseCommand):
+    help = "Compare the Redis hot-stock counters with the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconcile', action='store_true',
+                            help='Write pending deltas to the database before auditing')
+        parser.add_argument('--fix', action='store_true',
+                            help='Refresh inconsistent Redis counters from the database')
+
+    def handle(self, *args, **options):
+        if options['reconcile']:
+            written = HotStockService.reconcile()
+            self.stdout.write(f"Reconciled {written} hot stock rows.")
+
+        rows = HotStockService.audit()
+        inconsistent = [row for row in rows if not row['consistent']]
+        for row in rows:
+            line = (f"{row['member']}: redis={row['redis_available']}/{row['redis_reserved']} "
+                    f"pending={row['pending_available']}/{row['pending_reserved']} "
+                    f"db={row['db_available']}/{row['db_reserved']}")
+            if row['consistent']:
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.ERROR(f"{line} MISMATCH"))
+
+        if inconsistent and options['fix']:
+            HotStockService.resync(
+                {HotStockService.parse_member(row['member'])[0] for row in inconsistent})
+            self.stdout.write(self.style.WARNING(
+                f"Resynced {len(inconsistent)} hot stock rows from the database."))
+        elif inconsistent:
+            self.stdout.write(self.style.ERROR(
+                f"{len(inconsistent)} of {len(rows)} hot stock rows are inconsistent."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"All {len(rows)} hot stock rows are consistent."))
@@ -0,0 +1,60 @@
+# products/management/commands/deduplicate_media.py
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products.models import MediaFile, Product, ProductHistory
+from products.storage import ContentAddressedStorage, product_media_storage
+
+
+class Command(BaseCommand):
+    help = ("Move product and history pictures stored before content addressing into "
+            "the deduplicated storage, then recount the references of every stored file")
+
+    def handle(self, *args, **options):
+        storage = product_media_storage()
+        prefix = f"{ContentAddressedStorage.PREFIX}/"
+        products = list(Product.objects.all_with_deleted().values_list(
+            "id", "picture", "picture_variants"))
+        legacy = {picture for _, picture, _ in products}
+        legacy.update(name for _, _, variants in products for name in variants.values())
+        legacy.update(ProductHistory.objects.values_list("picture", flat=True))
+        legacy = sorted(name for name in legacy if name and not name.startswith(prefix))
+
+        moved = {}
+        legacy_bytes = 0
+        for name in legacy:
+            if not storage.exists(name):
+                self.stderr.write(f"Missing file, left as is: {name}")
+                continue
+            legacy_bytes += storage.size(name)
+            with storage.open(name, "rb") as f:
+                moved[name] = storage.save(name, File(f))
+
+        # Products whose history is up to date stay so after the rename
+        product_ids = [pk for pk, picture, variants in products
+                       if picture in moved or moved.keys() & set(variants.values())]
+        up_to_date = {
+            pk for pk, values in ProductHistory.tracked_values_many(product_ids).items()
+            if values["history_fingerprint"] == ProductHistory.compute_fingerprint(values)
+        }
+        with transaction.atomic():
+            for old, new in moved.items():
+                Product.objects.all_with_deleted().filter(picture=old).update(picture=new)
+                ProductHistory.objects.filter(picture=old).update(picture=new)
+            Product.objects.all_with_deleted().bulk_update([
+                Product(pk=pk, picture_variants={
+                    key: moved.get(name, name) for key, name in variants.items()})
+                for pk, _, variants in products if moved.keys() & set(variants.values())
+            ], ["picture_variants"], batch_size=1000)
+            Product.objects.all_with_deleted().bulk_update([
+                Product(pk=pk, history_fingerprint=ProductHistory.compute_fingerprint(values))
+                for pk, values in ProductHistory.tracked_values_many(up_to_date).items()
+            ], ["history_fingerprint"], batch_size=1000)
+            referenced = MediaFile.objects.rebuild()
+            transaction.on_commit(lambda: [storage.delete(name) for name in moved])
+
+        stored_bytes = sum(storage.size(name) for name in set(moved.values()))
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {len(moved)} files ({legacy_bytes // 1024} KB) into "
+            f"{len(set(moved.values()))} stored files ({stored_bytes // 1024} KB); "
+            f"{referenced} files referenced."))
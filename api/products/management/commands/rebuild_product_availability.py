@@ -0,0 +1,17 @@
+# products/management/commands/rebuild_product_availability.py
+from django.core.management.base import BaseCommand
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized availability state and size counters of all products"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of products written per bulk update')
+
+    def handle(self, *args, **options):
+        updated = Product.objects.all_with_deleted().refresh_availability(
+            batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt availability for {updated} products."))
@@ -1,5 +1,6 @@
 # products/management/commands/seed_products.py
 import random
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.db import connection
 from django.contrib.auth.hashers import make_password
@@ -138,5 +139,8 @@ class Command(BaseCommand):
                             VALUES (%s, %s, %s, 0);
                         """, [product_id, size, size_quantity])
 
+        # Raw inserts bypass the model, so derive the availability state afterwards
+        call_command('rebuild_product_availability', stdout=self.stdout)
+
         self.stdout.write(self.style.SUCCESS(
             f"Successfully seeded {count} products with sizes, brands, prices, and quantities!"))
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.1 on 2026-10-16 20:31
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_availability(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    products = Product.objects.annotate(
+        active_sizes=Count('sizes', filter=Q(sizes__is_deleted=False)),
+        in_stock_sizes=Count('sizes', filter=Q(sizes__is_deleted=False,
+                                               sizes__available_quantity__gt=0)),
+    )
+    batch = []
+    for product in products.iterator(chunk_size=1000):
+        product.active_sizes_count = product.active_sizes
+        product.in_stock_sizes_count = product.in_stock_sizes
+        if product.has_sizes:
+            if not product.active_sizes or not product.in_stock_sizes:
+                status = 'unavailable'
+            elif product.in_stock_sizes >= product.active_sizes:
+                status = 'available'
+            else:
+                status = 'partially_available'
+        else:
+            status = 'available' if (product.available_quantity or 0) > 0 else 'unavailable'
+        product.availability_status = status
+        batch.append(product)
+        if len(batch) >= 1000:
+            Product.objects.bulk_update(
+                batch, ['availability_status', 'active_sizes_count', 'in_stock_sizes_count'])
+            batch = []
+    if batch:
+        Product.objects.bulk_update(
+            batch, ['availability_status', 'active_sizes_count', 'in_stock_sizes_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='active_sizes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='availability_status',
+            field=models.CharField(choices=[('available', 'Available'), ('partially_available', 'Partially available'), ('unavailable', 'Unavailable')], db_index=True, default='unavailable', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='in_stock_sizes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_availability, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-16 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_availability_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='hot_stock',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-16 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_history_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producthistory',
+            index=models.Index(fields=['product', 'recorded_at'], name='history_product_recorded_idx'),
+        ),
+    ]
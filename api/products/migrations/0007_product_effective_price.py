@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-16 21:20
+
+from django.db import migrations, models
+from django.db.models import Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+
+def backfill_effective_price(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Offer = apps.get_model('products', 'Offer')
+    current_time = now()
+    active_offer = Offer.objects.filter(
+        product=OuterRef('pk'), start_date__lte=current_time, end_date__gte=current_time)
+    Product.objects.update(
+        has_active_offer=Exists(active_offer),
+        effective_price=Coalesce(Subquery(active_offer.values('offer_price')[:1]), F('price')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_producthistory_product_recorded_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='has_active_offer',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.RunPython(backfill_effective_price, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, editable=False, max_digits=10),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-16 22:58
+
+import products.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_picture_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('references', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='picture',
+            field=models.ImageField(storage=products.storage.product_media_storage, upload_to='products/'),
+        ),
+        migrations.AlterField(
+            model_name='producthistory',
+            name='picture',
+            field=models.ImageField(storage=products.storage.product_media_storage, upload_to='history/products/'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.1 on 2026-10-17 00:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_mediafile_content_addressed_storage'),
+        ('stores', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_category_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_class_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_store_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_category_price_idx',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, editable=False, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='has_active_offer',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_deleted', 'created_at'], name='product_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_deleted', 'category', 'created_at'], name='product_category_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_deleted', 'classification', 'created_at'], name='product_class_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_deleted', 'store', 'created_at'], name='product_store_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_deleted', 'effective_price', 'has_active_offer'], name='product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_deleted', 'category', 'effective_price'], name='product_category_price_idx'),
+        ),
+    ]
@@ -1,12 +1,18 @@
+import hashlib
+import json
 import logging
-from typing import Literal
+from collections import Counter
+from typing import Literal, Optional
 from django.conf import settings
-from django.db import models
-from accounts.models import User
+from django.db import models, transaction
+from accounts.models import Cart, User
 from stores.models import Store
 from django.core.exceptions import ValidationError
 from django.utils.timezone import now
-from django.db.models import Q, Count, F
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from products.services.listing_cache_service import invalidate_product_listings
+from products.storage import ContentAddressedStorage, product_media_storage
 
 
 class Category(models.Model):
@@ -16,8 +22,28 @@ class Category(models.Model):
         return str(self.name)
 
 
+class TagManager(models.Manager):
+    def resolve(self, names) -> dict:
+        """
+        Map tag names to ids with one query, bulk-creating the missing tags.
+        """
+        names = set(names)
+        if not names:
+            return {}
+        tags = dict(self.filter(name__in=names).values_list("name", "id"))
+        missing = names - tags.keys()
+        if missing:
+            # Ids are not returned on MySQL, and a concurrent writer may
+            # have created some of the tags: read them back.
+            self.bulk_create([Tag(name=name) for name in missing],
+                             ignore_conflicts=True)
+            tags.update(self.filter(name__in=missing).values_list("name", "id"))
+        return tags
+
+
 class Tag(models.Model):
     name = models.CharField(max_length=255, unique=True)
+    objects = TagManager()
 
     def __str__(self):
         return str(self.name)
@@ -25,96 +51,124 @@ class Tag(models.Model):
 
 class ProductQuerySet(models.QuerySet):
     def alive(self):
-        return self.filter(is_deleted=False)
+        # A Value renders `is_deleted = false` instead of `NOT is_deleted`,
+        # which can seek the (is_deleted, ...) indexes of the list queries
+        return self.filter(is_deleted=Value(False))
 
     def deleted(self):
         return self.filter(is_deleted=True)
 
     def delete(self):
-        return super().update(is_deleted=True)
+        # Imported here: the history and search index services import this module
+        from products.services.history_service import enqueue_product_history
+        from products.services.search_index_service import enqueue_product_indexing
+        product_ids = list(self.values_list("pk", flat=True))
+        updated = super().update(is_deleted=True)
+        enqueue_product_history(product_ids)
+        invalidate_product_listings()
+        enqueue_product_indexing(product_ids)
+        return updated
 
     def hard_delete(self):
+        # Picture files are released by the post_delete signal; history
+        # snapshots keep their own reference on them.
         for product in self:
             product.history.update(product=None)
-            if product.picture:
-                product.picture.delete(save=False)
         return super().delete()
 
-    def available(self):
-        # Products that do not have sizes and have available_quantity > 0
-        no_size_available = Q(
-            has_sizes=False,
-            available_quantity__gt=0
+    def refresh_availability(self, batch_size=1000):
+        """
+        Recount the non-deleted sizes of every product in the queryset and
+        persist the size counters and availability state with bulk updates.
+        Returns the number of products written.
+        """
+        fields = ["availability_status",
+                  "active_sizes_count", "in_stock_sizes_count"]
+        products = self.annotate(
+            active_sizes=Count(
+                "sizes", filter=Q(sizes__is_deleted=False)),
+            in_stock_sizes=Count(
+                "sizes", filter=Q(sizes__is_deleted=False,
+                                  sizes__available_quantity__gt=0)),
+        ).only("id", "has_sizes", "available_quantity", *fields)
+
+        batch = []
+        updated = 0
+        reindexed = []
+        for product in products.iterator(chunk_size=batch_size):
+            if product.in_stock_sizes_count != product.in_stock_sizes:
+                # A size went in or out of stock
+                reindexed.append(product.pk)
+            product.active_sizes_count = product.active_sizes
+            product.in_stock_sizes_count = product.in_stock_sizes
+            product.availability_status = product.compute_availability_status()
+            if product.availability_status != product._loaded_availability_status:
+                reindexed.append(product.pk)
+            batch.append(product)
+            if len(batch) >= batch_size:
+                Product.objects.all_with_deleted().bulk_update(batch, fields)
+                updated += len(batch)
+                batch = []
+        if batch:
+            Product.objects.all_with_deleted().bulk_update(batch, fields)
+            updated += len(batch)
+        if updated:
+            invalidate_product_listings()
+        if reindexed:
+            # Imported here: the search index service imports this module
+            from products.services.search_index_service import enqueue_product_indexing
+            enqueue_product_indexing(reindexed)
+        return updated
+
+    def refresh_pricing(self, current_time=None):
+        """
+        Recompute the stored `effective_price` and `has_active_offer` of
+        every product in the queryset with a single UPDATE.
+        Returns the number of products written.
+        """
+        current_time = current_time or now()
+        active_offer = Offer.objects.filter(
+            product=OuterRef("pk"),
+            start_date__lte=current_time,
+            end_date__gte=current_time,
         )
-
-        # Products with sizes: All non-deleted sizes have available_quantity > 0
-        with_sizes_available = Q(has_sizes=True) & ~Q(
-            id__in=Product.objects.filter(
-                has_sizes=True
-            ).annotate(
-                unavailable_sizes=Count(
-                    'sizes',
-                    filter=Q(sizes__is_deleted=False,
-                             sizes__available_quantity__lte=0)
-                )
-            ).filter(unavailable_sizes__gt=0).values_list("id", flat=True)
+        updated = self.update(
+            has_active_offer=Exists(active_offer),
+            effective_price=Coalesce(
+                Subquery(active_offer.values("offer_price")[:1]), F("price")),
         )
+        if updated:
+            invalidate_product_listings()
+        return updated
 
-        return self.filter(no_size_available | with_sizes_available)
-
-    def unavailable(self):
-        # Products that do not have sizes and have available_quantity <= 0
-        no_size_unavailable = Q(
-            has_sizes=False,
-            available_quantity__lte=0
+    def with_stale_pricing(self, current_time=None):
+        """
+        Products whose offer started or ended since their pricing was
+        last refreshed.
+        """
+        current_time = current_time or now()
+        offer_active = Q(offer__start_date__lte=current_time,
+                         offer__end_date__gte=current_time)
+        return self.filter(
+            Q(offer_active, has_active_offer=False)
+            | Q(~offer_active, has_active_offer=True)
         )
 
-        # Products with sizes: All non-deleted sizes have available_quantity <= 0
-        with_sizes_unavailable = Q(
-            id__in=Product.objects.filter(
-                has_sizes=True
-            ).annotate(
-                total_active_sizes=Count(
-                    'sizes',
-                    filter=Q(sizes__is_deleted=False)
-                ),
-                sizes_with_stock=Count(
-                    'sizes',
-                    filter=Q(sizes__is_deleted=False,
-                             sizes__available_quantity__gt=0)
-                ),
-            ).filter(
-                total_active_sizes__gt=0,
-                sizes_with_stock=0
-            ).values_list('id', flat=True)
-        )
+    def for_listing(self):
+        """
+        Load everything `ProductSerializer` reads in a constant number of
+        queries: the offer is joined and sizes and tags are prefetched.
+        """
+        return self.select_related("offer").prefetch_related("sizes", "tags")
 
-        return self.filter(no_size_unavailable | with_sizes_unavailable)
+    def available(self):
+        return self.filter(availability_status=Product.AVAILABLE)
+
+    def unavailable(self):
+        return self.filter(availability_status=Product.UNAVAILABLE)
 
     def partially_available(self):
-        # Products with sizes
-        return self.filter(
-            id__in=Product.objects.filter(
-                has_sizes=True
-            ).annotate(
-                total_active_sizes=Count(
-                    'sizes',
-                    filter=Q(sizes__is_deleted=False)
-                ),
-                sizes_with_stock=Count(
-                    'sizes',
-                    filter=Q(sizes__is_deleted=False,
-                             sizes__available_quantity__gt=0)
-                ),
-            ).filter(
-                total_active_sizes__gt=0,
-            ).exclude(
-                sizes_with_stock=0  # exclude products with all sizes unavailable
-            ).exclude(
-                # exclude products with all sizes available
-                sizes_with_stock=F('total_active_sizes')
-            ).values_list('id', flat=True)
-        )
+        return self.filter(availability_status=Product.PARTIALLY_AVAILABLE)
 
 
 class ProductManager(models.Manager):
@@ -126,6 +180,9 @@ class ProductManager(models.Manager):
         # Explicit access to deleted + alive
         return ProductQuerySet(self.model, using=self._db)
 
+    def for_listing(self):
+        return self.get_queryset().for_listing()
+
     def available(self):
         return self.get_queryset().available()
 
@@ -148,6 +205,9 @@ class Product(models.Model):
         product_description (TextField): A detailed textual description of the product.
         price (DecimalField): The original price of the product (maximum 10 digits, 2 decimal places).
         picture (ImageField): Image of the product, uploaded to the 'products/' directory.
+        picture_variants (JSONField): Storage paths of the resized JPEG/WebP copies of
+        the picture by variant name, written by `process_product_picture_task`.
+        Empty until the current picture has been processed.
         color (CharField): Optional color of the product (max length 50).
         available_quantity (int): Quantity currently available for purchase.
         Only applicable when `has_sizes` is False.
@@ -159,9 +219,25 @@ class Product(models.Model):
         store (ForeignKey): Reference to the Store where the product is listed.
         created_at (DateTimeField): Timestamp marking when the product was created (auto-set on creation).
         tags (ManyToManyField): Tags associated with the product via the ProductTag join table.
+        availability_status (CharField): Denormalized availability state
+        (available, partially_available or unavailable), kept in sync on stock and size changes.
+        active_sizes_count (int): Number of non-deleted sizes. Only meaningful when `has_sizes` is True.
+        in_stock_sizes_count (int): Number of non-deleted sizes with stock available.
+        Only meaningful when `has_sizes` is True.
+        hot_stock (BooleanField): Serve stock reservations from Redis
+        (see `HotStockService`) instead of database row locks.
+        history_fingerprint (CharField): Fingerprint of the tracked fields at the
+        latest `ProductHistory` snapshot (see `ProductHistory.compute_fingerprint`).
+        effective_price (DecimalField): Stored current price (offer price while an
+        offer is active, else price), used for price sorting. Refreshed when the
+        price or offer change, at the offer start and end (`reprice_products_task`)
+        and by the `refresh_offer_pricing_task` beat job.
+        has_active_offer (BooleanField): Stored offer state matching `effective_price`.
+        product_import (ForeignKey): The bulk import that created the product, if any.
 
     Methods:
         __str__(): Returns the product's name as its string representation.
+        refresh_availability(): Recounts the product's sizes and persists the availability state.
 
     Properties:
         store_name (str): Returns the name of the associated store.
@@ -170,6 +246,19 @@ class Product(models.Model):
         (i.e. offer price if an active offer exists else original price).
     """
 
+    AVAILABLE = "available"
+    PARTIALLY_AVAILABLE = "partially_available"
+    UNAVAILABLE = "unavailable"
+    AVAILABILITY_CHOICES = [
+        (AVAILABLE, "Available"),
+        (PARTIALLY_AVAILABLE, "Partially available"),
+        (UNAVAILABLE, "Unavailable"),
+    ]
+    # Fields a full save() leaves alone
+    DERIVED_FIELDS = {"history_fingerprint", "effective_price", "has_active_offer",
+                      "picture_variants", "active_sizes_count", "in_stock_sizes_count",
+                      "availability_status"}
+
     product_name = models.CharField(max_length=255)
     product_description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -190,18 +279,53 @@ class Product(models.Model):
     properties = models.JSONField(blank=True, null=True)
     tags = models.ManyToManyField(
         Tag, related_name="products", through="ProductTag")
-    picture = models.ImageField(upload_to="products/")
+    picture = models.ImageField(upload_to="products/", storage=product_media_storage)
+    picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_deleted = models.BooleanField(default=False)
     favourited_by = models.ManyToManyField(
         User,
         blank=True,
         related_name='favourite_products')
+    availability_status = models.CharField(
+        max_length=20, choices=AVAILABILITY_CHOICES,
+        default=UNAVAILABLE, db_index=True)
+    active_sizes_count = models.PositiveIntegerField(default=0)
+    in_stock_sizes_count = models.PositiveIntegerField(default=0)
+    hot_stock = models.BooleanField(default=False)
+    history_fingerprint = models.CharField(max_length=64, blank=True, default="")
+    effective_price = models.DecimalField(
+        max_digits=10, decimal_places=2, db_index=True, editable=False)
+    has_active_offer = models.BooleanField(default=False, db_index=True, editable=False)
+    product_import = models.ForeignKey(
+        "ProductImport", on_delete=models.SET_NULL, related_name="products",
+        blank=True, null=True, editable=False)
     objects = ProductManager()
 
+    class Meta:
+        # Shaped after the list queries of ProductViewSet: `is_deleted`,
+        # which every list query filters on (see `ProductQuerySet.alive`),
+        # then the equality filter, then the sort column, so rows are read
+        # from the index in sort order.
+        indexes = [
+            models.Index(fields=["is_deleted", "created_at"],
+                         name="product_recent_idx"),
+            models.Index(fields=["is_deleted", "category", "created_at"],
+                         name="product_category_recent_idx"),
+            models.Index(fields=["is_deleted", "classification", "created_at"],
+                         name="product_class_recent_idx"),
+            models.Index(fields=["is_deleted", "store", "created_at"],
+                         name="product_store_recent_idx"),
+            models.Index(fields=["is_deleted", "effective_price", "has_active_offer"],
+                         name="product_price_idx"),
+            models.Index(fields=["is_deleted", "category", "effective_price"],
+                         name="product_category_price_idx"),
+        ]
+
     def delete(self):
         self.is_deleted = True
         self.sizes.all().update(is_deleted=True, deleted_at=now())
         self.save(update_fields=["is_deleted"])
+        self.refresh_availability()
 
     def hard_delete(self):
         return super().delete()
@@ -230,18 +354,48 @@ class Product(models.Model):
 
     @property
     def availability(self) -> Literal["available", "unavailable", "partially_available"]:
+        return self.availability_status
+
+    def compute_availability_status(self) -> str:
+        """
+        Derive the availability state from the stock quantity (no sizes)
+        or from the size counters (with sizes). Does not hit the database.
+        """
         if self.has_sizes:
-            sizes = self.sizes.all()
-            if not sizes.exists():
-                return "unavailable"  # No sizes defined
-            available_counts = [size.available_quantity > 0 for size in sizes]
-            if all(available_counts):
-                return "available"
-            elif any(available_counts):
-                return "partially_available"
-            return "unavailable"
-        else:
-            return "available" if (self.available_quantity or 0) > 0 else "unavailable"
+            if not self.active_sizes_count or not self.in_stock_sizes_count:
+                return self.UNAVAILABLE  # No sizes defined or none in stock
+            if self.in_stock_sizes_count >= self.active_sizes_count:
+                return self.AVAILABLE
+            return self.PARTIALLY_AVAILABLE
+        return self.AVAILABLE if (self.available_quantity or 0) > 0 else self.UNAVAILABLE
+
+    def refresh_availability(self):
+        """
+        Recount the product's non-deleted sizes and persist the size counters
+        and availability state.
+
+        Uses a queryset update so that neither the history signal nor
+        `updated_at` are triggered by a pure stock change.
+        """
+        counts = Size.objects.filter(product_id=self.pk).aggregate(
+            active=Count("id"),
+            in_stock=Count("id", filter=Q(available_quantity__gt=0)),
+        )
+        # A size went in or out of stock
+        reindex = self.in_stock_sizes_count != counts["in_stock"]
+        self.active_sizes_count = counts["active"]
+        self.in_stock_sizes_count = counts["in_stock"]
+        self.availability_status = self.compute_availability_status()
+        Product.objects.all_with_deleted().filter(pk=self.pk).update(
+            active_sizes_count=self.active_sizes_count,
+            in_stock_sizes_count=self.in_stock_sizes_count,
+            availability_status=self.availability_status,
+        )
+        if reindex or self.availability_status != getattr(self, "_loaded_availability_status", None):
+            # Imported here: the search index service imports this module
+            from products.services.search_index_service import enqueue_product_indexing
+            enqueue_product_indexing([self.pk])
+        self._loaded_availability_status = self.availability_status
 
     def clean(self):
         if self.has_sizes:
@@ -273,7 +427,68 @@ class Product(models.Model):
 
     def save(self, *args, **kwargs):
         self.clean()
+        adding = self._state.adding or kwargs.get("force_insert")
+        if adding and self.effective_price is None:
+            # A new product has no offer yet
+            self.effective_price = self.price
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"available_quantity", "has_sizes"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"availability_status"}
+        elif update_fields is None and not adding:
+            # history_fingerprint, the pricing fields and the size counters are
+            # written by queryset updates only (see `refresh_pricing()` and
+            # `refresh_availability()`); stale in-memory values must not
+            # overwrite them.
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DERIVED_FIELDS
+                and field.attname not in deferred
+            ]
+            if not self.has_sizes:
+                # Derived from available_quantity, written by this save
+                kwargs["update_fields"].append("availability_status")
+        if adding or "availability_status" in kwargs["update_fields"]:
+            self.availability_status = self.compute_availability_status()
+        price_changed = (not adding and "price" in kwargs["update_fields"]
+                         and self.price != getattr(self, "_loaded_price", None))
+        picture_changed = adding or (
+            "picture" in kwargs["update_fields"]
+            and self.picture.name != getattr(self, "_loaded_picture", None))
+        replaced_files = []
+        if picture_changed and not adding:
+            # The variants of the previous picture must not be served
+            stored_variants = Product.objects.all_with_deleted().filter(
+                pk=self.pk).values_list("picture_variants", flat=True).first() or {}
+            replaced_files = [self._loaded_picture, *stored_variants.values()]
+            self.picture_variants = {}
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | {"picture_variants"}
         super().save(*args, **kwargs)
+        MediaFile.objects.release(replaced_files)
+        self._loaded_price = self.price
+        self._loaded_picture = self.picture.name
+        self._loaded_availability_status = self.availability_status
+        if price_changed:
+            self.refresh_pricing()
+        if picture_changed and self.picture:
+            # Imported here: the image service imports this module
+            from products.services.image_service import enqueue_picture_processing
+            enqueue_picture_processing(self.pk)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets save() reprice and reprocess the picture only when they changed,
+        # and the search signal processor skip saves of unchanged availability
+        instance._loaded_price = instance.__dict__.get("price")
+        instance._loaded_picture = instance.__dict__.get("picture")
+        instance._loaded_availability_status = instance.__dict__.get("availability_status")
+        return instance
+
+    def refresh_pricing(self):
+        """Persist the effective price and offer state of the product."""
+        Product.objects.all_with_deleted().filter(pk=self.pk).refresh_pricing()
+        self.refresh_from_db(fields=["effective_price", "has_active_offer"])
 
 
 class ProductHistory(models.Model):
@@ -299,49 +514,168 @@ class ProductHistory(models.Model):
     category = models.CharField(max_length=100)
     classification = models.CharField(max_length=100, null=True)
     properties = models.JSONField(blank=True, null=True)
-    picture = models.ImageField(upload_to="history/products/")
+    picture = models.ImageField(upload_to="history/products/", storage=product_media_storage)
     is_deleted = models.BooleanField(default=False)
     store_name = models.CharField(max_length=255, blank=True, null=True)
     store_location = models.CharField(max_length=255, blank=True, null=True)
     recorded_at = models.DateTimeField(auto_now_add=True)
+    fingerprint = models.CharField(max_length=64, blank=True, default="", db_index=True)
 
-    @classmethod
-    def create_from_product(cls, product: Product):
+    class Meta:
+        indexes = [
+            # Point-in-time lookups: latest snapshot of a product before a date
+            models.Index(fields=["product", "recorded_at"],
+                         name="history_product_recorded_idx"),
+        ]
+
+    # Fields whose changes produce a new snapshot
+    TRACKED_FIELDS = [
+        "product_name", "product_description", "price", "current_price",
+        "color", "brand", "has_sizes", "category", "properties",
+        "picture", "is_deleted", "store_name", "store_location",
+        "owner_full_name", "owner_email", "owner_phone", "sizes",
+    ]
+
+    @staticmethod
+    def compute_fingerprint(values: dict) -> str:
+        """
+        Hash the tracked fields of a product state (see `tracked_values`).
+        Sizes are compared by name only: stock values, such as quantities, are not tracked.
+        """
+        normalized = {
+            field: str(values[field]) if values[field] is not None else None
+            for field in ProductHistory.TRACKED_FIELDS
+            if field not in ("properties", "sizes", "has_sizes", "is_deleted")
+        }
+        normalized["has_sizes"] = bool(values["has_sizes"])
+        normalized["is_deleted"] = bool(values["is_deleted"])
+        normalized["properties"] = values["properties"]
+        normalized["sizes"] = sorted(values["sizes"] or [])
+        payload = json.dumps(normalized, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def tracked_values(product_id) -> Optional[dict]:
+        """
+        Load the tracked fields of a product, its owner, store, offer and
+        size names from the database in a single query.
+
+        Returns:
+            dict: The values keyed like the `ProductHistory` fields, plus the
+            product's stored `history_fingerprint`. None if the product does not exist.
         """
-        Create and save a ProductHistory record from a Product instance.
+        return ProductHistory.tracked_values_many([product_id]).get(product_id)
+
+    @staticmethod
+    def tracked_values_many(product_ids) -> dict:
+        """
+        Load the tracked state of several products in a single query.
+
+        Returns:
+            dict: Maps product id to its values (see `tracked_values`).
+            Missing products are left out.
         """
-        owner = product.owner_id
-        store = product.store
-        sizes = []
-        if product.has_sizes:
-            sizes = list(product.sizes.values_list("size", flat=True))
-        history = cls.objects.create(
-            product=product,
-            product_name=product.product_name,
-            product_description=product.product_description,
-            price=product.price,
-            current_price=product.current_price,
-            color=product.color,
-            brand=product.brand,
-            has_sizes=product.has_sizes,
-            sizes=sizes,
-            owner_full_name=getattr(owner, "get_full_name", lambda: None)(),
-            owner_email=getattr(owner, "email", None),
-            owner_phone=getattr(owner, "phone_number", None),
-            category=product.category,
-            classification=product.classification,
-            properties=product.properties,
-            picture=product.picture,
-            is_deleted=product.is_deleted,
-            store_name=store.name if store else None,
-            store_location=store.location if store else None,
+        rows = Product.objects.all_with_deleted().filter(pk__in=list(product_ids)).values(
+            "id", "product_name", "product_description", "price", "color", "brand",
+            "has_sizes", "category", "classification", "properties", "picture",
+            "is_deleted", "history_fingerprint",
+            "owner_id__first_name", "owner_id__last_name", "owner_id__email",
+            "owner_id__phone_number", "store__name", "store__location",
+            "offer__offer_price", "offer__start_date", "offer__end_date",
+            "sizes__size", "sizes__is_deleted",
+        ).order_by("id")
+        current_time = now()
+        result = {}
+        for row in rows:
+            values = result.get(row["id"])
+            if values is None:
+                offer_active = (row["offer__offer_price"] is not None
+                                and row["offer__start_date"] <= current_time <= row["offer__end_date"])
+                full_name = f"{row['owner_id__first_name']} {row['owner_id__last_name']}".strip()
+                phone = row["owner_id__phone_number"]
+                values = result[row["id"]] = {
+                    "product_name": row["product_name"],
+                    "product_description": row["product_description"],
+                    "price": row["price"],
+                    "current_price": row["offer__offer_price"] if offer_active else row["price"],
+                    "color": row["color"],
+                    "brand": row["brand"],
+                    "has_sizes": row["has_sizes"],
+                    "category": row["category"],
+                    "classification": row["classification"],
+                    "properties": row["properties"],
+                    "picture": row["picture"],
+                    "is_deleted": row["is_deleted"],
+                    "store_name": row["store__name"],
+                    "store_location": row["store__location"],
+                    "owner_full_name": full_name or row["owner_id__email"],
+                    "owner_email": row["owner_id__email"],
+                    "owner_phone": str(phone) if phone else None,
+                    "sizes": [],
+                    "history_fingerprint": row["history_fingerprint"],
+                }
+            if (values["has_sizes"] and row["sizes__size"] is not None
+                    and not row["sizes__is_deleted"]):
+                values["sizes"].append(row["sizes__size"])
+        return result
+
+    @classmethod
+    def build_from_values(cls, product_id, values: dict) -> "ProductHistory":
+        """Build an unsaved snapshot (with its fingerprint) from `tracked_values` output."""
+        return cls(
+            product_id=product_id,
+            product_name=values["product_name"],
+            product_description=values["product_description"],
+            price=values["price"],
+            current_price=values["current_price"],
+            color=values["color"],
+            brand=values["brand"],
+            has_sizes=values["has_sizes"],
+            sizes=values["sizes"],
+            owner_full_name=values["owner_full_name"],
+            owner_email=values["owner_email"],
+            owner_phone=values["owner_phone"],
+            category=values["category"],
+            classification=values["classification"],
+            properties=values["properties"],
+            picture=values["picture"],
+            is_deleted=values["is_deleted"],
+            store_name=values["store_name"],
+            store_location=values["store_location"],
+            fingerprint=cls.compute_fingerprint(values),
         )
+
+    @classmethod
+    def create_from_product(cls, product: Product, values: Optional[dict] = None):
+        """
+        Create and save a ProductHistory record from the saved state of a
+        Product, and store its fingerprint on the product.
+
+        Args:
+            product (Product): The product to snapshot.
+            values (dict, optional): Output of `tracked_values` if already loaded.
+        """
+        if values is None:
+            values = cls.tracked_values(product.pk)
+        history = cls.build_from_values(product.pk, values)
+        history.save()
+        # The snapshot shares the product's picture file
+        MediaFile.objects.acquire([history.picture.name])
+        fingerprint = history.fingerprint
+        # Queryset update: does not trigger the history signal again
+        Product.objects.all_with_deleted().filter(pk=product.pk).update(
+            history_fingerprint=fingerprint)
+        product.history_fingerprint = fingerprint
         return history
 
     def has_product_changed(self) -> bool:
         """
         Checks if product has changed since this history instance was taken.
         """
+        if self.fingerprint:
+            values = self.tracked_values(self.product_id)
+            return values is None or self.compute_fingerprint(values) != self.fingerprint
+        # Snapshots taken before fingerprints existed
         # Compare key fields
         fields_to_check = [
             "product_name", "product_description", "price", "current_price",
@@ -396,6 +730,20 @@ class Offer(models.Model):
         current_time = now()
         return self.start_date <= current_time <= self.end_date
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Keep the product's stored effective price in sync, now and when
+        # the offer starts and ends
+        Product.objects.all_with_deleted().filter(pk=self.product_id).refresh_pricing()
+        # Imported here: the offer pricing service imports this module
+        from products.services.offer_pricing_service import schedule_offer_repricing
+        transaction.on_commit(lambda: schedule_offer_repricing([self]))
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        Product.objects.all_with_deleted().filter(pk=self.product_id).refresh_pricing()
+        return result
+
 
 class SizeManager(models.Manager):
     def get_queryset(self):
@@ -422,6 +770,14 @@ class Size(models.Model):
     objects = SizeManager()
     all_objects = models.Manager()
 
+    def save(self, *args, **kwargs):
+        from products.services.history_service import enqueue_product_history
+        super().save(*args, **kwargs)
+        # Keep the product's denormalized availability in sync
+        self.product.refresh_availability()
+        # Size names are part of the product history
+        enqueue_product_history([self.product_id])
+
     def delete(self, using=None, keep_parents=False):
         """Soft delete the size."""
         self.is_deleted = True
@@ -438,9 +794,225 @@ class Size(models.Model):
         return f"{self.product.product_name} - {self.size}"  # type: ignore
 
 
+class StockReservation(models.Model):
+    """
+    Ledger entry for a stock hold (e.g. an item sitting in a cart).
+
+    Every hold placed through `ReservationService` is recorded here with an
+    expiry time, so holds that are never checked out or explicitly
+    released can be returned to available stock by the periodic sweep.
+
+    Attributes:
+        product (ForeignKey): The reserved product.
+        size (str): The reserved size label, or None for products without sizes.
+        quantity (int): Number of items held.
+        cart (ForeignKey): Optional cart the hold belongs to. Holds of
+            abandoned carts are released even before they expire.
+        status (CharField): active, released or completed.
+        expires_at (DateTimeField): When an active hold is released.
+        released_at (DateTimeField): When the hold was released or completed.
+    """
+    ACTIVE = "active"
+    RELEASED = "released"
+    COMPLETED = "completed"
+    STATUS_CHOICES = [
+        (ACTIVE, "Active"),
+        (RELEASED, "Released"),
+        (COMPLETED, "Completed"),
+    ]
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="reservations")
+    size = models.CharField(max_length=50, blank=True, null=True)
+    quantity = models.PositiveIntegerField()
+    cart = models.ForeignKey(
+        Cart, on_delete=models.SET_NULL, related_name="reservations",
+        blank=True, null=True)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=ACTIVE)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    released_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # The expiry sweep scans active holds by expiry time
+            models.Index(fields=["status", "expires_at"],
+                         name="reservation_expiry_idx"),
+        ]
+
+    @property
+    def is_expired(self):
+        return self.status == self.ACTIVE and self.expires_at <= now()
+
+    def __str__(self):
+        label = f"{self.product_id}:{self.size}" if self.size else str(self.product_id)
+        return f"{label} x{self.quantity} ({self.status})"
+
+
+class ProductImport(models.Model):
+    """
+    A bulk upload of products from a CSV or JSONL file.
+
+    The file is processed row by row by `import_products_task` (see
+    `ProductImportService`), which records its progress and the
+    validation errors of rejected rows here.
+
+    Attributes:
+        owner (ForeignKey): The seller who uploaded the file.
+        store (ForeignKey): The store the products are created in.
+        file (FileField): The uploaded file, deleted once processed.
+        file_format (CharField): csv or jsonl.
+        status (CharField): pending, running, completed or failed.
+        processed_rows (int): Rows read so far.
+        created_count (int): Products created so far.
+        error_count (int): Rows rejected so far.
+        errors (JSONField): `{"row": n, "errors": {...}}` entries of the
+            first `MAX_REPORTED_ERRORS` rejected rows.
+        detail (TextField): Why the import failed, for failed imports.
+    """
+    CSV = "csv"
+    JSONL = "jsonl"
+    FORMAT_CHOICES = [
+        (CSV, "CSV"),
+        (JSONL, "JSON Lines"),
+    ]
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (COMPLETED, "Completed"),
+        (FAILED, "Failed"),
+    ]
+    MAX_REPORTED_ERRORS = 1000
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        related_name="product_imports")
+    store = models.ForeignKey(
+        Store, on_delete=models.CASCADE, related_name="product_imports")
+    file = models.FileField(upload_to="imports/", blank=True)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    detail = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Import {self.pk} ({self.status})"
+
+
 class ProductTag(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
 
     class Meta:
         unique_together = ("product", "tag")
+
+
+class MediaFileManager(models.Manager):
+    """
+    Reference counting of the files of `ContentAddressedStorage`. Names
+    outside the storage's prefix (files uploaded before it) are ignored.
+    """
+
+    @staticmethod
+    def _counts(names) -> Counter:
+        prefix = f"{ContentAddressedStorage.PREFIX}/"
+        return Counter(name for name in names if name and name.startswith(prefix))
+
+    def acquire(self, names):
+        """Take one reference per occurrence of each name."""
+        counts = self._counts(names)
+        if not counts:
+            return
+        with transaction.atomic(savepoint=False):
+            self.bulk_create([MediaFile(name=name) for name in counts],
+                             ignore_conflicts=True)
+            # Lock the rows; a release that deleted one meanwhile has committed
+            existing = set(self.select_for_update().filter(
+                name__in=counts).values_list("name", flat=True))
+            missing = counts.keys() - existing
+            if missing:
+                self.bulk_create([MediaFile(name=name) for name in missing])
+            by_count = {}
+            for name, count in counts.items():
+                by_count.setdefault(count, []).append(name)
+            for count, group in by_count.items():
+                self.filter(name__in=group).update(references=F("references") + count)
+
+    def release(self, names):
+        """
+        Drop one reference per occurrence of each name. Files left without
+        references are deleted once the transaction commits.
+        """
+        counts = self._counts(names)
+        if not counts:
+            return
+        with transaction.atomic(savepoint=False):
+            files = list(self.select_for_update().filter(name__in=counts))
+            for media_file in files:
+                media_file.references = max(media_file.references - counts[media_file.name], 0)
+            self.bulk_update([f for f in files if f.references], ["references"])
+            unused = [f.name for f in files if not f.references]
+            if unused:
+                self.filter(name__in=unused).delete()
+                transaction.on_commit(lambda: self._delete_unused_files(unused))
+
+    def _delete_unused_files(self, names):
+        # Skip files referenced again since the release
+        storage = product_media_storage()
+        referenced = set(self.filter(name__in=names).values_list("name", flat=True))
+        for name in names:
+            if name not in referenced:
+                storage.delete(name)
+
+    def rebuild(self) -> int:
+        """
+        Recount the references of every stored file from the product and
+        product history pictures. Returns the number of files referenced.
+        """
+        names = []
+        for picture, variants in Product.objects.all_with_deleted().values_list(
+                "picture", "picture_variants").iterator():
+            names.append(picture)
+            names.extend(variants.values())
+        names.extend(ProductHistory.objects.values_list("picture", flat=True).iterator())
+        counts = self._counts(names)
+        with transaction.atomic():
+            self.exclude(name__in=counts).delete()
+            self.bulk_create([MediaFile(name=name) for name in counts],
+                             ignore_conflicts=True)
+            files = list(self.select_for_update().filter(name__in=counts))
+            for media_file in files:
+                media_file.references = counts[media_file.name]
+            self.bulk_update(files, ["references"], batch_size=1000)
+        return len(counts)
+
+
+class MediaFile(models.Model):
+    """
+    Reference count of a file stored once by `ContentAddressedStorage` and
+    shared by every product, variant and history snapshot with the same
+    content.
+
+    Attributes:
+        name (CharField): Storage name of the file (`blobs/<2 hex>/<sha256><ext>`).
+        references (int): Number of picture fields and variant entries using the file.
+        created_at (DateTimeField): When the content was first stored.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    references = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    objects = MediaFileManager()
+
+    def __str__(self):
+        return f"{self.name} ({self.references})"
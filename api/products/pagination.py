@@ -0,0 +1,155 @@
+# products/pagination.py
+import base64
+import json
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination:
+    """
+    Keyset (seek) pagination over `.values()` rows.
+
+    Pages are addressed by an opaque cursor holding the sort values of the
+    row at the page boundary, so page N costs the same as page 1: there is
+    no OFFSET scan and no COUNT(*). `id` is always appended as tiebreaker.
+
+    The sort is taken from the view's `get_sort_fields()`. The response has
+    `next`, `previous` and `results`, like DRF's `CursorPagination`.
+    """
+    page_size = api_settings.PAGE_SIZE or 10
+    cursor_query_param = "cursor"
+    # Fields whose values are never NULL and can be compared in a keyset
+    keyset_fields = {"created_at", "updated_at", "effective_price", "price", "id"}
+    default_ordering = ["-created_at"]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Args:
+            queryset (QuerySet): Rows to paginate; must include the sort fields.
+            request (Request): The current request.
+            view (APIView, optional): The view, providing `get_sort_fields()`.
+
+        Returns:
+            list: The rows of the requested page.
+
+        Raises:
+            ValidationError: If a sort field cannot be used for keyset pagination.
+            NotFound: If the cursor is invalid.
+        """
+        self.request = request
+        ordering = view.get_sort_fields() if hasattr(view, "get_sort_fields") else None
+        self.ordering = self._get_ordering(ordering or self.default_ordering)
+        cursor = self._decode_cursor(request.query_params.get(self.cursor_query_param))
+        reverse = bool(cursor and cursor["r"])
+
+        ordering = [self._flip(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            values = self._parse_values(queryset, cursor["v"])
+            queryset = queryset.filter(self._after(ordering, values))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_values = self.previous_values = None
+        if rows:
+            if has_more or reverse:
+                self.next_values = self._values(rows[-1])
+            if cursor and (not reverse or has_more):
+                self.previous_values = self._values(rows[0])
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self._link(self.next_values, reverse=False),
+            "previous": self._link(self.previous_values, reverse=True),
+            "results": data,
+        })
+
+    # -------------------------------
+    # Helpers
+    # -------------------------------
+    def _get_ordering(self, ordering):
+        fields = [field.lstrip("-") for field in ordering]
+        invalid = [field for field in fields if field not in self.keyset_fields]
+        if invalid:
+            raise ValidationError({"sort": [
+                f"Cursor pagination cannot sort by {', '.join(invalid)}. "
+                f"Allowed: price, recent, {', '.join(sorted(self.keyset_fields))}."]})
+        if "id" not in fields:
+            descending = ordering[-1].startswith("-")
+            ordering = list(ordering) + ["-id" if descending else "id"]
+        return list(ordering)
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _after(ordering, values):
+        """Rows strictly after `values` in `ordering`: (a > x) OR (a = x AND b > y) ..."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _values(self, row):
+        values = []
+        for field in self.ordering:
+            value = row[field.lstrip("-")]
+            values.append(value.isoformat() if hasattr(value, "isoformat") else str(value))
+        return values
+
+    def _parse_values(self, queryset, values):
+        """
+        Convert the cursor strings back to the types of the sort fields.
+        The fields' validators reject values out of the range of their
+        columns (e.g. an id beyond the integer range), which the database
+        would refuse.
+        """
+        parsed = []
+        try:
+            for field, value in zip(self.ordering, values):
+                output_field = queryset.query.resolve_ref(field.lstrip("-")).output_field
+                value = output_field.to_python(value)
+                output_field.run_validators(value)
+                parsed.append(value)
+        except DjangoValidationError:
+            raise NotFound("Invalid cursor.")
+        return parsed
+
+    def _decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            # Cursors come from the client: check their shape before use
+            if not isinstance(cursor, dict) or cursor.get("r") not in (0, 1):
+                raise ValueError("malformed cursor")
+            values = cursor.get("v")
+            if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+                raise ValueError("malformed cursor values")
+            if len(values) != len(self.ordering):
+                raise ValueError("cursor does not match the sort")
+            return cursor
+        except (TypeError, ValueError):
+            raise NotFound("Invalid cursor.")
+
+    def _link(self, values, reverse):
+        if values is None:
+            return None
+        cursor = base64.urlsafe_b64encode(
+            json.dumps({"v": values, "r": int(reverse)}).encode()).decode()
+        url = remove_query_param(self.request.build_absolute_uri(), "page")
+        return replace_query_param(url, self.cursor_query_param, cursor)
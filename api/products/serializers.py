@@ -2,8 +2,14 @@ import json
 import os
 import logging
 from rest_framework import serializers
-from .models import Offer, Product, Tag, Size
+from .models import Offer, Product, ProductHistory, ProductImport, ProductTag, Tag, Size
+from .services.bulk_update_service import ProductBulkUpdateService
+from .services.history_service import enqueue_product_history
+from .services.search_index_service import enqueue_product_indexing
+from .services.hot_stock_service import HotStockService
+from .services.listing_cache_service import invalidate_product_listings
 from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
 
 
 class OfferSerializer(serializers.ModelSerializer):
@@ -82,17 +88,52 @@ class SizeSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class ProductHistorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductHistory
+        fields = [
+            "id",
+            "product",
+            "product_name",
+            "product_description",
+            "price",
+            "current_price",
+            "color",
+            "brand",
+            "has_sizes",
+            "sizes",
+            "category",
+            "classification",
+            "properties",
+            "picture",
+            "is_deleted",
+            "store_name",
+            "store_location",
+            "owner_full_name",
+            "owner_email",
+            "owner_phone",
+            "recorded_at",
+        ]
+        read_only_fields = fields
+
+
 class ProductSerializer(serializers.ModelSerializer):
     tags = serializers.SerializerMethodField()
     sizes = SizeSerializer(many=True, required=False)
     logger = logging.getLogger(__name__)
     current_price = serializers.SerializerMethodField()
+    picture_variants = serializers.SerializerMethodField()
     offer = OfferSerializer(required=False)
     ALLOWED_IMAGE_SIZE = 5 * 1024 * 1024
 
     def get_current_price(self, obj):
         return str(obj.current_price)
 
+    def get_picture_variants(self, obj):
+        # URLs of the resized copies by variant name (see ProductImageService)
+        storage = obj.picture.storage
+        return {name: storage.url(path) for name, path in obj.picture_variants.items()}
+
     class Meta:
         model = Product
         fields = [
@@ -104,6 +145,7 @@ class ProductSerializer(serializers.ModelSerializer):
             "brand",
             "category",
             "picture",
+            "picture_variants",
             "color",
             "available_quantity",
             "reserved_quantity",
@@ -127,6 +169,7 @@ class ProductSerializer(serializers.ModelSerializer):
             "updated_at",
             "reserved_quantity",
             'current_price',
+            "picture_variants",
             'is_deleted',
             "offer",
             "availability",
@@ -142,7 +185,7 @@ class ProductSerializer(serializers.ModelSerializer):
         }
 
     def get_tags(self, obj):
-        # Return list of tag names for the product
+        # Return list of tag names for the product (prefetched by for_listing())
         return [tag.name for tag in obj.tags.all()]
 
     def to_internal_value(self, data):
@@ -168,7 +211,8 @@ class ProductSerializer(serializers.ModelSerializer):
 
         ret = super().to_internal_value(data)
         ret["sizes"] = data.get("sizes", [])
-        ret["tags"] = data.get("tags", [])
+        # Tag names validated by a `tags` field (see `ProductImportRowSerializer`) are kept
+        ret.setdefault("tags", data.get("tags", []))
         ret["offer"] = data.get("offer", None)
         return ret
 
@@ -233,7 +277,6 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        rep["tags"] = [tag.name for tag in instance.tags.all()]
         if instance.has_sizes:
             rep.pop("available_quantity", None)
             rep.pop("reserved_quantity", None)
@@ -255,17 +298,55 @@ class ProductSerializer(serializers.ModelSerializer):
             offer_serializer.is_valid(raise_exception=True)
             offer_serializer.save(product=product)
 
-        for tag_name in tags_data:
-            tag, _ = Tag.objects.get_or_create(name=tag_name)
-            product.tags.add(tag)
+        self._add_tags(product, tags_data)
 
         if sizes_data:
-            for size_data in sizes_data:
-                Size.objects.create(
-                    product=product, reserved_quantity=0, **size_data)
-
+            Size.objects.bulk_create([
+                Size(product=product, reserved_quantity=0, **size_data)
+                for size_data in sizes_data
+            ])
+            self._sizes_written(product)
+
+        if tags_data or sizes_data:
+            # Indexed on save, before its tags and sizes were written
+            enqueue_product_indexing([product.pk])
         return product
 
+    @staticmethod
+    def _add_tags(product, tag_names):
+        """Link the named tags with one bulk insert; tags are resolved in bulk."""
+        tag_ids = Tag.objects.resolve(tag_names)
+        if tag_ids:
+            ProductTag.objects.bulk_create(
+                [ProductTag(product=product, tag_id=tag_id)
+                 for tag_id in tag_ids.values()],
+                ignore_conflicts=True)
+            # bulk_create sends no m2m_changed signal
+            invalidate_product_listings()
+        getattr(product, "_prefetched_objects_cache", {}).pop("tags", None)
+
+    @staticmethod
+    def _set_tags(product, tag_names):
+        """Replace the product's tags, writing only when the set differs."""
+        current = dict(product.tags.values_list("name", "id"))
+        tag_names = set(tag_names)
+        if tag_names == current.keys():
+            return
+        removed = [tag_id for name, tag_id in current.items() if name not in tag_names]
+        if removed:
+            ProductTag.objects.filter(product=product, tag_id__in=removed).delete()
+            invalidate_product_listings()
+        ProductSerializer._add_tags(product, tag_names - current.keys())
+
+    @staticmethod
+    def _sizes_written(product):
+        """Bookkeeping `Size.save()` does, once for a bulk size write."""
+        getattr(product, "_prefetched_objects_cache", {}).pop("sizes", None)
+        product.refresh_availability()
+        # Size names are part of the product history
+        enqueue_product_history([product.pk])
+        invalidate_product_listings()
+
     def validate_picture(self, image):
         if image is None:
             return image
@@ -290,35 +371,55 @@ class ProductSerializer(serializers.ModelSerializer):
         sizes_data = validated_data.pop("sizes", None)
         offer_data = validated_data.pop("offer", None)
 
+        hot = HotStockService.enabled() and instance.pk in HotStockService.loaded_product_ids()
+        if hot:
+            # Write pending Redis reservations back before overwriting stock
+            HotStockService.reconcile([instance.pk])
+            instance.refresh_from_db(fields=["available_quantity", "reserved_quantity"])
+
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
 
         if tags_data is not None:
-            instance.tags.clear()
-            for tag_name in tags_data:
-                tag, _ = Tag.objects.get_or_create(name=tag_name)
-                instance.tags.add(tag)
-        # update sizes
-        if sizes_data is not None:
+            self._set_tags(instance, tags_data)
+        # Upsert sizes: one bulk update and one bulk insert
+        sizes_written = False
+        if sizes_data:
             existing_sizes = {s.size: s for s in instance.sizes.all()}
+            changed_sizes = []
+            new_sizes = []
             for size_data in sizes_data:
                 size_name = size_data.get("size")
                 available_quantity = size_data.get("available_quantity", 0)
 
-                if size_name in existing_sizes:
-                    # Update existing size
-                    size = existing_sizes[size_name]
-                    size.available_quantity = available_quantity
-                    size.save()
-                else:
-                    # Create a new size
-                    Size.objects.create(
+                size = existing_sizes.get(size_name)
+                if size is None:
+                    new_sizes.append(Size(
                         product=instance,
                         size=size_name,
                         available_quantity=available_quantity,
                         reserved_quantity=0
-                    )
+                    ))
+                elif size.available_quantity != available_quantity:
+                    size.available_quantity = available_quantity
+                    changed_sizes.append(size)
+            if changed_sizes:
+                Size.objects.bulk_update(changed_sizes, ["available_quantity"])
+            if new_sizes:
+                Size.objects.bulk_create(new_sizes)
+            sizes_written = bool(changed_sizes or new_sizes)
+
+        if sizes_written:
+            self._sizes_written(instance)
+        elif sizes_data is not None or "has_sizes" in validated_data:
+            # Size counters may be stale after toggling has_sizes
+            instance.refresh_availability()
+
+        if hot:
+            HotStockService.resync([instance.pk])
+        if tags_data is not None or sizes_written:
+            enqueue_product_indexing([instance.pk])
 
         # Handle offer
         if offer_data is not None:
@@ -331,3 +432,201 @@ class ProductSerializer(serializers.ModelSerializer):
                 offer_serializer.save(product=instance)
 
         return instance
+
+
+class ProductImportRowSerializer(ProductSerializer):
+    """
+    Validates one row of a bulk product import (see `ProductImportService`)
+    with the rules of `ProductSerializer`. Rows carry no picture or offer.
+    """
+    offer = None
+    current_price = None
+    picture_variants = None
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=255), required=False)
+
+    class Meta(ProductSerializer.Meta):
+        fields = [
+            "product_name",
+            "product_description",
+            "price",
+            "brand",
+            "category",
+            "color",
+            "available_quantity",
+            "has_sizes",
+            "properties",
+            "tags",
+            "sizes",
+            "classification",
+        ]
+        read_only_fields = []
+        extra_kwargs = {
+            "product_name": {"required": True},
+            "product_description": {"required": True},
+            "price": {"required": True},
+            "category": {"required": True},
+            "has_sizes": {"required": True},
+            "available_quantity": {"allow_null": False},
+        }
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductImport
+        fields = [
+            "id",
+            "store",
+            "file_format",
+            "status",
+            "processed_rows",
+            "created_count",
+            "error_count",
+            "errors",
+            "detail",
+            "created_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class ProductBulkUpdateItemSerializer(serializers.Serializer):
+    """Price and stock changes of one product (see `ProductBulkUpdateService`)."""
+    logger = logging.getLogger(__name__)
+
+    id = serializers.IntegerField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    available_quantity = serializers.IntegerField(min_value=0, required=False)
+    sizes = SizeSerializer(many=True, required=False, allow_empty=False)
+
+    def validate_price(self, value):
+        if value <= 0:
+            self.logger.error("Price  cannot be negative.")
+            raise serializers.ValidationError(
+                "Price cannot be negative.")
+        return value
+
+    def validate(self, attrs):
+        if not attrs.keys() - {"id"}:
+            raise serializers.ValidationError(
+                "Provide at least one of 'price', 'available_quantity' or 'sizes'.")
+        size_names = [size["size"] for size in attrs.get("sizes", [])]
+        if len(size_names) != len(set(size_names)):
+            raise serializers.ValidationError({"sizes": "Sizes must be unique."})
+        return attrs
+
+
+class ProductBulkUpdateSerializer(serializers.Serializer):
+    products = ProductBulkUpdateItemSerializer(
+        many=True, allow_empty=False, max_length=ProductBulkUpdateService.MAX_ITEMS)
+
+    def validate_products(self, value):
+        ids = [item["id"] for item in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Each product may appear only once.")
+        return value
+
+
+class ProductListSerializer(serializers.BaseSerializer):
+    """
+    Read-only list representation of products for the list endpoints.
+
+    Produces exactly the output of `ProductSerializer(many=True)`, but builds
+    each item from a `.values()` row and from size/tag maps loaded with one
+    query each, instead of running the field machinery per product.
+
+    As with `ProductSerializer`, the picture URL is absolute when the
+    request is passed in the context.
+
+    Usage:
+        rows = ProductListSerializer.values(Product.objects.for_listing())
+        data = ProductListSerializer(rows).data
+    """
+    VALUE_FIELDS = [
+        "id", "product_name", "product_description", "price", "brand",
+        "category", "picture", "picture_variants", "color", "available_quantity",
+        "reserved_quantity", "has_sizes", "properties", "owner_id", "store",
+        "created_at", "updated_at", "classification", "availability_status",
+        "offer__start_date", "offer__end_date", "offer__offer_price",
+        # Sort key of keyset cursors; the price shown is computed from the offer
+        "effective_price",
+    ]
+    # Field instances used for the non-trivial value formats
+    _decimal = serializers.DecimalField(max_digits=10, decimal_places=2)
+    _datetime = serializers.DateTimeField()
+
+    @classmethod
+    def values(cls, queryset):
+        """Rows for this serializer, read with a single query."""
+        return queryset.prefetch_related(None).values(*cls.VALUE_FIELDS)
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        product_ids = [row["id"] for row in rows]
+        sizes = {}
+        tags = {}
+        if product_ids:
+            for size in Size.objects.filter(product_id__in=product_ids).order_by("id").values(
+                    "id", "product_id", "size", "available_quantity", "reserved_quantity"):
+                sizes.setdefault(size.pop("product_id"), []).append(size)
+            for product_id, name in ProductTag.objects.filter(
+                    product_id__in=product_ids).order_by("id").values_list("product_id", "tag__name"):
+                tags.setdefault(product_id, []).append(name)
+
+        picture_storage = Product._meta.get_field("picture").storage
+        request = self.context.get("request")
+        decimal = self._decimal.to_representation
+        datetime = self._datetime.to_representation
+        # As `Offer.is_active`, rather than the stored pricing, which a
+        # scheduled task flips at the offer start and end
+        current_time = now()
+        data = []
+        for row in rows:
+            picture = picture_storage.url(row["picture"]) if row["picture"] else None
+            if picture and request is not None:
+                # As DRF's ImageField
+                picture = request.build_absolute_uri(picture)
+            offer = None
+            current_price = row["price"]
+            if row["offer__offer_price"] is not None:
+                is_active = row["offer__start_date"] <= current_time <= row["offer__end_date"]
+                if is_active:
+                    current_price = row["offer__offer_price"]
+                offer = {
+                    "start_date": datetime(row["offer__start_date"]),
+                    "end_date": datetime(row["offer__end_date"]),
+                    "offer_price": decimal(row["offer__offer_price"]),
+                    "is_active": is_active,
+                }
+            item = {
+                "id": row["id"],
+                "product_name": row["product_name"],
+                "product_description": row["product_description"],
+                "price": decimal(row["price"]),
+                "current_price": decimal(current_price),
+                "brand": row["brand"],
+                "category": row["category"],
+                "picture": picture,
+                "picture_variants": {name: picture_storage.url(path)
+                                     for name, path in row["picture_variants"].items()},
+                "color": row["color"],
+            }
+            if not row["has_sizes"]:
+                item["available_quantity"] = row["available_quantity"]
+                item["reserved_quantity"] = row["reserved_quantity"]
+            item["has_sizes"] = row["has_sizes"]
+            item["properties"] = row["properties"]
+            item["tags"] = tags.get(row["id"], [])
+            if row["has_sizes"]:
+                item["sizes"] = sizes.get(row["id"], [])
+            item.update({
+                "owner_id": row["owner_id"],
+                "store": row["store"],
+                "created_at": datetime(row["created_at"]),
+                "updated_at": datetime(row["updated_at"]),
+                "offer": offer,
+                "classification": row["classification"],
+                "availability": row["availability_status"],
+            })
+            data.append(item)
+        return data
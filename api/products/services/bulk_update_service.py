@@ -0,0 +1,159 @@
+# products/services/bulk_update_service.py
+import logging
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+from typing import Iterable, List
+from products.models import Product, Size
+from products.services.history_service import enqueue_product_history
+from products.services.hot_stock_service import HotStockService
+from products.services.listing_cache_service import invalidate_product_listings
+from products.services.search_index_service import enqueue_product_indexing
+
+logger = logging.getLogger("bulk_update_service")
+
+
+class ProductBulkUpdateService:
+    """
+    A static service class that applies price and stock changes to many
+    products of one seller at once.
+
+    Each item is a dict with an `id` and any of `price`,
+    `available_quantity` (products without sizes) and `sizes` (a list of
+    `{size, available_quantity}` for existing sizes). Values replace the
+    stored ones, as with a PATCH of the product, and `updated_at` is bumped.
+    Quantities are written as the difference to the value read, so a stock
+    change that reaches the row in between is kept.
+
+    Unlike per-product PATCHes, the products are locked and checked for
+    ownership with one query, sizes are loaded with one query, and the
+    changes are written with one `bulk_update` per model. History is
+    snapshotted in a single batch after commit.
+    """
+    MAX_ITEMS = 1000
+
+    @staticmethod
+    def apply(owner, items: Iterable[dict]) -> List[int]:
+        """
+        Apply the changes of `items` to products owned by `owner`.
+
+        Raises:
+            Product.DoesNotExist: A product does not exist or is deleted.
+            PermissionDenied: A product belongs to another user.
+            Size.DoesNotExist: A size is not defined on its product.
+            ValidationError: A change does not fit the product (e.g. a
+                quantity for a product with sizes).
+
+        Returns:
+            List[int]: Ids of the products that changed.
+        """
+        items = list(items)
+        hot_ids = set()
+        if HotStockService.enabled():
+            hot_ids = HotStockService.loaded_product_ids() & {
+                item["id"] for item in items
+                if "available_quantity" in item or "sizes" in item}
+        if hot_ids:
+            # Write pending Redis reservations back before overwriting
+            # stock; done outside the transaction so a rollback cannot
+            # lose drained deltas.
+            HotStockService.reconcile(hot_ids)
+        changed_ids = ProductBulkUpdateService._apply(owner, items)
+        if hot_ids:
+            HotStockService.resync(hot_ids)
+        return changed_ids
+
+    @staticmethod
+    @transaction.atomic
+    def _apply(owner, items) -> List[int]:
+        product_ids = {item["id"] for item in items}
+        products = {
+            product.pk: product
+            for product in Product.objects.select_for_update()
+            .filter(pk__in=product_ids).order_by("pk")
+        }
+        missing = product_ids - products.keys()
+        if missing:
+            logger.error("Products not found: %s.", sorted(missing))
+            raise Product.DoesNotExist(
+                f"Product(s) {sorted(missing)} do not exist.")
+        foreign = sorted(pk for pk, product in products.items()
+                         if product.owner_id_id != owner.pk)
+        if foreign:
+            logger.critical(
+                "User %s attempted to bulk update products %s without permission.",
+                owner.pk, foreign)
+            raise PermissionDenied(
+                f"You do not own product(s) {foreign}.")
+
+        sized_ids = set()
+        for item in items:
+            product = products[item["id"]]
+            if product.has_sizes and "available_quantity" in item:
+                raise ValidationError(
+                    f"Product {product.pk} has sizes; update the quantity of its sizes.")
+            if not product.has_sizes and "sizes" in item:
+                raise ValidationError(f"Product {product.pk} has no sizes.")
+            if "sizes" in item:
+                sized_ids.add(product.pk)
+        sizes = {}
+        if sized_ids:
+            sizes = {
+                (size.product_id, size.size): size
+                for size in Size.objects.select_for_update()
+                .filter(product_id__in=sized_ids).order_by("pk")
+            }
+
+        changed_products = {}
+        repriced_ids = set()
+        quantity_deltas = {}
+        changed_sizes = []
+        for item in items:
+            product = products[item["id"]]
+            price = item.get("price")
+            if price is not None and price != product.price:
+                product.price = price
+                repriced_ids.add(product.pk)
+                changed_products[product.pk] = product
+            quantity = item.get("available_quantity")
+            if quantity is not None and quantity != product.available_quantity:
+                quantity_deltas[product.pk] = quantity - product.available_quantity
+                changed_products[product.pk] = product
+            for size_data in item.get("sizes", []):
+                size = sizes.get((product.pk, size_data["size"]))
+                if size is None:
+                    logger.error("Size %s of product %s not found.",
+                                 size_data["size"], product.pk)
+                    raise Size.DoesNotExist(
+                        f"Size {size_data['size']} of product {product.pk} does not exist.")
+                if size.available_quantity != size_data["available_quantity"]:
+                    size.available_quantity = F("available_quantity") + (
+                        size_data["available_quantity"] - size.available_quantity)
+                    changed_sizes.append(size)
+                    changed_products[product.pk] = product
+
+        if changed_sizes:
+            Size.objects.bulk_update(changed_sizes, ["available_quantity"])
+        if changed_products:
+            updated_at = now()
+            for product in changed_products.values():
+                # Unchanged quantities get a zero delta rather than the value read
+                product.available_quantity = F("available_quantity") + quantity_deltas.get(product.pk, 0)
+                # bulk_update bypasses auto_now
+                product.updated_at = updated_at
+            Product.objects.bulk_update(
+                list(changed_products.values()), ["price", "available_quantity", "updated_at"])
+            Product.objects.filter(pk__in=list(changed_products)).refresh_availability()
+        if repriced_ids:
+            Product.objects.filter(pk__in=repriced_ids).refresh_pricing()
+
+        changed_ids = sorted(changed_products)
+        if changed_ids:
+            # bulk_update sends no signals
+            enqueue_product_history(changed_ids)
+            invalidate_product_listings()
+            enqueue_product_indexing(changed_ids)
+        logger.info("Bulk updated %d of %d products for user %s.",
+                    len(changed_ids), len(items), owner.pk)
+        return changed_ids
@@ -1,12 +1,104 @@
-from products.models import ProductHistory
+import logging
+import threading
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from products.models import MediaFile, Product, ProductHistory
+
+logger = logging.getLogger("history_service")
+
+# Product ids changed in the current transaction, flushed on commit
+_pending = threading.local()
+
+
+def enqueue_product_history(product_ids):
+    """
+    Schedule a history snapshot for the given products once the current
+    transaction commits. Ids enqueued within the same transaction are
+    coalesced into a single `write_product_history_task`.
+    """
+    ids = getattr(_pending, "ids", None)
+    if ids is None:
+        ids = _pending.ids = set()
+    ids.update(product_ids)
+    # Every call registers the flush: callbacks of rolled back savepoints are
+    # discarded, and the first callback that runs takes all pending ids.
+    transaction.on_commit(_flush_pending_history)
+
+
+def _flush_pending_history():
+    ids = getattr(_pending, "ids", None)
+    if not ids:
+        return
+    _pending.ids = set()
+    # Imported here: products.tasks imports this module
+    from products.tasks import write_product_history_task
+    try:
+        write_product_history_task.delay(sorted(ids))
+    except Exception as e:
+        logger.error(f"Could not queue product history, writing inline: {e}")
+        write_product_history(ids)
+
+
+def write_product_history(product_ids) -> int:
+    """
+    Snapshot every given product whose tracked state differs from its
+    latest snapshot, with one bulk insert.
+
+    Returns:
+        int: Number of snapshots written.
+    """
+    values_by_id = ProductHistory.tracked_values_many(set(product_ids))
+    snapshots = []
+    backfilled = []
+    for product_id, values in values_by_id.items():
+        fingerprint = ProductHistory.compute_fingerprint(values)
+        if values["history_fingerprint"] == fingerprint:
+            continue
+        if not values["history_fingerprint"]:
+            # Product snapshotted before fingerprints existed
+            last_history = ProductHistory.objects.filter(
+                product_id=product_id).order_by('-recorded_at').first()
+            if last_history and not last_history.has_product_changed():
+                backfilled.append(Product(pk=product_id, history_fingerprint=fingerprint))
+                continue
+        snapshots.append(ProductHistory.build_from_values(product_id, values))
+
+    if not snapshots and not backfilled:
+        return 0
+    with transaction.atomic():
+        ProductHistory.objects.bulk_create(snapshots)
+        # Snapshots share the products' picture files
+        MediaFile.objects.acquire(history.picture.name for history in snapshots)
+        # bulk_update does not trigger the history signal again
+        Product.objects.all_with_deleted().bulk_update(
+            backfilled + [Product(pk=history.product_id, history_fingerprint=history.fingerprint)
+                          for history in snapshots],
+            ["history_fingerprint"],
+        )
+    return len(snapshots)
 
 
 def create_product_history_if_changed(product):
-    """Check if the latest history differs from the product and create a new record if needed."""
-    last_history = product.history.order_by('-recorded_at').first()
-    if not last_history or last_history.has_product_changed():
-        return ProductHistory.create_from_product(product)
-    return None
+    """
+    Check if the latest history differs from the product and create a new record if needed.
+
+    The tracked state is loaded in one query and compared with the
+    fingerprint stored on the product at its latest snapshot.
+    """
+    values = ProductHistory.tracked_values(product.pk)
+    if values is None:
+        return None
+    fingerprint = ProductHistory.compute_fingerprint(values)
+    if values["history_fingerprint"] == fingerprint:
+        return None
+    if not values["history_fingerprint"]:
+        # Product snapshotted before fingerprints existed
+        last_history = product.history.order_by('-recorded_at').first()
+        if last_history and not last_history.has_product_changed():
+            Product.objects.all_with_deleted().filter(pk=product.pk).update(
+                history_fingerprint=fingerprint)
+            return None
+    return ProductHistory.create_from_product(product, values)
 
 
 def get_product_history_as_of(product, date):
@@ -15,3 +107,47 @@ def get_product_history_as_of(product, date):
     Returns None if no history exists before or on that date.
     """
     return product.history.filter(recorded_at__lte=date).order_by('-recorded_at').first()
+
+
+def get_history_as_of(product_ids, date) -> dict:
+    """
+    Get the latest history snapshot of many products as of a given date,
+    in a single query (served by the (product, recorded_at) index).
+
+    Args:
+        product_ids (Iterable[int]): The products to resolve.
+        date (datetime): The point in time.
+
+    Returns:
+        dict: Maps product id to its ProductHistory. Products without a
+        snapshot before or on that date are left out.
+    """
+    latest = ProductHistory.objects.filter(
+        product_id=OuterRef("product_id"), recorded_at__lte=date
+    ).order_by('-recorded_at', '-id').values("id")[:1]
+    snapshots = ProductHistory.objects.filter(
+        product_id__in=set(product_ids), id=Subquery(latest))
+    return {history.product_id: history for history in snapshots}
+
+
+# Fields compared between consecutive snapshots
+HISTORY_DIFF_FIELDS = [
+    "product_name", "product_description", "price", "current_price",
+    "color", "brand", "has_sizes", "sizes", "category", "classification",
+    "properties", "picture", "is_deleted", "store_name", "store_location",
+    "owner_full_name", "owner_email", "owner_phone",
+]
+
+
+def diff_history(older: dict, newer: dict) -> dict:
+    """
+    Compare two serialized snapshots.
+
+    Returns:
+        dict: Maps each changed field to {"old": ..., "new": ...}.
+    """
+    return {
+        field: {"old": older.get(field), "new": newer.get(field)}
+        for field in HISTORY_DIFF_FIELDS
+        if older.get(field) != newer.get(field)
+    }
@@ -0,0 +1,517 @@
+# products/services/hot_stock_service.py
+import logging
+from datetime import timedelta
+from typing import Iterable, List, Optional, Tuple, Union
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils.timezone import now
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from products.models import Product, Size
+
+logger = logging.getLogger("stock_service")
+
+# Return codes of the reservation scripts; on success they return the new
+# (available, reserved) counters
+NOT_HOT = -2
+PRODUCT_SHORT = -1
+SIZE_SHORT = -3
+
+# Resolves the hash of a product (no sizes) or of one of its sizes.
+# KEYS: product key, size key, dirty set. ARGV: quantity, product member, size member.
+_RESOLVE_KEY = """
+local key, member = KEYS[1], ARGV[2]
+if redis.call('EXISTS', key) == 0 then
+    if ARGV[3] == '' or redis.call('EXISTS', KEYS[2]) == 0 then
+        return nil
+    end
+    key, member = KEYS[2], ARGV[3]
+end
+"""
+
+RESERVE_SCRIPT = """
+local function resolve()
+""" + _RESOLVE_KEY + """
+    return {key, member}
+end
+local target = resolve()
+if not target then
+    return -2
+end
+local key, member = target[1], target[2]
+local qty = tonumber(ARGV[1])
+local available = tonumber(redis.call('HGET', key, 'available'))
+if available < qty then
+    if key == KEYS[1] then
+        return -1
+    end
+    return -3
+end
+local reserved = redis.call('HINCRBY', key, 'reserved', qty)
+redis.call('HINCRBY', key, 'available', -qty)
+redis.call('HINCRBY', key, 'd_available', -qty)
+redis.call('HINCRBY', key, 'd_reserved', qty)
+redis.call('SADD', KEYS[3], member)
+return {available - qty, reserved}
+"""
+
+# ARGV[4]: '1' when the stock is returned to available stock.
+# The third value returned is 1 when the reserved quantity had to be clamped
+# at zero.
+UNRESERVE_SCRIPT = """
+local function resolve()
+""" + _RESOLVE_KEY + """
+    return {key, member}
+end
+local target = resolve()
+if not target then
+    return -2
+end
+local key, member = target[1], target[2]
+local qty = tonumber(ARGV[1])
+local reserved = tonumber(redis.call('HGET', key, 'reserved'))
+local released, clamped = qty, 0
+if reserved < qty then
+    released, clamped = math.max(reserved, 0), 1
+end
+if ARGV[4] == '1' then
+    redis.call('HINCRBY', key, 'available', qty)
+    redis.call('HINCRBY', key, 'd_available', qty)
+end
+redis.call('HINCRBY', key, 'reserved', -released)
+redis.call('HINCRBY', key, 'd_reserved', -released)
+redis.call('SADD', KEYS[3], member)
+return {tonumber(redis.call('HGET', key, 'available')), reserved - released, clamped}
+"""
+
+# Takes the pending deltas of the given members (or of every dirty member)
+# and resets them to zero. KEYS: dirty set. ARGV: key prefix, members...
+DRAIN_SCRIPT = """
+local members = {}
+if #ARGV > 1 then
+    for i = 2, #ARGV do
+        table.insert(members, ARGV[i])
+    end
+else
+    members = redis.call('SMEMBERS', KEYS[1])
+end
+local result = {}
+for _, member in ipairs(members) do
+    local key = ARGV[1] .. member
+    redis.call('SREM', KEYS[1], member)
+    local values = redis.call('HMGET', key, 'd_available', 'd_reserved')
+    if values[1] then
+        redis.call('HSET', key, 'd_available', 0, 'd_reserved', 0)
+        if tonumber(values[1]) ~= 0 or tonumber(values[2]) ~= 0 then
+            table.insert(result, {member, values[1], values[2]})
+        end
+    end
+end
+return result
+"""
+
+# Puts back deltas that could not be written to the database.
+# KEYS: hash key, dirty set. ARGV: d_available, d_reserved, member.
+RESTORE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HINCRBY', KEYS[1], 'd_available', ARGV[1])
+redis.call('HINCRBY', KEYS[1], 'd_reserved', ARGV[2])
+redis.call('SADD', KEYS[2], ARGV[3])
+return 1
+"""
+
+# Sets the counters to the database values plus the pending deltas.
+# KEYS: hash key, members set. ARGV: db available, db reserved, member, create.
+SYNC_SCRIPT = """
+if ARGV[4] ~= '1' and redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local d_available = tonumber(redis.call('HGET', KEYS[1], 'd_available') or '0')
+local d_reserved = tonumber(redis.call('HGET', KEYS[1], 'd_reserved') or '0')
+redis.call('HSET', KEYS[1],
+    'available', tonumber(ARGV[1]) + d_available,
+    'reserved', tonumber(ARGV[2]) + d_reserved,
+    'd_available', d_available,
+    'd_reserved', d_reserved)
+redis.call('SADD', KEYS[2], ARGV[3])
+return 1
+"""
+
+# Removes a member and returns its pending deltas.
+# KEYS: hash key, members set, dirty set. ARGV: member.
+POP_SCRIPT = """
+local values = redis.call('HMGET', KEYS[1], 'd_available', 'd_reserved')
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[2], ARGV[1])
+redis.call('SREM', KEYS[3], ARGV[1])
+return values
+"""
+
+
+class HotStockService:
+    """
+    Optional Redis-backed stock counters for hot products.
+
+    Products flagged with `hot_stock` (and, if `HOT_STOCK_INCLUDE_ACTIVE_OFFERS`
+    is set, products with a running offer) are loaded into the django-redis
+    cache by `sync()`. While loaded, reservations are served by atomic Lua
+    scripts instead of MySQL row locks and every change is also recorded as
+    a pending delta. `reconcile()` periodically drains the deltas and applies
+    them to `Product`/`Size` with F() expressions, so writes that reach the
+    database through other paths are never overwritten.
+
+    Setting `HOT_STOCK_ENABLED` to False makes `StockService` use the
+    database only; the next `sync()` then writes back and unloads everything.
+
+    Redis is not durable storage: deltas that were not reconciled yet are
+    lost if Redis loses its data.
+    """
+    KEY_PREFIX = "hot_stock:"
+    MEMBERS_KEY = "hot_stock_members"
+    DIRTY_KEY = "hot_stock_dirty"
+    LOCK_KEY = "hot_stock_lock"
+
+    @staticmethod
+    def enabled() -> bool:
+        return getattr(settings, "HOT_STOCK_ENABLED", False)
+
+    @staticmethod
+    def get_client():
+        return get_redis_connection("default")
+
+    @staticmethod
+    def member(product_id, size=None) -> str:
+        return f"{product_id}:{size}" if size else str(product_id)
+
+    @classmethod
+    def key(cls, member) -> str:
+        return f"{cls.KEY_PREFIX}{member}"
+
+    @staticmethod
+    def parse_member(member):
+        if isinstance(member, bytes):
+            member = member.decode()
+        product_id, _, size = member.partition(":")
+        return int(product_id), size or None
+
+    # -------------------------------
+    # Reservations
+    # -------------------------------
+    @classmethod
+    def reserve(cls, product_id, quantity, size=None) -> Optional[Tuple[int, int]]:
+        """
+        Reserve stock in Redis if the product (or size) is loaded.
+
+        Returns:
+            tuple: The new (available, reserved) counters if the reservation
+            was served by Redis, None if the item is not hot and the
+            database path must be used.
+
+        Raises:
+            ValidationError: If insufficient stock is available, or if Redis
+                             is unreachable for a product flagged as hot.
+        """
+        result = cls._run_stock_script(
+            RESERVE_SCRIPT, product_id, quantity, size)
+        if result == NOT_HOT:
+            return None
+        if result == SIZE_SHORT:
+            logger.error(
+                "Not enough stock available for size %s of product %s.", size, product_id)
+            raise ValidationError("Not enough stock available for this size.")
+        if result == PRODUCT_SHORT:
+            logger.error(
+                "Not enough stock available for product %s.", product_id)
+            raise ValidationError("Not enough stock available.")
+        available, reserved = result
+        return available, reserved
+
+    @classmethod
+    def unreserve(cls, product_id, quantity, size=None, returned=True) -> Optional[Tuple[int, int]]:
+        """
+        Unreserve stock in Redis if the product (or size) is loaded.
+
+        Returns:
+            tuple: The new (available, reserved) counters if served by Redis,
+            None if the database path must be used.
+        """
+        result = cls._run_stock_script(
+            UNRESERVE_SCRIPT, product_id, quantity, size, "1" if returned else "0")
+        if result == NOT_HOT:
+            return None
+        available, reserved, clamped = result
+        if clamped:
+            logger.warning(
+                "Reserved quantity for %s went negative (adjusting to 0).",
+                cls.member(product_id, size)
+            )
+        return available, reserved
+
+    @staticmethod
+    def get_row(product_id, size, counters) -> Union[Product, Size]:
+        """
+        The Product (or, for products with sizes, the Size) whose stock is
+        served by Redis, read without a lock and carrying the Redis
+        `counters` as its quantities, as the database path returns it.
+        """
+        row = None
+        if size:
+            row = Size.objects.filter(
+                product_id=product_id, size=size, product__has_sizes=True).first()
+        if row is None:
+            row = Product.objects.get(pk=product_id)
+        row.available_quantity, row.reserved_quantity = counters
+        return row
+
+    @classmethod
+    def _run_stock_script(cls, script, product_id, quantity, size, *extra_args):
+        product_member = cls.member(product_id)
+        size_member = cls.member(product_id, size) if size else ""
+        try:
+            client = cls.get_client()
+            return client.register_script(script)(
+                keys=[cls.key(product_member),
+                      cls.key(size_member or product_member),
+                      cls.DIRTY_KEY],
+                args=[quantity, product_member, size_member, *extra_args],
+            )
+        except RedisError as e:
+            # Without Redis we cannot tell whether the counters live there;
+            # only fall back to the database for products that are not hot.
+            # A product whose offer ended since the last sync may still be
+            # loaded: a database write would not reach its Redis counters.
+            logger.error("Hot stock backend unavailable: %s", e)
+            loaded_since = now() - timedelta(seconds=settings.HOT_STOCK_SYNC_SECONDS)
+            if Product.objects.filter(cls.hot_filter(loaded_since), pk=product_id).exists():
+                raise ValidationError(
+                    "Stock is temporarily unavailable, please try again.")
+            return NOT_HOT
+
+    # -------------------------------
+    # Loading / unloading
+    # -------------------------------
+    @staticmethod
+    def hot_filter(offer_ended_since=None) -> Q:
+        """
+        Products that should currently be served from Redis; with
+        `offer_ended_since`, also those whose offer ended since then.
+        """
+        hot = Q(hot_stock=True)
+        if getattr(settings, "HOT_STOCK_INCLUDE_ACTIVE_OFFERS", False):
+            current_time = now()
+            hot |= Q(offer__start_date__lte=current_time,
+                     offer__end_date__gte=offer_ended_since or current_time)
+        return hot
+
+    @classmethod
+    def hot_product_ids(cls) -> set:
+        """IDs of the products that should currently be served from Redis."""
+        return set(Product.objects.filter(cls.hot_filter()).values_list("id", flat=True))
+
+    @classmethod
+    def loaded_members(cls) -> List[str]:
+        return sorted(member.decode() if isinstance(member, bytes) else member
+                      for member in cls.get_client().smembers(cls.MEMBERS_KEY))
+
+    @classmethod
+    def loaded_product_ids(cls) -> set:
+        return {cls.parse_member(member)[0] for member in cls.loaded_members()}
+
+    @classmethod
+    @transaction.atomic
+    def load(cls, product_ids: Iterable[int]):
+        """
+        Copy the stock of the given products (and their sizes) into Redis.
+
+        The rows are locked while loading so that no database-path
+        reservation can slip in between the read and the copy.
+        """
+        products = list(Product.objects.select_for_update().filter(
+            pk__in=list(product_ids)).order_by("pk"))
+        sizes = list(Size.objects.select_for_update().filter(
+            product__in=products).order_by("pk"))
+        cls._sync_rows(products, sizes, create=True)
+        logger.info("Loaded %d products into hot stock.", len(products))
+
+    @classmethod
+    @transaction.atomic
+    def unload(cls, product_ids: Iterable[int]):
+        """
+        Write back the pending deltas of the given products and remove them
+        from Redis. Subsequent reservations use the database path.
+        """
+        product_ids = set(product_ids)
+        # Lock first so database-path reservations wait for the write-back
+        list(Product.objects.all_with_deleted().select_for_update().filter(
+            pk__in=product_ids).order_by("pk").values_list("pk", flat=True))
+        members = [member for member in cls.loaded_members()
+                   if cls.parse_member(member)[0] in product_ids]
+        pop = cls.get_client().register_script(POP_SCRIPT)
+        deltas = []
+        for member in members:
+            d_available, d_reserved = pop(
+                keys=[cls.key(member), cls.MEMBERS_KEY, cls.DIRTY_KEY], args=[member])
+            if d_available is not None:
+                deltas.append((member, int(d_available), int(d_reserved)))
+        cls._apply_deltas(deltas)
+        logger.info("Unloaded %d products from hot stock.", len(product_ids))
+
+    @classmethod
+    def resync(cls, product_ids: Iterable[int]):
+        """
+        Refresh the Redis counters of loaded products from the database,
+        keeping deltas that were not reconciled yet. Used after stock was
+        changed through the database (e.g. a seller updating quantities).
+        """
+        products = list(Product.objects.filter(pk__in=list(product_ids)))
+        sizes = list(Size.objects.filter(product__in=products))
+        cls._sync_rows(products, sizes, create=False)
+
+    @classmethod
+    def _sync_rows(cls, products, sizes, create):
+        sync = cls.get_client().register_script(SYNC_SCRIPT)
+        rows = [(cls.member(product.pk), product) for product in products
+                if not product.has_sizes]
+        rows += [(cls.member(size.product_id, size.size), size)
+                 for size in sizes]
+        for member, row in rows:
+            sync(keys=[cls.key(member), cls.MEMBERS_KEY],
+                 args=[row.available_quantity or 0, row.reserved_quantity or 0,
+                       member, "1" if create else "0"])
+
+    # -------------------------------
+    # Write-behind
+    # -------------------------------
+    @classmethod
+    def reconcile(cls, product_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Apply the pending Redis deltas to the database and refresh the Redis
+        counters from the result.
+
+        Args:
+            product_ids (Iterable[int], optional): Limit to these products.
+            By default every dirty product is reconciled.
+
+        Returns:
+            int: Number of products or sizes written.
+        """
+        members = []
+        if product_ids is not None:
+            product_ids = set(product_ids)
+            members = [member for member in cls.loaded_members()
+                       if cls.parse_member(member)[0] in product_ids]
+            if not members:
+                return 0
+
+        client = cls.get_client()
+        drained = client.register_script(DRAIN_SCRIPT)(
+            keys=[cls.DIRTY_KEY], args=[cls.KEY_PREFIX, *members])
+        deltas = [(member.decode(), int(d_available), int(d_reserved))
+                  for member, d_available, d_reserved in drained]
+        if not deltas:
+            return 0
+        try:
+            cls._apply_deltas(deltas)
+        except Exception:
+            restore = client.register_script(RESTORE_SCRIPT)
+            for member, d_available, d_reserved in deltas:
+                restore(keys=[cls.key(member), cls.DIRTY_KEY],
+                        args=[d_available, d_reserved, member])
+            raise
+        cls.resync({cls.parse_member(member)[0] for member, _, _ in deltas})
+        return len(deltas)
+
+    @staticmethod
+    @transaction.atomic
+    def _apply_deltas(deltas):
+        """Apply (member, d_available, d_reserved) deltas with F() expressions."""
+        product_ids = set()
+        for member, d_available, d_reserved in deltas:
+            product_id, size = HotStockService.parse_member(member)
+            product_ids.add(product_id)
+            if size:
+                queryset = Size.all_objects.filter(
+                    product_id=product_id, size=size)
+            else:
+                queryset = Product.objects.all_with_deleted().filter(pk=product_id)
+            queryset.update(
+                available_quantity=F("available_quantity") + d_available,
+                reserved_quantity=Case(
+                    When(reserved_quantity__gte=-d_reserved,
+                         then=F("reserved_quantity") + d_reserved),
+                    default=Value(0),
+                ),
+            )
+        Product.objects.all_with_deleted().filter(
+            pk__in=product_ids).refresh_availability()
+
+    @classmethod
+    def sync(cls) -> dict:
+        """
+        Bring Redis in line with the hot flags: load newly hot products,
+        write back and unload the others, then reconcile the rest. When the
+        backend is disabled everything is unloaded.
+        """
+        client = cls.get_client()
+        lock = client.lock(cls.LOCK_KEY, timeout=300, blocking=False)
+        if not lock.acquire():
+            logger.info("Hot stock sync already running, skipping.")
+            return {"loaded": 0, "unloaded": 0, "reconciled": 0}
+        try:
+            loaded = cls.loaded_product_ids()
+            wanted = cls.hot_product_ids() if cls.enabled() else set()
+            to_unload = loaded - wanted
+            to_load = wanted - loaded
+            if to_unload:
+                cls.unload(to_unload)
+            reconciled = cls.reconcile()
+            if to_load:
+                cls.load(to_load)
+            return {"loaded": len(to_load), "unloaded": len(to_unload),
+                    "reconciled": reconciled}
+        finally:
+            lock.release()
+
+    @classmethod
+    def audit(cls) -> List[dict]:
+        """
+        Compare the Redis counters of every loaded member with the database.
+
+        A member is consistent when the Redis counters equal the database
+        values plus the pending deltas.
+        """
+        client = cls.get_client()
+        rows = []
+        for member in cls.loaded_members():
+            product_id, size = cls.parse_member(member)
+            values = client.hmget(
+                cls.key(member), "available", "reserved", "d_available", "d_reserved")
+            redis_available, redis_reserved, d_available, d_reserved = (
+                int(value) if value is not None else 0 for value in values)
+            if size:
+                db_row = Size.all_objects.filter(
+                    product_id=product_id, size=size).values(
+                    "available_quantity", "reserved_quantity").first()
+            else:
+                db_row = Product.objects.all_with_deleted().filter(
+                    pk=product_id).values(
+                    "available_quantity", "reserved_quantity").first()
+            db_available = db_row["available_quantity"] if db_row else None
+            db_reserved = db_row["reserved_quantity"] if db_row else None
+            rows.append({
+                "member": member,
+                "redis_available": redis_available,
+                "redis_reserved": redis_reserved,
+                "pending_available": d_available,
+                "pending_reserved": d_reserved,
+                "db_available": db_available,
+                "db_reserved": db_reserved,
+                "consistent": db_row is not None
+                and redis_available == (db_available or 0) + d_available
+                and redis_reserved == (db_reserved or 0) + d_reserved,
+            })
+        return rows
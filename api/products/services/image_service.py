@@ -0,0 +1,107 @@
+# products/services/image_service.py
+import io
+import logging
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+from products.models import MediaFile, Product
+from products.services.listing_cache_service import invalidate_product_listings
+
+logger = logging.getLogger("image_service")
+
+
+def enqueue_picture_processing(product_id):
+    """Schedule `process_product_picture_task` once the current transaction commits."""
+    def enqueue():
+        # Imported here: products.tasks imports this module
+        from products.tasks import process_product_picture_task
+        try:
+            process_product_picture_task.delay(product_id)
+        except Exception as e:
+            logger.error(f"Could not queue picture processing of product {product_id}: {e}")
+    transaction.on_commit(enqueue)
+
+
+class ProductImageService:
+    """
+    A static service class that derives the resized variants of a product
+    picture (see `Product.picture_variants`).
+
+    Every size of `VARIANT_SIZES` is written as a JPEG and a WebP copy
+    (`<name>` and `<name>_webp`) to the picture's storage, which stores
+    identical files once (see `ContentAddressedStorage`). Images are
+    rotated according to their EXIF orientation and re-encoded without
+    EXIF, ICC or other metadata. Sizes are bounding boxes; pictures are
+    never upscaled.
+    """
+    VARIANT_SIZES = {"thumbnail": 320, "medium": 960}
+    JPEG_QUALITY = 80
+    WEBP_QUALITY = 75
+
+    @classmethod
+    def process(cls, product_id) -> dict:
+        """
+        Write the variants of the product's current picture and record them
+        on the product. Variants of earlier pictures are released.
+
+        Returns:
+            dict: Variant name to storage path; empty when the product has
+            no picture or its picture changed while processing.
+        """
+        product = Product.objects.all_with_deleted().filter(
+            pk=product_id).only("id", "picture").first()
+        if product is None or not product.picture:
+            return {}
+        picture_name = product.picture.name
+        storage = product.picture.storage
+        with storage.open(picture_name, "rb") as f:
+            image = Image.open(f)
+            image.load()
+        image = ImageOps.exif_transpose(image)
+
+        variants = {}
+        for name, size in cls.VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            for key, extension, content in (
+                    (name, "jpg", cls.encode_jpeg(resized)),
+                    (f"{name}_webp", "webp", cls.encode_webp(resized))):
+                variants[key] = storage.save(
+                    f"products/variants/{name}.{extension}", ContentFile(content))
+
+        with transaction.atomic():
+            previous = Product.objects.all_with_deleted().select_for_update().filter(
+                pk=product_id, picture=picture_name,
+            ).values_list("picture_variants", flat=True).first()
+            if previous is None:
+                # A newer picture was uploaded meanwhile; its own task handles it
+                MediaFile.objects.release(variants.values())
+                return {}
+            Product.objects.all_with_deleted().filter(pk=product_id).update(
+                picture_variants=variants)
+            MediaFile.objects.release(previous.values())
+        invalidate_product_listings()
+        return variants
+
+    @classmethod
+    def encode_jpeg(cls, image) -> bytes:
+        if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+            # JPEG has no alpha channel: flatten onto white
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=cls.JPEG_QUALITY,
+                   optimize=True, progressive=True)
+        return buffer.getvalue()
+
+    @classmethod
+    def encode_webp(cls, image) -> bytes:
+        has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, "WEBP", quality=cls.WEBP_QUALITY, method=4)
+        return buffer.getvalue()
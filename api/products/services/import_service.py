@@ -0,0 +1,194 @@
+# products/services/import_service.py
+import csv
+import io
+import json
+import logging
+from django.db import transaction
+from django.utils.timezone import now
+from rest_framework import serializers
+from products.models import Product, ProductImport, ProductTag, Size, Tag
+from products.serializers import ProductImportRowSerializer
+from products.services.history_service import enqueue_product_history
+from products.services.listing_cache_service import invalidate_product_listings
+from products.services.search_index_service import enqueue_product_indexing
+
+logger = logging.getLogger("import_service")
+
+# CSV columns holding JSON values
+CSV_JSON_COLUMNS = {"properties", "sizes", "tags"}
+
+
+class ProductImportService:
+    """
+    A static service class that creates products from a CSV or JSONL
+    upload (see `ProductImport`).
+
+    The file is streamed row by row. Rows are validated in chunks with
+    `ProductImportRowSerializer`; the valid rows of a chunk are written in
+    one transaction: tags are resolved with one query, and products, sizes
+    and product tags are inserted with `bulk_create`. Invalid rows are
+    reported on the import and do not stop it.
+    """
+    CHUNK_SIZE = 500
+
+    @classmethod
+    def run(cls, import_id) -> int:
+        """
+        Process a pending import.
+
+        Returns:
+            int: Number of products created.
+        """
+        product_import = ProductImport.objects.select_related("store").get(pk=import_id)
+        product_import.status = ProductImport.RUNNING
+        product_import.save(update_fields=["status"])
+        try:
+            chunk = []
+            for row_number, row in cls.read_rows(product_import):
+                chunk.append((row_number, row))
+                if len(chunk) >= cls.CHUNK_SIZE:
+                    cls._process_chunk(product_import, chunk)
+                    chunk = []
+            if chunk:
+                cls._process_chunk(product_import, chunk)
+        except Exception as e:
+            logger.error(f"Product import {import_id} failed: {e}", exc_info=True)
+            product_import.status = ProductImport.FAILED
+            product_import.detail = str(e)
+        else:
+            product_import.status = ProductImport.COMPLETED
+            logger.info(
+                f"Product import {import_id}: {product_import.created_count} created, "
+                f"{product_import.error_count} rejected.")
+        product_import.finished_at = now()
+        product_import.save(update_fields=["status", "detail", "finished_at"])
+        product_import.file.delete(save=True)
+        return product_import.created_count
+
+    @staticmethod
+    def read_rows(product_import):
+        """
+        Yield `(row_number, row)` for every data row of the file, where row
+        is a dict, or a `ValidationError` for a row that cannot be parsed.
+        Row numbers start at 1 with the first data row.
+        """
+        with product_import.file.open("rb") as raw:
+            text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+            if product_import.file_format == ProductImport.CSV:
+                for row_number, row in enumerate(csv.DictReader(text), start=1):
+                    yield row_number, _parse_csv_row(row)
+                return
+            row_number = 0
+            for line in text:
+                if not line.strip():
+                    continue
+                row_number += 1
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    row = serializers.ValidationError({"non_field_errors": ["Invalid JSON."]})
+                if not isinstance(row, (dict, serializers.ValidationError)):
+                    row = serializers.ValidationError(
+                        {"non_field_errors": ["Each line must be a JSON object."]})
+                yield row_number, row
+
+    @classmethod
+    def _process_chunk(cls, product_import, chunk):
+        """Validate a chunk of rows, insert the valid ones and record progress."""
+        validator = ProductImportRowSerializer()
+        valid_rows = []
+        errors = []
+        for row_number, row in chunk:
+            try:
+                if isinstance(row, serializers.ValidationError):
+                    raise row
+                valid_rows.append(validator.run_validation(row))
+            except serializers.ValidationError as e:
+                errors.append({"row": row_number,
+                               "errors": serializers.as_serializer_error(e)})
+
+        created = cls._insert_products(product_import, valid_rows) if valid_rows else 0
+
+        product_import.processed_rows += len(chunk)
+        product_import.created_count += created
+        product_import.error_count += len(errors)
+        room = ProductImport.MAX_REPORTED_ERRORS - len(product_import.errors)
+        product_import.errors.extend(errors[:max(room, 0)])
+        product_import.save(update_fields=[
+            "processed_rows", "created_count", "error_count", "errors"])
+
+    @staticmethod
+    @transaction.atomic
+    def _insert_products(product_import, rows) -> int:
+        """Insert validated rows with their sizes and tags; returns the number of products."""
+        tags = Tag.objects.resolve(name for attrs in rows for name in attrs["tags"])
+
+        products = []
+        for attrs in rows:
+            sizes = attrs["sizes"]
+            has_sizes = attrs["has_sizes"]
+            product = Product(
+                product_name=attrs["product_name"],
+                product_description=attrs["product_description"],
+                price=attrs["price"],
+                effective_price=attrs["price"],
+                brand=attrs.get("brand"),
+                category=attrs["category"],
+                classification=attrs.get("classification"),
+                color=attrs.get("color"),
+                properties=attrs.get("properties"),
+                has_sizes=has_sizes,
+                available_quantity=None if has_sizes else attrs["available_quantity"],
+                reserved_quantity=None if has_sizes else 0,
+                active_sizes_count=len(sizes) if has_sizes else 0,
+                in_stock_sizes_count=sum(
+                    1 for size in sizes if size["available_quantity"] > 0) if has_sizes else 0,
+                owner_id=product_import.owner,
+                store=product_import.store,
+                product_import=product_import,
+            )
+            product.availability_status = product.compute_availability_status()
+            products.append(product)
+        last_pk = Product.objects.all_with_deleted().filter(
+            product_import=product_import).order_by("-pk").values_list("pk", flat=True).first()
+        Product.objects.bulk_create(products)
+        # MySQL does not return the ids of bulk inserts; ids of one import
+        # increase in insertion order.
+        product_ids = list(Product.objects.all_with_deleted().filter(
+            product_import=product_import, pk__gt=last_pk or 0,
+        ).order_by("pk").values_list("pk", flat=True))
+
+        new_sizes = []
+        product_tags = []
+        for product_id, attrs in zip(product_ids, rows):
+            if attrs["has_sizes"]:
+                new_sizes.extend(
+                    Size(product_id=product_id, size=size["size"],
+                         available_quantity=size["available_quantity"], reserved_quantity=0)
+                    for size in attrs["sizes"])
+            product_tags.extend(
+                ProductTag(product_id=product_id, tag_id=tags[name])
+                for name in dict.fromkeys(attrs["tags"]))
+        Size.objects.bulk_create(new_sizes)
+        ProductTag.objects.bulk_create(product_tags)
+
+        # bulk_create sends no signals
+        enqueue_product_history(product_ids)
+        invalidate_product_listings()
+        enqueue_product_indexing(product_ids)
+        return len(product_ids)
+
+
+def _parse_csv_row(row):
+    """Drop empty cells and decode the JSON columns of a CSV row."""
+    parsed = {}
+    for column, value in row.items():
+        if column is None or value is None or value == "":
+            continue
+        if column in CSV_JSON_COLUMNS:
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError:
+                return serializers.ValidationError({column: ["Invalid JSON."]})
+        parsed[column] = value
+    return parsed
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import logging
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger("listing_cache_service")
+
+# Bumped on every change to listed data; part of every cache key, so a bump
+# makes all cached listings unreachable at once.
+GENERATION_KEY = "products:list:generation"
+KEY_PREFIX = "products:list"
+
+# Set while an invalidation of the current transaction awaits its commit
+_pending = threading.local()
+
+
+def listing_cache_enabled() -> bool:
+    return settings.PRODUCT_LIST_CACHE_SECONDS > 0
+
+
+def invalidate_product_listings():
+    """
+    Invalidate every cached product listing once the current transaction
+    commits. Calls within the same transaction are coalesced into a single
+    generation bump.
+    """
+    if not listing_cache_enabled():
+        return
+    _pending.invalidate = True
+    # Every call registers the bump: callbacks of rolled back savepoints are
+    # discarded, and the first callback that runs clears the flag.
+    transaction.on_commit(_bump_generation)
+
+
+def _bump_generation():
+    if not getattr(_pending, "invalidate", False):
+        return
+    _pending.invalidate = False
+    try:
+        cache.add(GENERATION_KEY, 0, timeout=None)
+        cache.incr(GENERATION_KEY)
+    except Exception as e:
+        logger.error(f"Could not invalidate the product list cache: {e}")
+
+
+def get_listing_cache_key(request):
+    """
+    Cache key of a product list response: the URL with its query params
+    sorted by name, at the current generation. Returns None when the cache
+    is disabled or unreachable.
+    """
+    if not listing_cache_enabled():
+        return None
+    params = sorted((name, request.query_params.getlist(name))
+                    for name in request.query_params)
+    # Pagination links are absolute, so the host is part of the key
+    url = request.build_absolute_uri(request.path)
+    digest = hashlib.sha256(json.dumps([url, params]).encode()).hexdigest()
+    try:
+        # Read before the listing is queried: a write that commits meanwhile
+        # bumps the generation and the entry is never served.
+        generation = cache.get_or_set(GENERATION_KEY, 0, timeout=None)
+    except Exception as e:
+        logger.error(f"Product list cache unavailable: {e}")
+        return None
+    return f"{KEY_PREFIX}:{generation}:{digest}"
+
+
+def get_cached_listing(key):
+    """Cached response data for the key, or None."""
+    if key is None:
+        return None
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logger.error(f"Could not read the product list cache: {e}")
+        return None
+
+
+def set_cached_listing(key, data):
+    if key is None:
+        return
+    try:
+        cache.set(key, data, timeout=settings.PRODUCT_LIST_CACHE_SECONDS)
+    except Exception as e:
+        logger.error(f"Could not write the product list cache: {e}")
@@ -0,0 +1,57 @@
+# products/services/offer_pricing_service.py
+import logging
+from datetime import timedelta
+from django.db.models import Q
+from django.utils.timezone import now
+from products.models import Offer
+
+logger = logging.getLogger("offer_pricing_service")
+
+# Offer starts and ends within this window are scheduled to the second;
+# later ones are scheduled by a later run of `refresh_offer_pricing_task`
+# (every minute), so far-off offers do not wait in the broker.
+SCHEDULE_HORIZON = timedelta(minutes=2)
+# An offer is active up to and including its end date
+END_DELAY = timedelta(seconds=1)
+
+
+def schedule_offer_repricing(offers, current_time=None) -> int:
+    """
+    Queue `reprice_products_task` at the start and right after the end of
+    each offer that falls within `SCHEDULE_HORIZON`, so the stored
+    `effective_price` and `has_active_offer` flip on time for price sorting
+    and the `has_offer` filter.
+
+    Returns:
+        int: Number of tasks queued.
+    """
+    current_time = current_time or now()
+    moments = {}
+    for offer in offers:
+        for moment in (offer.start_date, offer.end_date + END_DELAY):
+            if current_time < moment <= current_time + SCHEDULE_HORIZON:
+                moments.setdefault(moment, []).append(offer.product_id)
+    if not moments:
+        return 0
+    # Imported here: products.tasks imports this module
+    from products.tasks import reprice_products_task
+    queued = 0
+    for moment, product_ids in sorted(moments.items()):
+        try:
+            reprice_products_task.apply_async((product_ids,), eta=moment)
+            queued += 1
+        except Exception as e:
+            # The next run of `refresh_offer_pricing_task` flips them
+            logger.error(f"Could not schedule repricing of products {product_ids}: {e}")
+    return queued
+
+
+def schedule_upcoming_offer_repricing(current_time=None) -> int:
+    """Schedule the offers that start or end within `SCHEDULE_HORIZON`."""
+    current_time = current_time or now()
+    until = current_time + SCHEDULE_HORIZON
+    offers = Offer.objects.filter(
+        Q(start_date__gt=current_time, start_date__lte=until)
+        | Q(end_date__gt=current_time - END_DELAY, end_date__lte=until)
+    ).only("product_id", "start_date", "end_date")
+    return schedule_offer_repricing(offers, current_time)
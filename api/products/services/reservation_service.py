@@ -0,0 +1,160 @@
+# products/services/reservation_service.py
+import logging
+from datetime import timedelta
+from typing import Optional
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils.timezone import now
+from products.models import Size, StockReservation
+from products.services.stock_service import StockService
+
+logger = logging.getLogger("stock_service")
+
+
+class ReservationService:
+    """
+    A static service class that records stock holds in the
+    `StockReservation` ledger, so that holds which are never checked out
+    are returned to available stock once they expire.
+
+    The stock itself is always moved through `StockService`.
+    """
+    @staticmethod
+    def default_ttl() -> timedelta:
+        return timedelta(minutes=getattr(settings, "STOCK_RESERVATION_TTL_MINUTES", 15))
+
+    @staticmethod
+    @transaction.atomic
+    def hold(product_id, quantity, size=None, cart=None,
+             ttl: Optional[timedelta] = None) -> StockReservation:
+        """
+        Reserve stock and record the hold in the ledger.
+
+        Args:
+            product_id (int): ID of the product to reserve.
+            quantity (int): Quantity of stock to reserve.
+            size (str, optional): Size variant to reserve if the product has sizes.
+            cart (Cart, optional): Cart the hold belongs to.
+            ttl (timedelta, optional): Lifetime of the hold. Defaults to
+                `STOCK_RESERVATION_TTL_MINUTES`.
+
+        Returns:
+            StockReservation: The ledger entry.
+
+        Raises:
+            ValidationError: If the size is required but not provided, or
+                             if insufficient stock is available.
+        """
+        StockService.reserve_stock(product_id, quantity, size)
+        return StockReservation.objects.create(
+            product_id=product_id,
+            size=size or None,
+            quantity=quantity,
+            cart=cart,
+            expires_at=now() + (ttl or ReservationService.default_ttl()),
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def release(reservation_id) -> StockReservation:
+        """
+        Return the stock of an active hold to available stock.
+        Releasing a hold that is no longer active does nothing.
+        """
+        reservation = StockReservation.objects.select_for_update().get(pk=reservation_id)
+        if reservation.status != StockReservation.ACTIVE:
+            return reservation
+        StockService.unreserve_stock(
+            reservation.product_id, reservation.quantity, reservation.size)
+        reservation.status = StockReservation.RELEASED
+        reservation.released_at = now()
+        reservation.save(update_fields=["status", "released_at"])
+        return reservation
+
+    @staticmethod
+    @transaction.atomic
+    def complete(reservation_id) -> StockReservation:
+        """
+        Consume an active hold (e.g. after payment): the reserved stock is
+        removed without being returned to available stock.
+
+        Raises:
+            ValidationError: If the hold was already released or completed.
+        """
+        reservation = StockReservation.objects.select_for_update().get(pk=reservation_id)
+        if reservation.status != StockReservation.ACTIVE:
+            logger.error("Reservation %s is no longer active.", reservation_id)
+            raise ValidationError("Reservation is no longer active.")
+        StockService.unreserve_stock(
+            reservation.product_id, reservation.quantity, reservation.size,
+            returned=False)
+        reservation.status = StockReservation.COMPLETED
+        reservation.released_at = now()
+        reservation.save(update_fields=["status", "released_at"])
+        return reservation
+
+    # -------------------------------
+    # Expiry sweep
+    # -------------------------------
+    @classmethod
+    def release_expired(cls, batch_size=500) -> int:
+        """
+        Release every expired hold and every active hold of an abandoned cart.
+
+        Holds are processed in batches; each batch is locked, returned to
+        stock with a single `StockService.unreserve_many()` call and marked
+        released with one UPDATE.
+
+        Returns:
+            int: Number of holds released.
+        """
+        current_time = now()
+        released = 0
+        for condition in (Q(expires_at__lte=current_time),
+                          Q(cart__status="abandoned")):
+            while True:
+                count = cls._release_batch(condition, batch_size, current_time)
+                released += count
+                if count < batch_size:
+                    break
+        if released:
+            logger.info("Released %d expired stock reservations.", released)
+        return released
+
+    @staticmethod
+    @transaction.atomic
+    def _release_batch(condition, batch_size, current_time) -> int:
+        holds = list(
+            StockReservation.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(condition, status=StockReservation.ACTIVE)
+            .order_by("expires_at")
+            .values("pk", "product_id", "size", "quantity",
+                    "product__is_deleted", "product__has_sizes")[:batch_size]
+        )
+        if not holds:
+            return 0
+
+        # Holds on deleted products or sizes have no stock left to return
+        sized = [hold for hold in holds if hold["product__has_sizes"] and hold["size"]]
+        live_sizes = set()
+        if sized:
+            live_sizes = set(Size.objects.filter(
+                product_id__in={hold["product_id"] for hold in sized},
+                size__in={hold["size"] for hold in sized},
+            ).values_list("product_id", "size"))
+        lines = [
+            (hold["product_id"], hold["size"] if hold["product__has_sizes"] else None,
+             hold["quantity"])
+            for hold in holds
+            if not hold["product__is_deleted"]
+            and (not hold["product__has_sizes"]
+                 or (hold["product_id"], hold["size"]) in live_sizes)
+        ]
+        if lines:
+            StockService.unreserve_many(lines)
+
+        StockReservation.objects.filter(pk__in=[hold["pk"] for hold in holds]).update(
+            status=StockReservation.RELEASED, released_at=current_time)
+        return len(holds)
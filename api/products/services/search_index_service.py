@@ -0,0 +1,154 @@
+# products/services/search_index_service.py
+import hashlib
+import json
+import logging
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django_elasticsearch_dsl.apps import DEDConfig
+from django_elasticsearch_dsl.registries import registry
+from products.models import Product
+
+logger = logging.getLogger("search_index_service")
+
+# Set while a product waits for a queued `index_products_task`
+QUEUED_KEY_PREFIX = "search:queued"
+# Fingerprint of the last document pushed for a product
+FINGERPRINT_KEY_PREFIX = "search:fingerprint"
+FINGERPRINT_SECONDS = 24 * 60 * 60
+DELETED = "deleted"
+# Index being rebuilt behind an alias (see the `reindex_products` command);
+# changes are written to it as well as to the alias while it loads
+BUILDING_KEY_PREFIX = "search:building"
+
+# Product ids changed in the current transaction, flushed on commit
+_pending = threading.local()
+
+
+def enqueue_product_indexing(product_ids):
+    """
+    Schedule re-indexing of the given products once the current transaction
+    commits. Ids enqueued within the same transaction are coalesced, and
+    products already waiting for a queued `index_products_task` join it
+    instead of queueing another one (see `SEARCH_INDEX_DELAY_SECONDS`).
+    """
+    product_ids = set(product_ids)
+    if not product_ids or not DEDConfig.autosync_enabled():
+        return
+    ids = getattr(_pending, "ids", None)
+    if ids is None:
+        ids = _pending.ids = set()
+    ids.update(product_ids)
+    # Every call registers the flush: callbacks of rolled back savepoints are
+    # discarded, and the first callback that runs takes all pending ids.
+    transaction.on_commit(_flush_pending_indexing)
+
+
+def _flush_pending_indexing():
+    ids = getattr(_pending, "ids", None)
+    if not ids:
+        return
+    _pending.ids = set()
+    delay = settings.SEARCH_INDEX_DELAY_SECONDS
+    ids = sorted(ids)
+    try:
+        # The key outlives the countdown so a lost task does not block indexing for long
+        ids = [product_id for product_id in ids
+               if cache.add(f"{QUEUED_KEY_PREFIX}:{product_id}", True, timeout=delay + 60)]
+    except Exception as e:
+        # The transaction is committed: queue every product rather than fail
+        logger.error(f"Search index queue unavailable, queueing without coalescing: {e}")
+    if not ids:
+        return
+    # Imported here: products.tasks imports this module
+    from products.tasks import index_products_task
+    try:
+        index_products_task.apply_async((ids,), countdown=delay)
+    except Exception as e:
+        logger.error(f"Could not queue search indexing, indexing inline: {e}")
+        index_products(ids)
+
+
+def index_products(product_ids) -> dict:
+    """
+    Push the current search documents of the given products with one bulk
+    request per document class.
+
+    Products that are deleted (soft or hard) are removed from the index.
+    Documents identical to the last one pushed, such as after a stock
+    change that moved no indexed value, are skipped. Changes also go to
+    an index being rebuilt for the same alias, if any.
+
+    Returns:
+        dict: Number of documents indexed, deleted and skipped.
+    """
+    product_ids = set(product_ids)
+    counts = {"indexed": 0, "deleted": 0, "skipped": 0}
+    # Changes from now on queue a new task; this one reads them or misses them
+    try:
+        cache.delete_many([f"{QUEUED_KEY_PREFIX}:{product_id}" for product_id in product_ids])
+    except Exception as e:
+        logger.error(f"Could not clear the search index queue: {e}")
+    if not product_ids or not DEDConfig.autosync_enabled():
+        return counts
+
+    for document_class in registry.get_documents(models=[Product]):
+        document = document_class()
+        index = document._index._name
+        indices = [index]
+        keys = {product_id: f"{FINGERPRINT_KEY_PREFIX}:{index}:{product_id}"
+                for product_id in product_ids}
+        try:
+            building = cache.get(f"{BUILDING_KEY_PREFIX}:{index}")
+            pushed = cache.get_many(keys.values())
+        except Exception as e:
+            # Every document is pushed; a rebuild catches up with its changes
+            logger.error(f"Search index cache unavailable: {e}")
+            building, pushed = None, {}
+        if building:
+            indices.append(building)
+
+        actions = []
+        fingerprints = {}
+        products = list(document.get_queryset().filter(pk__in=product_ids))
+        for product in products:
+            source = document.prepare(product)
+            fingerprint = hashlib.sha1(
+                json.dumps(source, sort_keys=True, default=str).encode()).hexdigest()
+            if pushed.get(keys[product.pk]) == fingerprint:
+                counts["skipped"] += 1
+                continue
+            fingerprints[product.pk] = fingerprint
+            actions.extend({"_op_type": "index", "_index": name,
+                            "_id": document.generate_id(product), "_source": source}
+                           for name in indices)
+        for product_id in product_ids - {product.pk for product in products}:
+            if pushed.get(keys[product_id]) == DELETED:
+                counts["skipped"] += 1
+                continue
+            fingerprints[product_id] = DELETED
+            actions.extend({"_op_type": "delete", "_index": name, "_id": product_id}
+                           for name in indices)
+        if not actions:
+            continue
+
+        _, errors = document.bulk(actions, raise_on_error=False,
+                                  refresh=document.django.auto_refresh)
+        for error in errors:
+            (operation, result), = error.items()
+            if operation == "delete" and result.get("status") == 404:
+                # Never indexed, or already removed
+                continue
+            logger.error(f"Could not index product {result.get('_id')}: {result.get('error')}")
+            # Retried on its next change
+            fingerprints.pop(int(result["_id"]), None)
+        for fingerprint in fingerprints.values():
+            counts["deleted" if fingerprint == DELETED else "indexed"] += 1
+        try:
+            cache.set_many({keys[product_id]: fingerprint
+                            for product_id, fingerprint in fingerprints.items()},
+                           timeout=FINGERPRINT_SECONDS)
+        except Exception as e:
+            logger.error(f"Could not store the search document fingerprints: {e}")
+    return counts
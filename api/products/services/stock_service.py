@@ -1,18 +1,39 @@
 # services/product_stock_service.py
 import logging
+from collections import OrderedDict
 from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
 from django.core.exceptions import ValidationError
-from typing import Union
+from typing import Iterable, List, Optional, Tuple, Union
 from products.models import Product, Size
+from products.services.hot_stock_service import HotStockService
+from products.services.listing_cache_service import invalidate_product_listings
+from products.services.search_index_service import enqueue_product_indexing
 
 logger = logging.getLogger("stock_service")
 
+# How many times a conditional reservation is retried when the stock
+# changed between its UPDATE attempts.
+CONDITIONAL_RESERVE_ATTEMPTS = 3
+
+# Written by stock changes; `Product.save` adds `availability_status`.
+# Limited writes let the search signal processor skip them.
+STOCK_UPDATE_FIELDS = ["available_quantity", "reserved_quantity", "updated_at"]
+SIZE_STOCK_UPDATE_FIELDS = ["available_quantity", "reserved_quantity"]
+
+# A single cart line: (product_id, size or None, quantity)
+StockLine = Tuple[int, Optional[str], int]
+
 
 class StockService:
     """
     A static service class for handling stock operations including reservation
     and unreservation of products and their size variants. All operations are
     atomic to ensure data integrity in concurrent environments.
+
+    When `HOT_STOCK_ENABLED` is set, products loaded into the hot-stock
+    backend are reserved in Redis (see `HotStockService`) and only the
+    remaining items go through the database.
     """
     @staticmethod
     @transaction.atomic
@@ -26,12 +47,18 @@ class StockService:
             size (str, optional): Size variant to reserve if the product has sizes.
 
         Returns:
-            Union[Product, Size]: The updated Product or Size instance.
+            Union[Product, Size]: The updated Product or Size instance. When
+            the reservation was served by the hot-stock backend, it carries
+            the Redis counters (see `HotStockService.get_row`).
 
         Raises:
             ValidationError: If the size is required but not provided, or
                              if insufficient stock is available.
         """
+        if HotStockService.enabled():
+            counters = HotStockService.reserve(product_id, quantity, size)
+            if counters:
+                return HotStockService.get_row(product_id, size, counters)
         product = Product.objects.select_for_update().get(pk=product_id)
 
         if product.has_sizes:
@@ -47,7 +74,7 @@ class StockService:
                     "Not enough stock available for this size.")
             size_obj.available_quantity -= quantity
             size_obj.reserved_quantity += quantity
-            size_obj.save()
+            size_obj.save(update_fields=SIZE_STOCK_UPDATE_FIELDS)
             return size_obj
 
         if product.available_quantity < quantity:
@@ -56,9 +83,130 @@ class StockService:
             raise ValidationError("Not enough stock available.")
         product.available_quantity -= quantity
         product.reserved_quantity += quantity
-        product.save()
+        product.save(update_fields=STOCK_UPDATE_FIELDS)
         return product
 
+    @staticmethod
+    @transaction.atomic
+    def reserve_stock_conditional(product_id, quantity, size=None) -> None:
+        """
+        Reserve stock with a single conditional UPDATE instead of a row lock.
+
+        The decrement is applied by the database as
+        `available_quantity = available_quantity - n` guarded by
+        `available_quantity >= n`, and success is decided from the affected
+        row count. No row is read or locked up front, `save()` is not called
+        and no history snapshot is written, which keeps contention on hot
+        products low.
+
+        A size reservation locks the product row before updating the size,
+        in the same order as `reserve_stock` and `reserve_many`, so it
+        cannot deadlock with them.
+
+        Args:
+            product_id (int): ID of the product to reserve.
+            quantity (int): Quantity of stock to reserve.
+            size (str, optional): Size variant to reserve if the product has sizes.
+                Ignored for products without sizes.
+
+        Raises:
+            ValidationError: If the size is required but not provided, or
+                             if insufficient stock is available.
+            Product.DoesNotExist, Size.DoesNotExist: If the product or size does not exist.
+        """
+        if HotStockService.enabled() and HotStockService.reserve(product_id, quantity, size):
+            return
+        if size:
+            has_sizes = Product.objects.select_for_update().filter(
+                pk=product_id).values_list("has_sizes", flat=True).first()
+            if has_sizes is None:
+                logger.error("Product %s not found.", product_id)
+                raise Product.DoesNotExist(
+                    f"Product {product_id} does not exist.")
+            if has_sizes:
+                StockService._reserve_size_conditional(
+                    product_id, quantity, size)
+                # Queryset updates send no signals
+                invalidate_product_listings()
+                return
+
+        updated = Product.objects.filter(
+            pk=product_id, has_sizes=False, available_quantity__gte=quantity
+        ).update(
+            # Assigned first: MySQL evaluates SET clauses left to right, so the
+            # status must be derived before available_quantity is rewritten.
+            availability_status=Case(
+                When(available_quantity__gt=quantity,
+                     then=Value(Product.AVAILABLE)),
+                default=Value(Product.UNAVAILABLE),
+            ),
+            available_quantity=F("available_quantity") - quantity,
+            reserved_quantity=F("reserved_quantity") + quantity,
+        )
+        if updated:
+            invalidate_product_listings()
+            # The availability may have changed; unchanged documents are not pushed
+            enqueue_product_indexing([product_id])
+            return
+
+        product = Product.objects.only("has_sizes").get(pk=product_id)
+        if product.has_sizes:
+            logger.error("Size must be specified for products with sizes.")
+            raise ValidationError(
+                "Size must be specified for products with sizes.")
+        logger.error(
+            "Not enough stock available for product %s.", product_id)
+        raise ValidationError("Not enough stock available.")
+
+    @staticmethod
+    def _reserve_size_conditional(product_id, quantity, size):
+        """
+        Conditional-UPDATE reservation of a size variant. The caller holds
+        the product's row lock.
+
+        The common case (size stays in stock) is one UPDATE. When the
+        reservation empties the size, a second UPDATE decrements the
+        product's in-stock size counter and derives the new availability.
+        """
+        sizes = Size.objects.filter(product_id=product_id, size=size)
+        changes = {
+            "available_quantity": F("available_quantity") - quantity,
+            "reserved_quantity": F("reserved_quantity") + quantity,
+        }
+        for _ in range(CONDITIONAL_RESERVE_ATTEMPTS):
+            if sizes.filter(available_quantity__gt=quantity).update(**changes):
+                return
+            if sizes.filter(available_quantity=quantity).update(**changes):
+                # The size just ran out of stock
+                Product.objects.filter(pk=product_id).update(
+                    availability_status=Case(
+                        When(in_stock_sizes_count__lte=1,
+                             then=Value(Product.UNAVAILABLE)),
+                        default=Value(Product.PARTIALLY_AVAILABLE),
+                    ),
+                    in_stock_sizes_count=Case(
+                        When(in_stock_sizes_count__gt=0,
+                             then=F("in_stock_sizes_count") - 1),
+                        default=Value(0),
+                    ),
+                )
+                enqueue_product_indexing([product_id])
+                return
+            remaining = sizes.values_list(
+                "available_quantity", flat=True).first()
+            if remaining is None:
+                logger.error(
+                    "Size %s of product %s not found.", size, product_id)
+                raise Size.DoesNotExist(
+                    f"Size {size} of product {product_id} does not exist.")
+            if remaining < quantity:
+                break
+            # Stock changed between the two UPDATEs; try again
+
+        logger.error(
+            "Not enough stock available for size %s of product %s.", size, product_id)
+        raise ValidationError("Not enough stock available for this size.")
+
     @staticmethod
     @transaction.atomic
     def unreserve_stock(product_id, quantity, size=None, returned=True) -> Union[Product, Size]:
@@ -73,7 +221,9 @@ class StockService:
             (should be false when sale is completed).
 
         Returns:
-            Union[Product, Size]: The updated Product or Size instance.
+            Union[Product, Size]: The updated Product or Size instance. When
+            the stock was served by the hot-stock backend, it carries the
+            Redis counters (see `HotStockService.get_row`).
 
         Notes:
             If the reserved quantity goes below zero, it will be reset to zero
@@ -82,6 +232,11 @@ class StockService:
         Raises:
             ValidationError: If the size is required but not provided.
         """
+        if HotStockService.enabled():
+            counters = HotStockService.unreserve(
+                product_id, quantity, size, returned=returned)
+            if counters:
+                return HotStockService.get_row(product_id, size, counters)
         product = Product.objects.select_for_update().get(pk=product_id)
 
         if product.has_sizes:
@@ -99,7 +254,7 @@ class StockService:
                     size, product_id
                 )
                 size_obj.reserved_quantity = 0
-            size_obj.save()
+            size_obj.save(update_fields=SIZE_STOCK_UPDATE_FIELDS)
             return size_obj
         if returned:
             product.available_quantity += quantity
@@ -109,5 +264,224 @@ class StockService:
                 "Reserved quantity for product %s went negative (adjusting to 0).", product_id
             )
             product.reserved_quantity = 0
-        product.save()
+        product.save(update_fields=STOCK_UPDATE_FIELDS)
         return product
+
+    @staticmethod
+    @transaction.atomic
+    def reserve_many(lines: Iterable[StockLine]) -> List[Union[Product, Size]]:
+        """
+        Reserve stock for several cart lines in a single transaction.
+
+        All affected products, then all affected sizes, are locked with one
+        query each in primary-key order, so concurrent checkouts always
+        acquire row locks in the same order and cannot deadlock. Quantities
+        are validated before anything is written, and the decrements are
+        applied with bulk updates: either every line is reserved or none is.
+
+        Args:
+            lines (Iterable[StockLine]): (product_id, size, quantity) tuples.
+                `size` is ignored for products without sizes. Repeated lines
+                for the same product/size are summed.
+
+        Returns:
+            List[Union[Product, Size]]: The updated Product or Size instances,
+            one per distinct product/size. Lines served by the hot-stock
+            backend are not included.
+
+        Raises:
+            ValidationError: If a size is required but not provided, or
+                             if insufficient stock is available for any line.
+            Product.DoesNotExist, Size.DoesNotExist: If a line references
+                             a missing product or size.
+        """
+        lines, hot_lines = StockService._split_hot_lines(lines)
+        try:
+            return StockService._reserve_lines(lines)
+        except Exception:
+            # Give back what was already reserved in Redis
+            for product_id, size, quantity in hot_lines:
+                HotStockService.unreserve(product_id, quantity, size)
+            raise
+
+    @staticmethod
+    def _split_hot_lines(lines: Iterable[StockLine]):
+        """
+        Reserve the lines of hot products in Redis.
+
+        Returns:
+            tuple: (lines left for the database, lines reserved in Redis)
+        """
+        lines = list(lines)
+        if not HotStockService.enabled():
+            return lines, []
+        db_lines, hot_lines = [], []
+        try:
+            for product_id, size, quantity in lines:
+                if HotStockService.reserve(product_id, quantity, size):
+                    hot_lines.append((product_id, size, quantity))
+                else:
+                    db_lines.append((product_id, size, quantity))
+        except Exception:
+            for product_id, size, quantity in hot_lines:
+                HotStockService.unreserve(product_id, quantity, size)
+            raise
+        return db_lines, hot_lines
+
+    @staticmethod
+    def _reserve_lines(lines: List[StockLine]) -> List[Union[Product, Size]]:
+        if not lines:
+            return []
+        targets = StockService._lock_lines(lines)
+        for (product_id, size), (obj, quantity) in targets.items():
+            if obj.available_quantity < quantity:
+                if size:
+                    logger.error(
+                        "Not enough stock available for size %s of product %s.", size, product_id)
+                    raise ValidationError(
+                        "Not enough stock available for this size.")
+                logger.error(
+                    "Not enough stock available for product %s.", product_id)
+                raise ValidationError("Not enough stock available.")
+
+        for obj, quantity in targets.values():
+            obj.available_quantity -= quantity
+            obj.reserved_quantity += quantity
+        return StockService._bulk_save(targets)
+
+    @staticmethod
+    @transaction.atomic
+    def unreserve_many(lines: Iterable[StockLine], returned=True) -> List[Union[Product, Size]]:
+        """
+        Unreserve stock for several cart lines in a single transaction.
+
+        Locks rows the same way as `reserve_many` and applies the changes
+        with bulk updates.
+
+        Args:
+            lines (Iterable[StockLine]): (product_id, size, quantity) tuples.
+            returned (bool): Whether the stock is being returned to available stock
+            (should be false when sale is completed).
+
+        Returns:
+            List[Union[Product, Size]]: The updated Product or Size instances.
+
+        Notes:
+            If a reserved quantity goes below zero, it will be reset to zero
+            and a warning will be logged. Lines served by the hot-stock
+            backend are applied immediately and are not included in the result.
+
+        Raises:
+            ValidationError: If a size is required but not provided.
+        """
+        if HotStockService.enabled():
+            lines = [(product_id, size, quantity)
+                     for product_id, size, quantity in lines
+                     if not HotStockService.unreserve(product_id, quantity, size, returned=returned)]
+        if not lines:
+            return []
+        targets = StockService._lock_lines(lines)
+        for (product_id, size), (obj, quantity) in targets.items():
+            if returned:
+                obj.available_quantity += quantity
+            obj.reserved_quantity -= quantity
+            if obj.reserved_quantity < 0:
+                if size:
+                    logger.warning(
+                        "Reserved quantity for size %s of product %s went negative (adjusting to 0).",
+                        size, product_id
+                    )
+                else:
+                    logger.warning(
+                        "Reserved quantity for product %s went negative (adjusting to 0).", product_id
+                    )
+                obj.reserved_quantity = 0
+        return StockService._bulk_save(targets)
+
+    @staticmethod
+    def _lock_lines(lines: Iterable[StockLine]):
+        """
+        Lock the products and sizes referenced by `lines` in primary-key order.
+
+        Returns:
+            OrderedDict: Maps (product_id, size) to (locked Product or Size, total quantity).
+        """
+        lines = [(int(product_id), size, quantity)
+                 for product_id, size, quantity in lines]
+        product_ids = {product_id for product_id, _, _ in lines}
+        products = {
+            product.pk: product
+            for product in Product.objects.select_for_update()
+            .filter(pk__in=product_ids).order_by("pk")
+        }
+        missing = product_ids - products.keys()
+        if missing:
+            logger.error("Products not found: %s.", sorted(missing))
+            raise Product.DoesNotExist(
+                f"Product(s) {sorted(missing)} do not exist.")
+
+        quantities = OrderedDict()
+        for product_id, size, quantity in lines:
+            if products[product_id].has_sizes:
+                if not size:
+                    logger.error(
+                        "Size must be specified for products with sizes.")
+                    raise ValidationError(
+                        "Size must be specified for products with sizes.")
+            else:
+                size = None
+            key = (product_id, size)
+            quantities[key] = quantities.get(key, 0) + quantity
+
+        sized_keys = [key for key in quantities if key[1] is not None]
+        sizes = {}
+        if sized_keys:
+            size_filter = Q()
+            for product_id, size in sized_keys:
+                size_filter |= Q(product_id=product_id, size=size)
+            sizes = {
+                (size_obj.product_id, size_obj.size): size_obj
+                for size_obj in Size.objects.select_for_update()
+                .filter(size_filter).order_by("pk")
+            }
+
+        targets = OrderedDict()
+        for key, quantity in quantities.items():
+            product_id, size = key
+            if size is None:
+                targets[key] = (products[product_id], quantity)
+                continue
+            if key not in sizes:
+                logger.error(
+                    "Size %s of product %s not found.", size, product_id)
+                raise Size.DoesNotExist(
+                    f"Size {size} of product {product_id} does not exist.")
+            targets[key] = (sizes[key], quantity)
+        return targets
+
+    @staticmethod
+    def _bulk_save(targets) -> List[Union[Product, Size]]:
+        """
+        Persist locked products and sizes with one bulk update per model and
+        refresh the availability state of the affected products.
+        """
+        stock_fields = ["available_quantity", "reserved_quantity"]
+        products = [obj for obj, _ in targets.values()
+                    if isinstance(obj, Product)]
+        sizes = [obj for obj, _ in targets.values() if isinstance(obj, Size)]
+
+        if products:
+            for product in products:
+                product.availability_status = product.compute_availability_status()
+            Product.objects.bulk_update(
+                products, stock_fields + ["availability_status"])
+            enqueue_product_indexing(
+                product.pk for product in products
+                if product.availability_status != product._loaded_availability_status)
+        if sizes:
+            Size.objects.bulk_update(sizes, stock_fields)
+            Product.objects.filter(
+                pk__in={size.product_id for size in sizes}).refresh_availability()
+        # bulk_update sends no signals
+        invalidate_product_listings()
+        return [obj for obj, _ in targets.values()]
@@ -1,15 +1,17 @@
 # products/signals.py
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.dispatch import receiver
-from .models import Product
-from .services.history_service import create_product_history_if_changed
+from .models import MediaFile, Offer, Product, ProductHistory, Size
+from .services.history_service import enqueue_product_history
+from .services.listing_cache_service import invalidate_product_listings
 
 @receiver(post_save, sender=Product)
 def product_saved_handler(sender, instance, created, **kwargs):
     """
     Called when a product is created or updated.
+    The snapshot is written asynchronously once the transaction commits.
     """
-    create_product_history_if_changed(instance)
+    enqueue_product_history([instance.pk])
 
 @receiver(post_delete, sender=Product)
 def product_deleted_handler(sender, instance, **kwargs):
@@ -18,4 +20,28 @@ def product_deleted_handler(sender, instance, **kwargs):
     For soft-delete, make sure the delete() method sets is_deleted = True
     before saving.
     """
-    create_product_history_if_changed(instance)
+    enqueue_product_history([instance.pk])
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Size)
+@receiver([post_save, post_delete], sender=Offer)
+@receiver(m2m_changed, sender=Product.tags.through)
+def listing_changed_handler(sender, **kwargs):
+    """
+    Called when anything shown in the product list changes.
+    Cached listings are invalidated once the transaction commits.
+    """
+    invalidate_product_listings()
+
+@receiver(post_delete, sender=Product)
+def product_files_handler(sender, instance, **kwargs):
+    """
+    Called when a product is hard deleted.
+    Releases its picture and variants; files still used elsewhere are kept.
+    """
+    MediaFile.objects.release([instance.picture.name, *instance.picture_variants.values()])
+
+@receiver(post_delete, sender=ProductHistory)
+def history_files_handler(sender, instance, **kwargs):
+    """Called when a history snapshot is deleted. Releases its picture."""
+    MediaFile.objects.release([instance.picture.name])
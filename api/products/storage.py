@@ -0,0 +1,60 @@
+# products/storage.py
+import hashlib
+import os
+import tempfile
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file by the SHA-256 of its content
+    (`blobs/<2 hex>/<sha256><ext>`), so identical uploads are stored once.
+
+    The content is hashed while it is streamed to a temporary file, which
+    is then moved to its final name. Every save takes a reference on the
+    file (see `MediaFile`); files are deleted by `MediaFile.objects.release`
+    once nothing references them, never directly.
+    """
+    PREFIX = "blobs"
+
+    def get_available_name(self, name, max_length=None):
+        # The final name depends on the content only; it is chosen in _save()
+        return name
+
+    def _save(self, name, content):
+        # Imported here: products.models uses this storage
+        from products.models import MediaFile
+
+        extension = os.path.splitext(name)[1].lower()
+        temp_dir = self.path(f"{self.PREFIX}/.tmp")
+        os.makedirs(temp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir, suffix=extension)
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            hexdigest = digest.hexdigest()
+            name = f"{self.PREFIX}/{hexdigest[:2]}/{hexdigest}{extension}"
+            # Referenced before the file is (re)placed, so a concurrent
+            # release of the same content cannot delete it afterwards.
+            MediaFile.objects.acquire([name])
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Identical content: replacing an existing copy is harmless
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+
+def product_media_storage():
+    """Storage of product and product history pictures and their variants."""
+    return _storage
+
+
+_storage = ContentAddressedStorage()
@@ -0,0 +1,145 @@
+import logging
+from celery import shared_task
+from PIL import Image
+from products.models import Product
+from products.services.history_service import write_product_history
+from products.services.hot_stock_service import HotStockService
+from products.services.image_service import ProductImageService
+from products.services.import_service import ProductImportService
+from products.services.offer_pricing_service import schedule_upcoming_offer_repricing
+from products.services.reservation_service import ReservationService
+from products.services.search_index_service import index_products
+
+# Create the logger for this module
+logger = logging.getLogger('products_tasks')
+
+
+@shared_task
+def sync_hot_stock_task():
+    """
+    Writes the pending hot-stock reservations back to the database and
+    loads/unloads products whose hot status changed.
+    Runs periodically via Celery beat (see `sync_hot_stock` in settings).
+    Returns:
+        dict: Number of products loaded, unloaded and reconciled.
+    """
+    try:
+        result = HotStockService.sync()
+        logger.info(f"Hot stock sync finished: {result}")
+        return result
+    except Exception as e:
+        logger.error(f"Hot stock sync failed: {e}", exc_info=True)
+        raise
+
+
+@shared_task
+def release_expired_reservations_task(batch_size=500):
+    """
+    Returns the stock of expired holds (and holds of abandoned carts)
+    to available stock.
+    Runs every minute via Celery beat (see `release_expired_reservations` in settings).
+    Args:
+        batch_size (int): Number of holds released per transaction.
+    Returns:
+        int: Number of holds released.
+    """
+    try:
+        return ReservationService.release_expired(batch_size=batch_size)
+    except Exception as e:
+        logger.error(f"Releasing expired reservations failed: {e}", exc_info=True)
+        raise
+
+
+@shared_task
+def write_product_history_task(product_ids):
+    """
+    Writes history snapshots for the given products, queued on commit by
+    `enqueue_product_history`. Products without tracked changes are skipped.
+    Args:
+        product_ids (list): IDs of the products that changed.
+    Returns:
+        int: Number of snapshots written.
+    """
+    return write_product_history(product_ids)
+
+
+@shared_task
+def index_products_task(product_ids):
+    """
+    Pushes the search documents of the given products to Elasticsearch in
+    bulk, queued by `enqueue_product_indexing` with a countdown of
+    `SEARCH_INDEX_DELAY_SECONDS`. Unchanged documents are skipped.
+    Args:
+        product_ids (list): IDs of the products that changed.
+    Returns:
+        dict: Number of documents indexed, deleted and skipped.
+    """
+    try:
+        return index_products(product_ids)
+    except Exception as e:
+        logger.error(f"Indexing products {product_ids} failed: {e}", exc_info=True)
+        raise
+
+
+@shared_task
+def refresh_offer_pricing_task():
+    """
+    Flips the stored effective price of products whose offer started or
+    ended since the last run, and schedules `reprice_products_task` at the
+    offer starts and ends before the next runs.
+    Runs every minute via Celery beat (see `refresh_offer_pricing_every_minute` in settings).
+    Returns:
+        int: Number of products repriced.
+    """
+    try:
+        updated = Product.objects.all_with_deleted().with_stale_pricing().refresh_pricing()
+        if updated:
+            logger.info(f"Repriced {updated} products at offer start/end.")
+        schedule_upcoming_offer_repricing()
+        return updated
+    except Exception as e:
+        logger.error(f"Refreshing offer pricing failed: {e}", exc_info=True)
+        raise
+
+
+@shared_task
+def reprice_products_task(product_ids):
+    """
+    Flips the stored effective price of the given products at the start or
+    end of their offer (see `schedule_offer_repricing`).
+    Returns:
+        int: Number of products repriced.
+    """
+    try:
+        return Product.objects.all_with_deleted().filter(
+            pk__in=product_ids).with_stale_pricing().refresh_pricing()
+    except Exception as e:
+        logger.error(f"Repricing products {product_ids} failed: {e}", exc_info=True)
+        raise
+
+
+@shared_task
+def import_products_task(import_id):
+    """
+    Creates the products of a bulk upload (see `ProductImportService`).
+    Progress and per-row errors are recorded on the `ProductImport`.
+    Returns:
+        int: Number of products created.
+    """
+    return ProductImportService.run(import_id)
+
+
+@shared_task
+def process_product_picture_task(product_id):
+    """
+    Writes the resized JPEG/WebP variants of a product picture, queued on
+    commit whenever a picture is uploaded (see `ProductImageService`).
+    Unreadable images are logged and leave the product without variants.
+    Returns:
+        dict: Variant name to storage path.
+    """
+    try:
+        return ProductImageService.process(product_id)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.error(f"Could not process the picture of product {product_id}: {e}")
+        return {}
@@ -2,8 +2,14 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 from accounts.models import BusinessOwner, User
 from products.models import Product, ProductHistory, Store
+from rest_framework import status
+from .test_helpers import TestHelpers
 from django.utils.timezone import now, timedelta
-from products.services.history_service import get_product_history_as_of
+from unittest.mock import patch
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from products.services.history_service import (
+    get_history_as_of, get_product_history_as_of, write_product_history)
 
 
 class ProductHistoryTests(TestCase):
@@ -23,21 +29,22 @@ class ProductHistoryTests(TestCase):
             user=self.user,
             store=self.store
         )
-        self.product = Product.objects.create(
-            product_name="Test Product",
-            product_description="Test Description",
-            price=100.00,
-            color="Red",
-            brand="TestBrand",
-            available_quantity=10,
-            reserved_quantity=2,
-            has_sizes=False,
-            owner_id=self.user,
-            store=self.store,
-            category="TestCategory",
-            properties={"key": "value"},
-            picture=self.create_test_image(),
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                product_name="Test Product",
+                product_description="Test Description",
+                price=100.00,
+                color="Red",
+                brand="TestBrand",
+                available_quantity=10,
+                reserved_quantity=2,
+                has_sizes=False,
+                owner_id=self.user,
+                store=self.store,
+                category="TestCategory",
+                properties={"key": "value"},
+                picture=self.create_test_image(),
+            )
 
     def create_test_image(self):
         """Helper to create a new SimpleUploadedFile for image field."""
@@ -59,7 +66,8 @@ class ProductHistoryTests(TestCase):
         initial_count = ProductHistory.objects.filter(
             product=self.product).count()
         self.product.product_name = "Updated Product"
-        self.product.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
 
         history_count = ProductHistory.objects.filter(
             product=self.product).count()
@@ -73,7 +81,8 @@ class ProductHistoryTests(TestCase):
     def test_history_created_on_soft_delete(self):
         """Test that soft-deleting a product creates a ProductHistory snapshot."""
         self.product.is_deleted = True
-        self.product.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
 
         latest_history = ProductHistory.objects.filter(
             product=self.product).order_by("-recorded_at").first()
@@ -90,7 +99,8 @@ class ProductHistoryTests(TestCase):
 
         # 1. Change product price (tracked)
         self.product.price = 200.00
-        self.product.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
         self.assertTrue(history.has_product_changed(),
                         "Price change should be detected")
 
@@ -129,6 +139,107 @@ class ProductHistoryTests(TestCase):
         self.assertTrue(history.has_product_changed(),
                         "Owner name change should be detected")
 
+    def test_noop_save_costs_one_extra_query(self):
+        """A save without tracked changes only adds the fingerprint lookup."""
+        history_count = ProductHistory.objects.filter(product=self.product).count()
+        # The request itself only runs the UPDATE of the product
+        with self.assertNumQueries(1):
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.product.save()
+        # The history writer runs one SELECT of the tracked state
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(
+            ProductHistory.objects.filter(product=self.product).count(), history_count)
+
+    def test_untracked_change_does_not_create_snapshot(self):
+        history_count = ProductHistory.objects.filter(product=self.product).count()
+        self.product.available_quantity = 3
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(
+            ProductHistory.objects.filter(product=self.product).count(), history_count)
+
+    def test_snapshot_fingerprint_is_stored_on_product(self):
+        self.product.color = "Green"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        latest_history = ProductHistory.objects.filter(
+            product=self.product).order_by("-recorded_at").first()
+        self.product.refresh_from_db()
+        self.assertEqual(latest_history.color, "Green")
+        self.assertTrue(latest_history.fingerprint)
+        self.assertEqual(self.product.history_fingerprint, latest_history.fingerprint)
+
+    def test_snapshot_without_fingerprint_is_backfilled(self):
+        """Products snapshotted before fingerprints existed are not snapshotted again."""
+        ProductHistory.objects.filter(product=self.product).update(fingerprint="")
+        Product.objects.filter(pk=self.product.pk).update(history_fingerprint="")
+        history_count = ProductHistory.objects.filter(product=self.product).count()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.history_fingerprint)
+        self.assertEqual(
+            ProductHistory.objects.filter(product=self.product).count(), history_count)
+
+    def test_changes_in_one_transaction_are_coalesced(self):
+        with patch("products.tasks.write_product_history_task.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.product_name = "First"
+                self.product.save()
+                self.product.product_name = "Second"
+                self.product.save()
+        delay.assert_called_once_with([self.product.pk])
+
+    def test_history_created_on_queryset_soft_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.product.pk).delete()
+
+        latest_history = ProductHistory.objects.filter(
+            product=self.product).order_by("-recorded_at").first()
+        self.assertTrue(latest_history.is_deleted)
+
+    def test_history_created_on_size_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.has_sizes = True
+            self.product.available_quantity = None
+            self.product.reserved_quantity = None
+            self.product.save()
+            self.product.sizes.create(
+                size="M", available_quantity=5, reserved_quantity=0)
+
+        latest_history = ProductHistory.objects.filter(
+            product=self.product).order_by("-recorded_at").first()
+        self.assertEqual(latest_history.sizes, ["M"])
+
+    def test_write_product_history_bulk_query_count(self):
+        products = [self.product]
+        for index in range(4):
+            with self.captureOnCommitCallbacks(execute=True):
+                products.append(Product.objects.create(
+                    product_name=f"Bulk {index}",
+                    product_description="Description",
+                    price=10.00,
+                    available_quantity=1,
+                    reserved_quantity=0,
+                    owner_id=self.user,
+                    store=self.store,
+                    category="TestCategory",
+                    picture=self.create_test_image(),
+                ))
+        Product.objects.filter(pk__in=[p.pk for p in products]).update(brand="Bulk")
+
+        # SELECT tracked state, savepoint, INSERT, picture references
+        # (insert, lock, increment), UPDATE fingerprints, release
+        with self.assertNumQueries(8):
+            written = write_product_history([p.pk for p in products])
+        self.assertEqual(written, 5)
+        self.assertEqual(write_product_history([p.pk for p in products]), 0)
+
 
 class ProductHistoryAsOfTests(TestCase):
     def setUp(self):
@@ -141,21 +252,22 @@ class ProductHistoryAsOfTests(TestCase):
         self.store = Store.objects.create(
             name='History Store', location='Somewhere')
         BusinessOwner.objects.create(user=self.user, store=self.store)
-        self.product = Product.objects.create(
-            product_name="History Product",
-            product_description="Description",
-            price=100.00,
-            color="Blue",
-            brand="HistoryBrand",
-            available_quantity=10,
-            reserved_quantity=1,
-            has_sizes=False,
-            owner_id=self.user,
-            store=self.store,
-            category="TestCategory",
-            properties={"key": "value"},
-            picture=self.create_test_image()
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                product_name="History Product",
+                product_description="Description",
+                price=100.00,
+                color="Blue",
+                brand="HistoryBrand",
+                available_quantity=10,
+                reserved_quantity=1,
+                has_sizes=False,
+                owner_id=self.user,
+                store=self.store,
+                category="TestCategory",
+                properties={"key": "value"},
+                picture=self.create_test_image()
+            )
         # Create initial history snapshot
         self.history1 = ProductHistory.objects.filter(
             product=self.product).order_by("recorded_at").first()
@@ -163,7 +275,8 @@ class ProductHistoryAsOfTests(TestCase):
         self.history1.save()
 
         self.product.price = 150.00
-        self.product.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
 
         self.history2 = ProductHistory.objects.filter(
             product=self.product).order_by("-recorded_at").first()
@@ -197,3 +310,79 @@ class ProductHistoryAsOfTests(TestCase):
         history = get_product_history_as_of(self.product, date)
         self.assertEqual(history.id, self.history2.id,
                          "Expected latest snapshot before given date")
+
+    def test_get_history_as_of_bulk_single_query(self):
+        """Should resolve the snapshots of many products in one query."""
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Product.objects.create(
+                product_name="Other Product",
+                product_description="Description",
+                price=20.00,
+                available_quantity=1,
+                reserved_quantity=0,
+                owner_id=self.user,
+                store=self.store,
+                category="TestCategory",
+                picture=self.create_test_image()
+            )
+
+        with self.assertNumQueries(1):
+            snapshots = get_history_as_of(
+                [self.product.id, other.id], now() - timedelta(hours=12))
+        self.assertEqual(snapshots, {self.product.id: self.history2})
+
+        snapshots = get_history_as_of(
+            [self.product.id, other.id], now() - timedelta(days=2))
+        self.assertEqual(snapshots, {self.product.id: self.history1})
+
+
+class ProductHistoryViewTests(APITestCase):
+    def setUp(self):
+        self.user, self.store, self.business_owner = TestHelpers.create_seller()
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = TestHelpers.creat_product(
+                TestHelpers.get_valid_product_data_without_sizes(price=100),
+                self.user,
+                self.store
+            )
+        # 12 snapshots: the initial one plus 11 price changes
+        for price in range(101, 112):
+            self.product.price = price
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.save()
+        self.url = reverse('product-history', args=[self.product.id])
+
+    def test_history_pages_include_changes(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 12)
+        results = response.data["results"]
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[0]["price"], "111.00")
+        self.assertEqual(results[0]["changes"]["price"],
+                         {"old": "110.00", "new": "111.00"})
+        # The last item of the page is diffed against the next page
+        self.assertEqual(results[-1]["changes"]["price"],
+                         {"old": "101.00", "new": "102.00"})
+
+        response = self.client.get(self.url, {"page": 2})
+        results = response.data["results"]
+        self.assertEqual(len(results), 2)
+        self.assertIsNone(results[-1]["changes"])
+
+    def test_history_query_count_is_constant(self):
+        # product, count, page, preceding snapshot
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+
+    def test_history_requires_owner(self):
+        other_user = TestHelpers.create_user(email="other@example.com")
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_history_product_not_found(self):
+        response = self.client.get(reverse('product-history', args=[9999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,220 @@
+import logging
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+import fakeredis
+import pytest
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from redis.exceptions import ConnectionError as RedisConnectionError
+from .test_helpers import TestHelpers
+from products.models import Product, Size
+from products.serializers import ProductSerializer
+from products.services.hot_stock_service import HotStockService
+from products.services.stock_service import StockService
+
+logger = logging.getLogger('products_tests')
+
+
+@override_settings(HOT_STOCK_ENABLED=True)
+class TestHotStockService(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = patch.object(HotStockService, "get_client", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user, self.store, self.business_owner = TestHelpers.create_seller()
+        self.product = TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_without_sizes(available_quantity=10),
+            self.user,
+            self.store
+        )
+        self.sized_product = TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_with_size(
+                sizes=[
+                    {"size": "S", "available_quantity": 5},
+                    {"size": "M", "available_quantity": 2},
+                ]
+            ),
+            self.user,
+            self.store
+        )
+        Product.objects.filter(
+            pk__in=[self.product.pk, self.sized_product.pk]).update(hot_stock=True)
+        HotStockService.sync()
+
+    def redis_counters(self, product_id, size=None):
+        values = self.redis.hmget(
+            HotStockService.key(HotStockService.member(product_id, size)),
+            "available", "reserved")
+        return tuple(int(value) for value in values)
+
+    # -------------------------------
+    # Reservations
+    # -------------------------------
+    def test_sync_loads_hot_products(self):
+        self.assertEqual(HotStockService.loaded_product_ids(),
+                         {self.product.pk, self.sized_product.pk})
+        self.assertEqual(self.redis_counters(self.product.pk), (10, 0))
+        self.assertEqual(self.redis_counters(self.sized_product.pk, "M"), (2, 0))
+
+    def test_reserve_stock_served_by_redis(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = StockService.reserve_stock(self.product.pk, 3)
+        # Besides the savepoint of the atomic block, only the returned row
+        # is read, without a lock
+        self.assertEqual([query["sql"].split()[0] for query in queries.captured_queries
+                          if "SAVEPOINT" not in query["sql"]], ["SELECT"])
+        self.assertIsInstance(result, Product)
+        self.assertEqual((result.available_quantity, result.reserved_quantity), (7, 3))
+        self.assertEqual(self.redis_counters(self.product.pk), (7, 3))
+        # The database is only written on reconcile
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.available_quantity, 10)
+
+    def test_reserve_size_insufficient_stock(self):
+        with pytest.raises(ValidationError, match="Not enough stock available for this size."):
+            StockService.reserve_stock(self.sized_product.pk, 3, size="M")
+        self.assertEqual(self.redis_counters(self.sized_product.pk, "M"), (2, 0))
+
+    def test_reserve_many_rolls_back_redis_on_failure(self):
+        with pytest.raises(ValidationError, match="Not enough stock available."):
+            StockService.reserve_many([
+                (self.product.pk, None, 4),
+                (self.sized_product.pk, "S", 1),
+                (self.product.pk, None, 20),
+            ])
+        self.assertEqual(self.redis_counters(self.product.pk), (10, 0))
+        self.assertEqual(self.redis_counters(self.sized_product.pk, "S"), (5, 0))
+
+    def test_unreserve_stock_served_by_redis(self):
+        StockService.reserve_stock(self.product.pk, 4)
+        StockService.unreserve_stock(self.product.pk, 1)
+        result = StockService.unreserve_stock(self.product.pk, 1, returned=False)
+        self.assertEqual(self.redis_counters(self.product.pk), (7, 2))
+        self.assertEqual((result.available_quantity, result.reserved_quantity), (7, 2))
+
+    def test_size_reservation_returns_size(self):
+        result = StockService.reserve_stock(self.sized_product.pk, 2, size="S")
+        self.assertIsInstance(result, Size)
+        self.assertEqual(result.size, "S")
+        self.assertEqual((result.available_quantity, result.reserved_quantity), (3, 2))
+
+    # -------------------------------
+    # Write-behind
+    # -------------------------------
+    def test_reconcile_applies_deltas(self):
+        StockService.reserve_stock(self.product.pk, 3)
+        StockService.reserve_stock(self.sized_product.pk, 2, size="M")
+
+        self.assertEqual(HotStockService.reconcile(), 2)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.available_quantity, 7)
+        self.assertEqual(self.product.reserved_quantity, 3)
+        size = Size.objects.get(product=self.sized_product, size="M")
+        self.assertEqual(size.available_quantity, 0)
+        self.assertEqual(size.reserved_quantity, 2)
+        self.sized_product.refresh_from_db()
+        self.assertEqual(self.sized_product.availability_status,
+                         Product.PARTIALLY_AVAILABLE)
+        self.assertEqual(HotStockService.reconcile(), 0)
+
+    def test_reconcile_keeps_database_path_writes(self):
+        StockService.reserve_stock(self.product.pk, 3)
+        # A concurrent write that bypassed Redis
+        Product.objects.filter(pk=self.product.pk).update(available_quantity=15)
+
+        HotStockService.reconcile()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.available_quantity, 12)
+        self.assertEqual(self.redis_counters(self.product.pk), (12, 3))
+
+    def test_sync_unloads_products_no_longer_hot(self):
+        StockService.reserve_stock(self.product.pk, 3)
+        Product.objects.filter(pk=self.product.pk).update(hot_stock=False)
+
+        result = HotStockService.sync()
+
+        self.assertEqual(result["unloaded"], 1)
+        self.assertNotIn(self.product.pk, HotStockService.loaded_product_ids())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_quantity, 3)
+        # Back on the database path
+        result = StockService.reserve_stock(self.product.pk, 1)
+        self.assertEqual(result.available_quantity, 6)
+
+    def test_disabled_backend_unloads_and_uses_database(self):
+        StockService.reserve_stock(self.product.pk, 2)
+        with override_settings(HOT_STOCK_ENABLED=False):
+            HotStockService.sync()
+            self.assertEqual(HotStockService.loaded_product_ids(), set())
+            result = StockService.reserve_stock(self.product.pk, 1)
+        self.assertEqual(result.available_quantity, 7)
+        self.assertEqual(result.reserved_quantity, 3)
+
+    def test_redis_down_blocks_hot_products_only(self):
+        not_hot = TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_without_sizes(available_quantity=5),
+            self.user,
+            self.store
+        )
+        with patch.object(self.redis, "register_script", side_effect=RedisConnectionError()):
+            with pytest.raises(ValidationError, match="temporarily unavailable"):
+                StockService.reserve_stock(self.product.pk, 1)
+            result = StockService.reserve_stock(not_hot.pk, 1)
+        self.assertEqual(result.available_quantity, 4)
+
+    @override_settings(HOT_STOCK_INCLUDE_ACTIVE_OFFERS=True, HOT_STOCK_SYNC_SECONDS=30)
+    def test_redis_down_blocks_products_on_offer(self):
+        def create_product_on_offer(end_date):
+            return TestHelpers.creat_product(
+                TestHelpers.add_offer_to_product_data(
+                    TestHelpers.get_valid_product_data_without_sizes(available_quantity=5),
+                    (now() - timedelta(hours=1)).isoformat(), end_date.isoformat(), '9.99'),
+                self.user,
+                self.store
+            )
+        on_offer = create_product_on_offer(now() + timedelta(hours=1))
+        # Ended after the last sync, which may not have unloaded it yet
+        offer_ended = create_product_on_offer(now() - timedelta(seconds=10))
+        with patch.object(self.redis, "register_script", side_effect=RedisConnectionError()):
+            for product in (on_offer, offer_ended):
+                with pytest.raises(ValidationError, match="temporarily unavailable"):
+                    StockService.reserve_stock(product.pk, 1)
+        on_offer.refresh_from_db()
+        self.assertEqual(on_offer.available_quantity, 5)
+
+    def test_seller_update_reconciles_and_resyncs(self):
+        StockService.reserve_stock(self.product.pk, 3)
+        serializer = ProductSerializer(
+            self.product, data={"available_quantity": 20}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.available_quantity, 20)
+        self.assertEqual(self.product.reserved_quantity, 3)
+        self.assertEqual(self.redis_counters(self.product.pk), (20, 3))
+
+    # -------------------------------
+    # Audit
+    # -------------------------------
+    def test_audit_command(self):
+        StockService.reserve_stock(self.product.pk, 3)
+        out = StringIO()
+        call_command("audit_hot_stock", stdout=out)
+        self.assertIn("All 3 hot stock rows are consistent.", out.getvalue())
+
+        self.redis.hset(HotStockService.key(HotStockService.member(self.product.pk)),
+                        "available", 99)
+        out = StringIO()
+        call_command("audit_hot_stock", "--fix", stdout=out)
+        self.assertIn("MISMATCH", out.getvalue())
+        self.assertTrue(all(row["consistent"] for row in HotStockService.audit()))
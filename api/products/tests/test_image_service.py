@@ -0,0 +1,163 @@
+import io
+import logging
+import shutil
+import tempfile
+import time
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from products.models import Product
+from products.serializers import ProductListSerializer, ProductSerializer
+from products.services.image_service import ProductImageService
+from .test_helpers import TestHelpers
+
+logger = logging.getLogger('products_tests')
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(name="photo.jpg", size=(1600, 1200), image_format="JPEG", mode="RGB", **params):
+    """An upload of a noisy gradient, compressing roughly like a photo."""
+    noise = Image.effect_noise(size, 24).convert("L")
+    gradient = Image.linear_gradient("L").resize(size)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    if mode == "RGBA":
+        image.putalpha(gradient)
+    elif mode != "RGB":
+        image = image.convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **params)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ProductImageServiceTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user, self.store, _ = TestHelpers.create_seller()
+
+    def create_product(self, picture):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = TestHelpers.creat_product(
+                TestHelpers.get_valid_product_data_without_sizes(picture=picture),
+                self.user, self.store)
+        product.refresh_from_db()
+        return product
+
+    def test_upload_writes_variants(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotated 90° clockwise
+        exif[0x010F] = "Camera maker"
+        product = self.create_product(make_image(exif=exif.tobytes(), quality=95))
+
+        self.assertEqual(set(product.picture_variants), {
+            "thumbnail", "thumbnail_webp", "medium", "medium_webp"})
+        storage = product.picture.storage
+        with storage.open(product.picture_variants["thumbnail"]) as f:
+            thumbnail = Image.open(f)
+            # Rotated upright: portrait
+            self.assertEqual(thumbnail.size, (240, 320))
+            self.assertEqual(thumbnail.format, "JPEG")
+            self.assertFalse(thumbnail.getexif())
+        with storage.open(product.picture_variants["medium_webp"]) as f:
+            medium = Image.open(f)
+            self.assertEqual(medium.size, (720, 960))
+            self.assertEqual(medium.format, "WEBP")
+
+        data = ProductSerializer(product).data
+        self.assertEqual(data["picture_variants"]["thumbnail"],
+                         storage.url(product.picture_variants["thumbnail"]))
+        rows = ProductListSerializer.values(Product.objects.filter(pk=product.pk))
+        self.assertEqual(ProductListSerializer(rows).data[0]["picture_variants"],
+                         data["picture_variants"])
+
+    def test_picture_change_replaces_variants(self):
+        product = self.create_product(make_image(size=(400, 300)))
+        old_variants = product.picture_variants
+        storage = product.picture.storage
+
+        product.picture = make_image(name="other.png", size=(400, 300),
+                                     image_format="PNG", mode="RGBA")
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+            # Cleared until the new picture is processed
+            self.assertEqual(Product.objects.get(pk=product.pk).picture_variants, {})
+        product.refresh_from_db()
+
+        self.assertTrue(product.picture_variants)
+        self.assertFalse(set(product.picture_variants.values()) & set(old_variants.values()))
+        self.assertFalse(any(storage.exists(path) for path in old_variants.values()))
+        with storage.open(product.picture_variants["thumbnail"]) as f:
+            self.assertEqual(Image.open(f).mode, "RGB")
+        with storage.open(product.picture_variants["thumbnail_webp"]) as f:
+            self.assertEqual(Image.open(f).mode, "RGBA")
+
+        # Saves that keep the picture do not reprocess it
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            product.product_name = "Renamed"
+            product.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).picture_variants,
+                         product.picture_variants)
+        self.assertEqual(len(callbacks), 1)  # history only
+
+    def test_unreadable_picture_is_skipped(self):
+        picture = SimpleUploadedFile("broken.jpg", b"not an image", content_type="image/jpeg")
+        product = self.create_product(picture)
+        self.assertEqual(product.picture_variants, {})
+
+    def test_hard_delete_removes_variants(self):
+        product = self.create_product(make_image(size=(400, 300)))
+        storage = product.picture.storage
+        paths = list(product.picture_variants.values())
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=product.pk).hard_delete()
+        self.assertFalse(any(storage.exists(path) for path in paths))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ProductImageServiceBenchmark(TestCase):
+    """
+    Measures the processing throughput of ProductImageService and the size
+    of the variants compared to the uploaded originals.
+    """
+    pictures = 5
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user, self.store, _ = TestHelpers.create_seller()
+        self.products = [
+            TestHelpers.creat_product(
+                TestHelpers.get_valid_product_data_without_sizes(
+                    product_name=f"Product {index}",
+                    picture=make_image(name=f"photo{index}.jpg", size=(2000, 1500), quality=92)),
+                self.user, self.store)
+            for index in range(self.pictures)
+        ]
+
+    def test_processing_benchmark(self):
+        start = time.perf_counter()
+        results = [ProductImageService.process(product.pk) for product in self.products]
+        elapsed = time.perf_counter() - start
+
+        original_bytes = sum(product.picture.size for product in self.products)
+        storage = self.products[0].picture.storage
+        variant_bytes = {
+            key: sum(storage.size(variants[key]) for variants in results)
+            for key in results[0]
+        }
+        logger.info(
+            "Processed %d pictures at %.1f pictures/s; original %d KB, %s",
+            self.pictures, self.pictures / elapsed, original_bytes // 1024,
+            ", ".join(f"{key} {size // 1024} KB ({100 * size / original_bytes:.1f}%)"
+                      for key, size in variant_bytes.items()))
+        self.assertLess(variant_bytes["medium"], original_bytes / 4)
+        self.assertLess(variant_bytes["thumbnail_webp"], variant_bytes["thumbnail"])
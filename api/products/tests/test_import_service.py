@@ -0,0 +1,116 @@
+import json
+from decimal import Decimal
+from unittest.mock import patch
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from products.models import Product, ProductImport, Tag
+from products.services.import_service import ProductImportService
+from .test_helpers import TestHelpers
+
+
+class ProductImportTests(APITestCase):
+
+    def setUp(self):
+        self.user, self.store, self.business_owner = TestHelpers.create_seller()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('product-import')
+        Tag.objects.create(name="sale")
+
+    def upload(self, name, content):
+        return self.client.post(
+            self.url, {"file": SimpleUploadedFile(name, content.encode())},
+            format='multipart')
+
+    def test_csv_import_creates_products_and_reports_errors(self):
+        content = (
+            "product_name,product_description,price,category,has_sizes,available_quantity,sizes,tags,properties\n"
+            "Lamp,Desk lamp,25.00,Home,false,4,,\"[\"\"sale\"\", \"\"home\"\"]\",\"{\"\"watts\"\": 40}\"\n"
+            "Shirt,Cotton shirt,15.50,Clothes,true,,"
+            "\"[{\"\"size\"\": \"\"M\"\", \"\"available_quantity\"\": 2}, "
+            "{\"\"size\"\": \"\"L\"\", \"\"available_quantity\"\": 0}]\",\"[\"\"sale\"\"]\",\n"
+            "Broken,No price,,Home,false,1,,,\n"
+        )
+        response = self.upload("catalogue.csv", content)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        response = self.client.get(
+            reverse('product-import-detail', args=[response.data['id']]))
+        self.assertEqual(response.data['status'], ProductImport.COMPLETED)
+        self.assertEqual(response.data['processed_rows'], 3)
+        self.assertEqual(response.data['created_count'], 2)
+        self.assertEqual(response.data['error_count'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 3)
+        self.assertIn('price', response.data['errors'][0]['errors'])
+
+        lamp = Product.objects.get(product_name="Lamp")
+        self.assertEqual(lamp.price, Decimal("25.00"))
+        self.assertEqual(lamp.effective_price, Decimal("25.00"))
+        self.assertEqual(lamp.reserved_quantity, 0)
+        self.assertEqual(lamp.properties, {"watts": 40})
+        self.assertEqual(lamp.availability_status, Product.AVAILABLE)
+        self.assertEqual(sorted(lamp.tags.values_list("name", flat=True)), ["home", "sale"])
+        self.assertEqual(lamp.store, self.store)
+
+        shirt = Product.objects.get(product_name="Shirt")
+        self.assertEqual(sorted(shirt.sizes.values_list("size", flat=True)), ["L", "M"])
+        self.assertEqual(shirt.availability_status, Product.PARTIALLY_AVAILABLE)
+        self.assertEqual(Tag.objects.filter(name="sale").count(), 1)
+
+    def test_jsonl_import_in_chunks(self):
+        lines = [
+            json.dumps({
+                "product_name": f"Item {index}",
+                "product_description": "Bulk item",
+                "price": "9.99",
+                "category": "Electronics",
+                "has_sizes": False,
+                "available_quantity": 3,
+                "tags": ["bulk"],
+            })
+            for index in range(5)
+        ]
+        lines.insert(2, "not json")
+        with patch.object(ProductImportService, "CHUNK_SIZE", 2):
+            response = self.upload("catalogue.jsonl", "\n".join(lines) + "\n")
+
+        product_import = ProductImport.objects.get(pk=response.data['id'])
+        self.assertEqual(product_import.status, ProductImport.COMPLETED)
+        self.assertEqual(product_import.created_count, 5)
+        self.assertEqual(product_import.errors, [
+            {"row": 3, "errors": {"non_field_errors": ["Invalid JSON."]}}])
+        self.assertFalse(product_import.file)
+        names = Product.objects.filter(product_import=product_import).order_by("pk")
+        self.assertEqual([product.product_name for product in names],
+                         [f"Item {index}" for index in range(5)])
+        self.assertEqual(Tag.objects.get(name="bulk").products.count(), 5)
+
+    def test_rows_with_malformed_tags_are_reported(self):
+        row = {"product_name": "Item", "product_description": "Bulk item", "price": "9.99",
+               "category": "Electronics", "has_sizes": False, "available_quantity": 3}
+        lines = [json.dumps({**row, "tags": tags})
+                 for tags in ("sale", [{"name": "sale"}], ["x" * 256], None, ["sale", 2024, " new "])]
+        response = self.upload("catalogue.jsonl", "\n".join(lines) + "\n")
+
+        product_import = ProductImport.objects.get(pk=response.data['id'])
+        self.assertEqual(product_import.status, ProductImport.COMPLETED)
+        self.assertEqual(product_import.created_count, 1)
+        self.assertEqual([error["row"] for error in product_import.errors], [1, 2, 3, 4])
+        self.assertTrue(all("tags" in error["errors"] for error in product_import.errors))
+        # Tag names as validated: strings, stripped
+        product = Product.objects.get(product_import=product_import)
+        self.assertEqual(sorted(product.tags.values_list("name", flat=True)), ["2024", "new", "sale"])
+
+    def test_rejects_unsupported_file(self):
+        response = self.upload("catalogue.xlsx", "data")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ProductImport.objects.exists())
+
+    def test_only_uploader_can_see_import(self):
+        response = self.upload("catalogue.jsonl", "")
+        other, _, _ = TestHelpers.create_seller(email="other@example.com", store_name="Other")
+        self.client.force_authenticate(user=other)
+        response = self.client.get(
+            reverse('product-import-detail', args=[response.data['id']]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,113 @@
+import shutil
+import tempfile
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from products.models import MediaFile, Product, ProductHistory
+from products.services.history_service import write_product_history
+from products.storage import product_media_storage
+from .test_helpers import TestHelpers
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user, self.store, _ = TestHelpers.create_seller()
+        self.storage = product_media_storage()
+
+    def create_product(self, name="shoe.jpg", content=b"same image bytes"):
+        return TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_without_sizes(
+                picture=SimpleUploadedFile(name, content, content_type="image/jpeg")),
+            self.user, self.store)
+
+    def references(self, name):
+        return MediaFile.objects.get(name=name).references
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.create_product("shoe.jpg")
+        second = self.create_product("SHOE-copy.JPG")
+        other = self.create_product("boot.jpg", b"other image bytes")
+
+        self.assertEqual(first.picture.name, second.picture.name)
+        self.assertRegex(first.picture.name, r"^blobs/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
+        self.assertNotEqual(first.picture.name, other.picture.name)
+        self.assertEqual(self.references(first.picture.name), 2)
+        with self.storage.open(first.picture.name) as f:
+            self.assertEqual(f.read(), b"same image bytes")
+        self.assertEqual(self.storage.listdir("blobs/.tmp")[1], [])
+
+    def test_file_deleted_with_its_last_reference(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create_product()
+            second = self.create_product()
+        name = first.picture.name
+        # Two products and their snapshots
+        self.assertEqual(self.references(name), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.hard_delete()
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.references(name), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=second.pk).hard_delete()
+            ProductHistory.objects.all().delete()
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_history_keeps_picture_of_deleted_product(self):
+        product = self.create_product()
+        name = product.picture.name
+        write_product_history([product.pk])
+        self.assertEqual(self.references(name), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=product.pk).hard_delete()
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.references(name), 1)
+
+    def test_replaced_picture_is_released(self):
+        product = self.create_product()
+        name = product.picture.name
+        product.picture = SimpleUploadedFile("new.jpg", b"new image bytes")
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertFalse(self.storage.exists(name))
+        # The product and the snapshot of its new state
+        self.assertEqual(self.references(product.picture.name), 2)
+
+    def test_deduplicate_media_command(self):
+        legacy_storage = FileSystemStorage()
+        first = self.create_product()
+        second = self.create_product()
+        legacy_names = [legacy_storage.save(f"products/legacy{index}.jpg",
+                                            ContentFile(b"legacy bytes"))
+                        for index in range(2)]
+        for product, legacy_name in zip((first, second), legacy_names):
+            Product.objects.filter(pk=product.pk).update(picture=legacy_name)
+        write_product_history([first.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("deduplicate_media", stdout=open("/dev/null", "w"))
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.picture.name, second.picture.name)
+        self.assertTrue(first.picture.name.startswith("blobs/"))
+        self.assertEqual(first.history.get().picture.name, first.picture.name)
+        # Two products and one snapshot
+        self.assertEqual(self.references(first.picture.name), 3)
+        self.assertFalse(any(legacy_storage.exists(name) for name in legacy_names))
+        # The renamed picture does not count as a change
+        self.assertEqual(write_product_history([first.pk]), 0)
@@ -1,6 +1,14 @@
 import logging
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
 from django.test import TestCase
-from products.models import Product, Size
+from django.utils.timezone import now
+from products.models import Offer, Product, Size
+from products.services.stock_service import StockService
+from products.services.offer_pricing_service import END_DELAY
+from products.tasks import refresh_offer_pricing_task, reprice_products_task
 from products.tests.test_helpers import TestHelpers
 
 logger = logging.getLogger('products_tests')
@@ -47,6 +55,83 @@ class OfferTest(TestCase):
         self.assertFalse(product.offer.is_active)
         self.assertEqual(product.current_price, 10)
 
+    def assertPricing(self, product, effective_price, has_active_offer):
+        product.refresh_from_db(fields=["effective_price", "has_active_offer"])
+        self.assertEqual(product.effective_price, effective_price)
+        self.assertEqual(product.has_active_offer, has_active_offer)
+
+    def test_effective_price_follows_offer_and_price_changes(self):
+        data = TestHelpers.get_valid_product_data_without_sizes(price=10)
+        data = TestHelpers.add_offer_to_product_data(
+            data, *TestHelpers.get_active_offer_dates(), 5)
+        product = TestHelpers.creat_product(data, self.user, self.store)
+        self.assertPricing(product, 5, True)
+
+        product.offer.delete()
+        self.assertPricing(product, 10, False)
+
+        product.price = 12
+        product.save()
+        self.assertPricing(product, 12, False)
+
+    def test_refresh_offer_pricing_task_flips_started_and_ended_offers(self):
+        starting = TestHelpers.creat_product(
+            TestHelpers.add_offer_to_product_data(
+                TestHelpers.get_valid_product_data_without_sizes(price=10),
+                *TestHelpers.get_future_offer_dates(), 5),
+            self.user, self.store)
+        ending = TestHelpers.creat_product(
+            TestHelpers.add_offer_to_product_data(
+                TestHelpers.get_valid_product_data_without_sizes(price=20),
+                *TestHelpers.get_active_offer_dates(), 15),
+            self.user, self.store)
+        self.assertPricing(starting, 10, False)
+        self.assertPricing(ending, 15, True)
+        # The offer windows pass without any write to the offers
+        Offer.objects.filter(product=starting).update(start_date=now() - timedelta(minutes=1))
+        Offer.objects.filter(product=ending).update(end_date=now() - timedelta(minutes=1))
+
+        self.assertEqual(refresh_offer_pricing_task(), 2)
+        self.assertPricing(starting, 5, True)
+        self.assertPricing(ending, 20, False)
+        self.assertEqual(refresh_offer_pricing_task(), 0)
+
+    def test_offer_start_and_end_are_scheduled(self):
+        product = TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_without_sizes(price=10), self.user, self.store)
+        start = now() + timedelta(seconds=30)
+        with patch("products.tasks.reprice_products_task.apply_async") as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                Offer.objects.create(product=product, offer_price=5,
+                                     start_date=start, end_date=start + timedelta(seconds=30))
+        self.assertEqual([(call.args[0][0], call.kwargs["eta"]) for call in apply_async.call_args_list], [
+            ([product.pk], start), ([product.pk], start + timedelta(seconds=30) + END_DELAY)])
+
+        # Far-off offers are left to a later beat run
+        with patch("products.tasks.reprice_products_task.apply_async") as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                product.offer.start_date = now() + timedelta(days=1)
+                product.offer.end_date = now() + timedelta(days=2)
+                product.offer.save()
+            apply_async.assert_not_called()
+            Offer.objects.filter(product=product).update(start_date=now() + timedelta(seconds=30))
+            refresh_offer_pricing_task()
+        self.assertEqual(apply_async.call_args.args[0], ([product.pk],))
+
+    def test_reprice_products_task_flips_the_given_products(self):
+        products = [
+            TestHelpers.creat_product(
+                TestHelpers.add_offer_to_product_data(
+                    TestHelpers.get_valid_product_data_without_sizes(price=10),
+                    *TestHelpers.get_future_offer_dates(), 5),
+                self.user, self.store)
+            for _ in range(2)
+        ]
+        Offer.objects.update(start_date=now() - timedelta(seconds=1))
+        self.assertEqual(reprice_products_task([products[0].pk]), 1)
+        self.assertPricing(products[0], 5, True)
+        self.assertPricing(products[1], 10, False)
+
 
 class ProductSizeSoftDeleteTests(TestCase):
     """
@@ -212,3 +297,84 @@ class ProductAvailabilityTests(TestCase):
         self.assertNotIn(self.unavailable_product_with_sizes, partial)
         self.assertNotIn(self.unavailable_product_without_sizes, partial)
         self.assertNotIn(self.available_product_without_sizes, partial)
+
+    def test_availability_status_persisted(self):
+        self.assertEqual(
+            Product.objects.get(pk=self.available_product_with_deleted_size.pk).availability_status,
+            Product.AVAILABLE)
+        self.assertEqual(
+            Product.objects.get(pk=self.paritally_available_product_with_sizes.pk).availability_status,
+            Product.PARTIALLY_AVAILABLE)
+        product = Product.objects.get(pk=self.available_product_with_sizes.pk)
+        self.assertEqual(product.active_sizes_count, 3)
+        self.assertEqual(product.in_stock_sizes_count, 3)
+
+    def test_stock_reservation_updates_availability(self):
+        StockService.reserve_stock(
+            self.available_product_without_sizes.id, 10)
+        self.assertIn(self.available_product_without_sizes,
+                      Product.objects.unavailable())
+
+        StockService.reserve_stock(
+            self.available_product_with_sizes.id, 4, size="L")
+        self.assertIn(self.available_product_with_sizes,
+                      Product.objects.partially_available())
+
+        StockService.unreserve_stock(
+            self.available_product_with_sizes.id, 4, size="L")
+        self.assertIn(self.available_product_with_sizes,
+                      Product.objects.available())
+
+    def test_size_delete_and_restore_updates_availability(self):
+        size = self.paritally_available_product_with_sizes.sizes.get(size="M")
+        size.delete()
+        self.assertIn(self.paritally_available_product_with_sizes,
+                      Product.objects.available())
+        size.restore()
+        self.assertIn(self.paritally_available_product_with_sizes,
+                      Product.objects.partially_available())
+
+    def test_full_save_keeps_concurrently_refreshed_availability(self):
+        stale = Product.objects.get(pk=self.available_product_with_sizes.pk)
+        # Another request sells out a size after `stale` was loaded
+        size = Size.objects.get(product=stale, size="L")
+        size.available_quantity = 0
+        size.save()
+
+        stale.product_name = "Renamed"
+        stale.save()
+        product = Product.objects.get(pk=stale.pk)
+        self.assertEqual(product.product_name, "Renamed")
+        self.assertEqual(product.in_stock_sizes_count, 2)
+        self.assertEqual(product.availability_status, Product.PARTIALLY_AVAILABLE)
+
+        # Without sizes, the availability follows the saved quantity
+        product = Product.objects.get(pk=self.available_product_without_sizes.pk)
+        product.available_quantity = 0
+        product.save()
+        self.assertIn(product, Product.objects.unavailable())
+
+    def test_refresh_availability_writes_the_queryset_only(self):
+        Product.objects.update(
+            availability_status=Product.UNAVAILABLE,
+            active_sizes_count=0,
+            in_stock_sizes_count=0)
+        refreshed = self.paritally_available_product_with_sizes
+        updated = Product.objects.filter(pk=refreshed.pk).refresh_availability()
+        self.assertEqual(updated, 1)
+        refreshed.refresh_from_db()
+        self.assertEqual(refreshed.availability_status, Product.PARTIALLY_AVAILABLE)
+        self.assertEqual(refreshed.active_sizes_count, 3)
+        self.assertEqual(
+            Product.objects.get(pk=self.available_product_with_sizes.pk).availability_status,
+            Product.UNAVAILABLE)
+
+    def test_rebuild_product_availability_command(self):
+        Product.objects.update(
+            availability_status=Product.UNAVAILABLE,
+            active_sizes_count=0,
+            in_stock_sizes_count=0)
+        call_command("rebuild_product_availability", stdout=StringIO())
+        self.test_available_filter()
+        self.test_unavailable_filter()
+        self.test_partially_available_filter()
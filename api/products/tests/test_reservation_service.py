@@ -0,0 +1,122 @@
+import logging
+from datetime import timedelta
+from django.test import TestCase
+from django.utils.timezone import now
+import pytest
+from django.core.exceptions import ValidationError
+from .test_helpers import TestHelpers
+from accounts.models import Cart
+from products.models import Product, Size, StockReservation
+from products.services.reservation_service import ReservationService
+from products.tasks import release_expired_reservations_task
+
+logger = logging.getLogger('products_tests')
+
+
+class TestReservationService(TestCase):
+    def setUp(self):
+        self.user, self.store, self.business_owner = TestHelpers.create_seller()
+        self.product = TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_without_sizes(available_quantity=10),
+            self.user,
+            self.store
+        )
+        self.sized_product = TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_with_size(
+                sizes=[
+                    {"size": "S", "available_quantity": 5},
+                    {"size": "M", "available_quantity": 2},
+                ]
+            ),
+            self.user,
+            self.store
+        )
+
+    def expire(self, *reservations):
+        StockReservation.objects.filter(
+            pk__in=[reservation.pk for reservation in reservations]
+        ).update(expires_at=now() - timedelta(seconds=1))
+
+    def test_hold_reserves_stock_and_records_expiry(self):
+        reservation = ReservationService.hold(self.product.id, 3)
+        self.product.refresh_from_db()
+
+        self.assertEqual(self.product.available_quantity, 7)
+        self.assertEqual(self.product.reserved_quantity, 3)
+        self.assertEqual(reservation.status, StockReservation.ACTIVE)
+        self.assertGreater(reservation.expires_at, now())
+
+    def test_hold_insufficient_stock_records_nothing(self):
+        with pytest.raises(ValidationError, match="Not enough stock available for this size."):
+            ReservationService.hold(self.sized_product.id, 3, size="M")
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_release_returns_stock_once(self):
+        reservation = ReservationService.hold(self.product.id, 3)
+        ReservationService.release(reservation.pk)
+        ReservationService.release(reservation.pk)
+        self.product.refresh_from_db()
+
+        self.assertEqual(self.product.available_quantity, 10)
+        self.assertEqual(self.product.reserved_quantity, 0)
+
+    def test_complete_consumes_hold(self):
+        reservation = ReservationService.hold(self.sized_product.id, 2, size="S")
+        ReservationService.complete(reservation.pk)
+        size = Size.objects.get(product=self.sized_product, size="S")
+
+        self.assertEqual(size.available_quantity, 3)
+        self.assertEqual(size.reserved_quantity, 0)
+        with pytest.raises(ValidationError, match="Reservation is no longer active."):
+            ReservationService.complete(reservation.pk)
+
+    def test_release_expired_in_batches(self):
+        holds = [ReservationService.hold(self.product.id, 1) for _ in range(5)]
+        holds.append(ReservationService.hold(self.sized_product.id, 2, size="M"))
+        fresh = ReservationService.hold(self.sized_product.id, 1, size="S")
+        self.expire(*holds)
+
+        released = release_expired_reservations_task(batch_size=2)
+
+        self.assertEqual(released, 6)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.available_quantity, 10)
+        self.assertEqual(self.product.reserved_quantity, 0)
+        size_m = Size.objects.get(product=self.sized_product, size="M")
+        self.assertEqual(size_m.available_quantity, 2)
+        self.assertEqual(size_m.reserved_quantity, 0)
+        self.sized_product.refresh_from_db()
+        self.assertEqual(self.sized_product.availability_status, Product.AVAILABLE)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, StockReservation.ACTIVE)
+        self.assertEqual(
+            StockReservation.objects.filter(status=StockReservation.RELEASED).count(), 6)
+
+    def test_release_expired_query_count_does_not_grow_with_holds(self):
+        holds = [ReservationService.hold(self.product.id, 1) for _ in range(8)]
+        self.expire(*holds)
+        # select holds, lock product, bulk update, availability refresh, mark released
+        # and the empty follow-up batches; independent of the number of holds
+        with self.assertNumQueries(11):
+            ReservationService.release_expired(batch_size=100)
+
+    def test_release_abandoned_cart_holds(self):
+        cart = Cart.objects.create(user=self.user)
+        reservation = ReservationService.hold(self.product.id, 4, cart=cart)
+        cart.status = "abandoned"
+        cart.save()
+
+        self.assertEqual(ReservationService.release_expired(), 1)
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, StockReservation.RELEASED)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.available_quantity, 10)
+
+    def test_release_expired_skips_stock_of_deleted_size(self):
+        reservation = ReservationService.hold(self.sized_product.id, 1, size="S")
+        Size.objects.filter(product=self.sized_product, size="S").update(is_deleted=True)
+        self.expire(reservation)
+
+        self.assertEqual(ReservationService.release_expired(), 1)
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, StockReservation.RELEASED)
@@ -0,0 +1,165 @@
+from unittest.mock import patch
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from products.models import Product, Tag
+from products.services.search_index_service import BUILDING_KEY_PREFIX, index_products
+from products.services.stock_service import StockService
+from search.documents import ProductDocument
+from .test_helpers import TestHelpers
+
+# The debounce keys and fingerprints are kept in the cache
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(ELASTICSEARCH_DSL_AUTOSYNC=True, SEARCH_INDEX_DELAY_SECONDS=2, CACHES=LOCMEM_CACHES)
+class QueuedSignalProcessorTests(TestCase):
+    """
+    Changes are queued for `index_products_task` on commit instead of being
+    written to Elasticsearch within the request.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.store, _ = TestHelpers.create_seller()
+        with patch("products.tasks.index_products_task.apply_async"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product = TestHelpers.creat_product(
+                    TestHelpers.get_valid_product_data_without_sizes(available_quantity=3),
+                    self.user, self.store)
+                self.sized = TestHelpers.creat_product(
+                    TestHelpers.get_valid_product_data_with_size(
+                        sizes=[{"size": "M", "available_quantity": 2},
+                               {"size": "L", "available_quantity": 5}]),
+                    self.user, self.store)
+        cache.clear()
+
+    def queued(self, changes):
+        """Product ids of the tasks queued by `changes` once it commits."""
+        with patch("products.tasks.index_products_task.apply_async") as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                changes()
+        for call in apply_async.call_args_list:
+            self.assertEqual(call.kwargs["countdown"], 2)
+        return [call.args[0][0] for call in apply_async.call_args_list]
+
+    def test_changes_in_one_transaction_are_coalesced(self):
+        def changes():
+            self.product.product_name = "Renamed"
+            self.product.save()
+            self.sized.color = "Blue"
+            self.sized.save()
+            self.product.tags.add(Tag.objects.create(name="new"))
+        self.assertEqual(self.queued(changes), [sorted([self.product.pk, self.sized.pk])])
+
+    def test_queued_products_join_the_pending_task(self):
+        self.assertEqual(self.queued(lambda: self.product.save()), [[self.product.pk]])
+        self.assertEqual(self.queued(lambda: self.product.save()), [])
+
+        with patch.object(ProductDocument, "bulk", return_value=(1, [])):
+            index_products([self.product.pk])
+        self.assertEqual(self.queued(lambda: self.product.save()), [[self.product.pk]])
+
+    def test_stock_changes_are_queued_only_when_availability_changes(self):
+        self.assertEqual(self.queued(lambda: StockService.reserve_stock(self.product.pk, 1)), [])
+        self.assertEqual(self.queued(lambda: StockService.reserve_stock(self.sized.pk, 1, "L")), [])
+        self.assertEqual(self.queued(lambda: StockService.unreserve_stock(self.product.pk, 1)), [])
+
+        # Sold out
+        self.assertEqual(self.queued(lambda: StockService.reserve_stock(self.product.pk, 3)),
+                         [[self.product.pk]])
+        # Size sold out
+        self.assertEqual(self.queued(lambda: StockService.reserve_stock(self.sized.pk, 2, "M")),
+                         [[self.sized.pk]])
+
+    def test_queryset_soft_delete_is_queued(self):
+        self.assertEqual(
+            self.queued(lambda: Product.objects.filter(pk=self.product.pk).delete()),
+            [[self.product.pk]])
+
+    def test_writes_are_queued_without_the_cache(self):
+        with patch("products.services.search_index_service.cache.add",
+                   side_effect=ConnectionError("cache down")):
+            self.assertEqual(self.queued(lambda: self.product.save()), [[self.product.pk]])
+
+    def test_hard_delete_is_queued(self):
+        self.assertEqual(
+            self.queued(lambda: Product.objects.filter(pk=self.product.pk).hard_delete()),
+            [[self.product.pk]])
+
+
+@override_settings(ELASTICSEARCH_DSL_AUTOSYNC=True, CACHES=LOCMEM_CACHES)
+class IndexProductsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.store, _ = TestHelpers.create_seller()
+        self.products = [
+            TestHelpers.creat_product(
+                TestHelpers.get_valid_product_data_without_sizes(product_name=f"Product {index}"),
+                self.user, self.store)
+            for index in range(3)
+        ]
+        self.ids = [product.pk for product in self.products]
+
+    def index(self, product_ids):
+        """Actions of the bulk requests sent by `index_products`."""
+        with patch.object(ProductDocument, "bulk", return_value=(0, [])) as bulk:
+            counts = index_products(product_ids)
+        actions = [action for call in bulk.call_args_list for action in call.args[0]]
+        return counts, actions
+
+    def test_documents_are_sent_in_one_bulk_request(self):
+        with patch.object(ProductDocument, "bulk", return_value=(3, [])) as bulk, \
+                self.assertNumQueries(3):
+            index_products(self.ids)
+        bulk.assert_called_once()
+        actions = bulk.call_args.args[0]
+        self.assertEqual(sorted(action["_id"] for action in actions), self.ids)
+        self.assertEqual({action["_op_type"] for action in actions}, {"index"})
+        self.assertEqual(actions[0]["_source"]["availability"], Product.AVAILABLE)
+
+    def test_unchanged_documents_are_skipped(self):
+        self.index(self.ids)
+        Product.objects.filter(pk=self.ids[0]).update(product_name="Renamed")
+        # Not in the document
+        Product.objects.filter(pk=self.ids[1]).update(reserved_quantity=4)
+
+        counts, actions = self.index(self.ids)
+        self.assertEqual(counts, {"indexed": 1, "deleted": 0, "skipped": 2})
+        self.assertEqual([action["_source"]["product_name"] for action in actions], ["Renamed"])
+
+    def test_deleted_products_are_removed(self):
+        self.index(self.ids)
+        self.products[0].delete()
+        Product.objects.filter(pk=self.ids[1]).hard_delete()
+
+        counts, actions = self.index(self.ids)
+        self.assertEqual(counts, {"indexed": 0, "deleted": 2, "skipped": 1})
+        self.assertEqual(sorted((action["_op_type"], action["_id"]) for action in actions),
+                         [("delete", self.ids[0]), ("delete", self.ids[1])])
+        self.assertEqual(self.index(self.ids)[1], [])
+
+    def test_failed_documents_are_retried(self):
+        error = {"index": {"_id": str(self.ids[0]), "status": 429, "error": "rejected"}}
+        with patch.object(ProductDocument, "bulk", return_value=(2, [error])):
+            counts = index_products(self.ids)
+        self.assertEqual(counts["indexed"], 2)
+        self.assertEqual([action["_id"] for action in self.index(self.ids)[1]], [self.ids[0]])
+
+    def test_documents_are_indexed_without_the_cache(self):
+        with patch("products.services.search_index_service.cache") as unreachable:
+            for method in ("get", "get_many", "set_many", "delete_many"):
+                getattr(unreachable, method).side_effect = ConnectionError("cache down")
+            counts, actions = self.index(self.ids)
+        self.assertEqual(counts, {"indexed": 3, "deleted": 0, "skipped": 0})
+        self.assertEqual(sorted(action["_id"] for action in actions), self.ids)
+
+    def test_changes_also_go_to_an_index_being_rebuilt(self):
+        cache.set(f"{BUILDING_KEY_PREFIX}:products", "products-new")
+        self.products[0].delete()
+        counts, actions = self.index(self.ids[:2])
+        self.assertEqual(counts, {"indexed": 1, "deleted": 1, "skipped": 0})
+        self.assertEqual(sorted((action["_op_type"], action["_index"], action["_id"]) for action in actions), [
+            ("delete", "products", self.ids[0]), ("delete", "products-new", self.ids[0]),
+            ("index", "products", self.ids[1]), ("index", "products-new", self.ids[1]),
+        ])
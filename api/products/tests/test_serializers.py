@@ -1,8 +1,15 @@
+from datetime import timedelta
 from decimal import Decimal
 import json
+import time
 from django.test import TestCase
-from products.models import Offer, Tag
-from products.serializers import ProductSerializer
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from products.models import Offer, Product, ProductTag, Size, Tag
+from products.serializers import ProductListSerializer, ProductSerializer
 import logging
 from .test_helpers import TestHelpers
 
@@ -144,7 +151,8 @@ class ProductSerializerTests(TestCase):
                          data['product_name'])
         self.assertEqual(product.owner_id, self.user)
         self.assertEqual(product.store, self.store)
-        self.assertTrue(product.picture.name.startswith('products/test_image'))
+        # Stored under its content hash
+        self.assertRegex(product.picture.name, r'^blobs/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
 
     def test_create_product_with_tags(self):
         # First product with one tag
@@ -318,3 +326,189 @@ class ProductSerializerTests(TestCase):
         # Step 3: Validate the offer now exists
         self.assertIsNotNone(product.offer)
         self.assertEqual(product.offer.offer_price, Decimal('9.99'))
+
+
+class ProductListSerializerTests(TestCase):
+    """ProductListSerializer must render exactly what ProductSerializer renders."""
+
+    def setUp(self):
+        self.user, self.store, self.buisness_owner = TestHelpers.create_seller()
+        tags = [Tag.objects.create(name=name) for name in ("new", "sale", "eco")]
+        for offer_dates in (TestHelpers.get_active_offer_dates(),
+                            TestHelpers.get_expired_offer_dates(),
+                            TestHelpers.get_future_offer_dates(),
+                            None):
+            data = TestHelpers.get_valid_product_data_without_sizes(price='25.50')
+            if offer_dates:
+                data = TestHelpers.add_offer_to_product_data(data, *offer_dates, '19.99')
+            product = TestHelpers.creat_product(data, self.user, self.store)
+            product.tags.add(*tags[:2])
+        sized = TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_with_size(
+                sizes=TestHelpers.get_paritally_available_sizes()),
+            self.user, self.store)
+        sized.tags.add(tags[2])
+        sized.sizes.get(size="L").delete()
+        plain = TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_without_sizes(color=None, available_quantity=0),
+            self.user, self.store)
+        plain.brand = None
+        plain.properties = {"material": "cotton", "sizes": [1, 2]}
+        plain.save()
+
+    def test_output_is_byte_identical(self):
+        queryset = Product.objects.for_listing().order_by("-created_at")
+        expected = JSONRenderer().render(ProductSerializer(queryset, many=True).data)
+        actual = JSONRenderer().render(
+            ProductListSerializer(ProductListSerializer.values(queryset)).data)
+        self.assertEqual(actual, expected)
+
+    def test_output_is_byte_identical_with_request(self):
+        # As in my-products, where the picture URLs are absolute
+        request = Request(APIRequestFactory().get(reverse("product-my-products")))
+        queryset = Product.objects.for_listing().order_by("-created_at")
+        expected = JSONRenderer().render(
+            ProductSerializer(queryset, many=True, context={"request": request}).data)
+        actual = JSONRenderer().render(ProductListSerializer(
+            ProductListSerializer.values(queryset), context={"request": request}).data)
+        self.assertIn(b'"picture":"http://testserver/', actual)
+        self.assertEqual(actual, expected)
+
+    def test_output_is_byte_identical_while_pricing_is_stale(self):
+        # Offers start and end without a write: the stored pricing is stale
+        # until the repricing tasks run
+        Offer.objects.filter(start_date__gt=now()).update(start_date=now() - timedelta(seconds=1))
+        Offer.objects.filter(start_date__lte=now(), end_date__gte=now()).exclude(
+            product__has_active_offer=False).update(end_date=now() - timedelta(seconds=1))
+        self.assertEqual(Product.objects.all_with_deleted().with_stale_pricing().count(), 2)
+        self.test_output_is_byte_identical()
+
+    def test_empty_rows(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(ProductListSerializer([]).data, [])
+
+
+class ProductListSerializerBenchmark(TestCase):
+    """
+    Logs the serialization throughput of ProductSerializer and
+    ProductListSerializer on 1k products (queries excluded). Wall-clock
+    times are not asserted: they vary with the load of the test run.
+    """
+    products = 1000
+
+    def setUp(self):
+        self.user, self.store, _ = TestHelpers.create_seller()
+        # bulk_create: the benchmark data does not need history or signals
+        Product.objects.bulk_create([
+            Product(
+                product_name=f"Product {index}",
+                product_description="Benchmark product",
+                price=Decimal("10.00") + index,
+                effective_price=Decimal("10.00") + index,
+                has_sizes=bool(index % 2),
+                available_quantity=None if index % 2 else 5,
+                reserved_quantity=None if index % 2 else 0,
+                owner_id=self.user,
+                store=self.store,
+                category="Benchmark",
+                picture="products/benchmark.jpg",
+                properties={"index": index},
+            ) for index in range(self.products)
+        ])
+        products = list(Product.objects.filter(has_sizes=True))
+        Size.objects.bulk_create([
+            Size(product=product, size=size, available_quantity=3, reserved_quantity=0)
+            for product in products for size in ("S", "M", "L")
+        ])
+        tag = Tag.objects.create(name="benchmark")
+        ProductTag.objects.bulk_create([
+            ProductTag(product=product, tag=tag) for product in Product.objects.all()
+        ])
+
+    def test_serialization_benchmark(self):
+        queryset = Product.objects.for_listing().order_by("id")
+        instances = list(queryset)
+        rows = list(ProductListSerializer.values(queryset))
+
+        start = time.perf_counter()
+        model_data = ProductSerializer(instances, many=True).data
+        model_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        list_data = ProductListSerializer(rows).data
+        list_time = time.perf_counter() - start
+
+        logger.info(
+            "Serializing %d products: ProductSerializer %.0f/s, ProductListSerializer %.0f/s",
+            self.products, self.products / model_time, self.products / list_time)
+        self.assertEqual(JSONRenderer().render(list_data), JSONRenderer().render(model_data))
+
+
+class ProductSerializerWriteQueryTests(TestCase):
+    """Pins the number of queries of the ProductSerializer write paths."""
+
+    def setUp(self):
+        self.user, self.store, self.business_owner = TestHelpers.create_seller()
+        Tag.objects.create(name="tag 0")
+
+    def get_sized_data(self, count):
+        data = TestHelpers.get_valid_product_data_with_size(
+            sizes=[{"size": f"S{index}", "available_quantity": index}
+                   for index in range(count)])
+        data["tags"] = [f"tag {index}" for index in range(count)]
+        return data
+
+    def create_product(self, data):
+        serializer = ProductSerializer(data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer.save(owner_id=self.user, store=self.store)
+
+    def update_product(self, product, data):
+        serializer = ProductSerializer(product, data=data, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer.save()
+
+    def test_create_query_count_is_constant(self):
+        # picture reference (insert, lock, increment), product, existing
+        # tags, new tags, new tag ids, product tags, sizes, availability
+        # count + update
+        with self.assertNumQueries(11):
+            product = self.create_product(self.get_sized_data(2))
+        with self.assertNumQueries(11):
+            self.create_product(self.get_sized_data(6))
+        self.assertEqual(sorted(product.tags.values_list("name", flat=True)),
+                         ["tag 0", "tag 1"])
+        self.assertEqual(product.sizes.count(), 2)
+        self.assertEqual(product.availability_status, Product.PARTIALLY_AVAILABLE)
+        self.assertEqual(Tag.objects.count(), 6)
+
+    def test_update_query_count_is_constant(self):
+        product = self.create_product(self.get_sized_data(2))
+        data = {
+            "tags": ["tag 1", "tag 2", "tag 3"],
+            "sizes": [{"size": "S0", "available_quantity": 5},
+                      {"size": "S1", "available_quantity": 1},
+                      {"size": "S2", "available_quantity": 1},
+                      {"size": "S3", "available_quantity": 1}],
+        }
+        # product, current tags, unlinked rows + delete, existing tags, new tags,
+        # new tag ids, link, current sizes, size update, size insert,
+        # availability count + update
+        with self.assertNumQueries(13):
+            product = self.update_product(product, data)
+        self.assertEqual(sorted(product.tags.values_list("name", flat=True)),
+                         ["tag 1", "tag 2", "tag 3"])
+        self.assertEqual(
+            dict(product.sizes.values_list("size", "available_quantity")),
+            {"S0": 5, "S1": 1, "S2": 1, "S3": 1})
+        self.assertEqual(product.availability_status, Product.AVAILABLE)
+
+    def test_update_with_unchanged_tags_and_sizes_writes_neither(self):
+        product = self.create_product(self.get_sized_data(2))
+        data = {
+            "tags": ["tag 1", "tag 0"],
+            "sizes": [{"size": "S1", "available_quantity": 1}],
+        }
+        # product, current tags, current sizes, availability count + update
+        with self.assertNumQueries(5):
+            self.update_product(product, data)
@@ -1,10 +1,18 @@
-from django.test import TestCase
+import logging
+import threading
+import time
+from unittest import skipIf
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 import pytest
 from django.core.exceptions import ValidationError
 from .test_helpers import TestHelpers
-from products.models import Size
+from products.models import Product, ProductHistory, Size
 from products.services.stock_service import StockService
 
+logger = logging.getLogger('products_tests')
+
 
 class TestStockService(TestCase):
     no_size_quantity = 10
@@ -170,3 +178,248 @@ class TestStockService(TestCase):
                 product_id=self.product_with_size.id,
                 quantity=2,
             )
+
+    # -------------------------------
+    # Batch Reservation
+    # -------------------------------
+    def test_reserve_many_success(self):
+        results = StockService.reserve_many([
+            (self.product_without_size.id, None, 3),
+            (self.product_with_size.id, "S", 2),
+            (self.product_with_size.id, "M", 1),
+            (self.product_with_size.id, "S", 1),  # merged with the first S line
+        ])
+        self.assertEqual(len(results), 3)
+
+        self.product_without_size.refresh_from_db()
+        self.assertEqual(self.product_without_size.available_quantity,
+                         TestStockService.no_size_quantity - 3)
+        self.assertEqual(self.product_without_size.reserved_quantity, 3)
+
+        size_s = Size.objects.get(product=self.product_with_size, size="S")
+        self.assertEqual(size_s.available_quantity,
+                         TestStockService.s_quantity - 3)
+        self.assertEqual(size_s.reserved_quantity, 3)
+        size_m = Size.objects.get(product=self.product_with_size, size="M")
+        self.assertEqual(size_m.available_quantity,
+                         TestStockService.m_quantity - 1)
+
+    def test_reserve_many_is_all_or_nothing(self):
+        with pytest.raises(ValidationError, match="Not enough stock available for this size."):
+            StockService.reserve_many([
+                (self.product_without_size.id, None, 3),
+                (self.product_with_size.id, "M", 100),
+            ])
+        self.product_without_size.refresh_from_db()
+        self.assertEqual(self.product_without_size.available_quantity,
+                         TestStockService.no_size_quantity)
+        self.assertEqual(self.product_without_size.reserved_quantity, 0)
+
+    def test_reserve_many_missing_size_param(self):
+        with pytest.raises(ValidationError, match="Size must be specified for products with sizes."):
+            StockService.reserve_many([(self.product_with_size.id, None, 1)])
+
+    def test_reserve_many_unknown_size(self):
+        with pytest.raises(Size.DoesNotExist):
+            StockService.reserve_many([(self.product_with_size.id, "XXL", 1)])
+
+    def test_reserve_many_updates_availability(self):
+        StockService.reserve_many([
+            (self.product_without_size.id, None, TestStockService.no_size_quantity),
+            (self.product_with_size.id, "M", TestStockService.m_quantity),
+        ])
+        self.product_without_size.refresh_from_db()
+        self.product_with_size.refresh_from_db()
+        self.assertEqual(self.product_without_size.availability, "unavailable")
+        self.assertEqual(self.product_with_size.availability,
+                         "partially_available")
+
+    def test_unreserve_many(self):
+        StockService.reserve_many([
+            (self.product_without_size.id, None, 4),
+            (self.product_with_size.id, "L", 2),
+        ])
+        StockService.unreserve_many([
+            (self.product_without_size.id, None, 2),
+            (self.product_with_size.id, "L", 5),
+        ])
+        self.product_without_size.refresh_from_db()
+        self.assertEqual(self.product_without_size.available_quantity,
+                         TestStockService.no_size_quantity - 4 + 2)
+        self.assertEqual(self.product_without_size.reserved_quantity, 2)
+
+        size_l = Size.objects.get(product=self.product_with_size, size="L")
+        self.assertEqual(size_l.available_quantity,
+                         TestStockService.l_quantity - 2 + 5)
+        self.assertEqual(size_l.reserved_quantity, 0)
+
+    def test_unreserve_many_not_returned(self):
+        StockService.reserve_many([(self.product_without_size.id, None, 4)])
+        StockService.unreserve_many(
+            [(self.product_without_size.id, None, 4)], returned=False)
+        self.product_without_size.refresh_from_db()
+        self.assertEqual(self.product_without_size.available_quantity,
+                         TestStockService.no_size_quantity - 4)
+        self.assertEqual(self.product_without_size.reserved_quantity, 0)
+
+    # -------------------------------
+    # Conditional (lock-free) Reservation
+    # -------------------------------
+    def test_reserve_stock_conditional_no_sizes(self):
+        StockService.reserve_stock_conditional(
+            self.product_without_size.id, 3)
+        self.product_without_size.refresh_from_db()
+        self.assertEqual(self.product_without_size.available_quantity,
+                         TestStockService.no_size_quantity - 3)
+        self.assertEqual(self.product_without_size.reserved_quantity, 3)
+        self.assertEqual(self.product_without_size.availability, "available")
+
+    def test_reserve_stock_conditional_no_sizes_sold_out(self):
+        StockService.reserve_stock_conditional(
+            self.product_without_size.id, TestStockService.no_size_quantity)
+        self.product_without_size.refresh_from_db()
+        self.assertEqual(self.product_without_size.available_quantity, 0)
+        self.assertEqual(self.product_without_size.availability, "unavailable")
+        with pytest.raises(ValidationError, match="Not enough stock available."):
+            StockService.reserve_stock_conditional(
+                self.product_without_size.id, 1)
+
+    def test_reserve_stock_conditional_with_size(self):
+        StockService.reserve_stock_conditional(
+            self.product_with_size.id, 1, size="M")
+        size_m = Size.objects.get(product=self.product_with_size, size="M")
+        self.assertEqual(size_m.available_quantity,
+                         TestStockService.m_quantity - 1)
+        self.assertEqual(size_m.reserved_quantity, 1)
+        self.product_with_size.refresh_from_db()
+        self.assertEqual(self.product_with_size.availability, "available")
+
+        # Emptying the size flips the product to partially available
+        StockService.reserve_stock_conditional(
+            self.product_with_size.id, TestStockService.m_quantity - 1, size="M")
+        self.product_with_size.refresh_from_db()
+        self.assertEqual(self.product_with_size.availability,
+                         "partially_available")
+        self.assertEqual(self.product_with_size.in_stock_sizes_count, 2)
+
+    def test_reserve_stock_conditional_with_size_not_enough_quantity(self):
+        with pytest.raises(ValidationError, match="Not enough stock available for this size."):
+            StockService.reserve_stock_conditional(
+                self.product_with_size.id, 100, size="M")
+
+    def test_reserve_stock_conditional_missing_size_param(self):
+        with pytest.raises(ValidationError, match="Size must be specified for products with sizes."):
+            StockService.reserve_stock_conditional(
+                self.product_with_size.id, 1)
+
+    def test_reserve_stock_conditional_unknown_product(self):
+        with pytest.raises(Product.DoesNotExist):
+            StockService.reserve_stock_conditional(0, 1)
+        with pytest.raises(Product.DoesNotExist):
+            StockService.reserve_stock_conditional(0, 1, size="M")
+
+    def test_reserve_stock_conditional_ignores_size_without_sizes(self):
+        # Same as reserve_many, which ignores the size of such products
+        StockService.reserve_stock_conditional(
+            self.product_without_size.id, 2, size="M")
+        StockService.reserve_many([(self.product_without_size.id, "M", 3)])
+        self.product_without_size.refresh_from_db()
+        self.assertEqual(self.product_without_size.available_quantity,
+                         TestStockService.no_size_quantity - 5)
+        self.assertEqual(self.product_without_size.reserved_quantity, 5)
+
+    def test_reserve_stock_conditional_skips_history(self):
+        history_count = ProductHistory.objects.count()
+        StockService.reserve_stock_conditional(
+            self.product_without_size.id, 1)
+        self.assertEqual(ProductHistory.objects.count(), history_count)
+
+
+class TestStockServiceBenchmark(TransactionTestCase):
+    """
+    Compares the row-locking reservation path with the conditional-UPDATE path.
+
+    The sequential benchmark runs on every backend and pins the number of
+    queries per reservation. The threaded benchmark needs a database with
+    real row locking (MySQL) and is skipped on SQLite.
+    """
+    stock = 200
+    reservations = 50
+    threads = 8
+
+    def setUp(self):
+        self.user, self.store, _ = TestHelpers.create_seller()
+
+    def _create_product(self):
+        return TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_without_sizes(
+                available_quantity=self.stock),
+            self.user,
+            self.store
+        )
+
+    def _run_sequential(self, reserve):
+        product = self._create_product()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(self.reservations):
+                reserve(product_id=product.id, quantity=1)
+            elapsed = time.perf_counter() - start
+        product.refresh_from_db()
+        self.assertEqual(product.available_quantity,
+                         self.stock - self.reservations)
+        self.assertEqual(product.reserved_quantity, self.reservations)
+        return len(queries), elapsed
+
+    def test_sequential_benchmark(self):
+        locked_queries, locked_time = self._run_sequential(
+            StockService.reserve_stock)
+        conditional_queries, conditional_time = self._run_sequential(
+            StockService.reserve_stock_conditional)
+        logger.info(
+            "reserve_stock: %d queries, %.1f res/s; "
+            "reserve_stock_conditional: %d queries, %.1f res/s",
+            locked_queries, self.reservations / locked_time,
+            conditional_queries, self.reservations / conditional_time)
+        # One UPDATE per reservation (plus savepoint bookkeeping)
+        self.assertLess(conditional_queries, locked_queries)
+
+    def _run_concurrent(self, reserve):
+        product = self._create_product()
+        per_thread = self.stock // self.threads + 1  # oversubscribe on purpose
+        failures = []
+
+        def worker():
+            try:
+                for _ in range(per_thread):
+                    try:
+                        reserve(product_id=product.id, quantity=1)
+                    except ValidationError:
+                        failures.append(1)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker)
+                   for _ in range(self.threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        product.refresh_from_db()
+        self.assertEqual(product.available_quantity, 0)
+        self.assertEqual(product.reserved_quantity, self.stock)
+        self.assertEqual(len(failures), per_thread * self.threads - self.stock)
+        return per_thread * self.threads / elapsed
+
+    @skipIf(connection.vendor == "sqlite", "SQLite has no row-level locking.")
+    def test_concurrent_benchmark(self):
+        locked_rate = self._run_concurrent(StockService.reserve_stock)
+        conditional_rate = self._run_concurrent(
+            StockService.reserve_stock_conditional)
+        logger.info(
+            "Concurrent reservations: reserve_stock %.1f res/s, "
+            "reserve_stock_conditional %.1f res/s",
+            locked_rate, conditional_rate)
@@ -1,13 +1,24 @@
+import base64
 from datetime import datetime, timedelta
 from decimal import Decimal
 import json
 import logging
-from rest_framework.test import APITestCase
+from unittest import mock
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework import status
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.timezone import now
 from accounts.models import User
 from .test_helpers import TestHelpers
-from products.models import Offer, Product, Size
+from products.models import Offer, Product, Size, Tag
+from products.serializers import ProductListSerializer, ProductSerializer
+from products.services.stock_service import StockService
+from products.views.views import ProductViewSet
 
 
 logger = logging.getLogger('products_tests')
@@ -269,6 +280,22 @@ class ProductViewSetTests(APITestCase):
         self.assertTrue(
             all(p.get("offer") and p["offer"]["is_active"] for p in response.data['results']))
 
+    def test_list_price_follows_offer_before_pricing_is_refreshed(self):
+        product = TestHelpers.creat_product(
+            TestHelpers.add_offer_to_product_data(
+                TestHelpers.get_valid_product_data_without_sizes(price=20),
+                *TestHelpers.get_future_offer_dates(), offer_price=15),
+            self.user, self.store)
+        # The offer starts; its repricing task has not run yet
+        Offer.objects.filter(product=product).update(start_date=now() - timedelta(seconds=1))
+
+        listed, = self.client.get(self.base_url).data['results']
+        detail = self.client.get(reverse('product-detail', args=[product.pk])).data
+        self.assertEqual(listed['current_price'], "15.00")
+        self.assertTrue(listed['offer']['is_active'])
+        self.assertEqual(listed['current_price'], detail['current_price'])
+        self.assertEqual(listed['offer'], detail['offer'])
+
     def test_sort_products_by_price_ascending(self):
         TestHelpers.creat_product(
             TestHelpers.get_valid_product_data_without_sizes(price="9.99"),
@@ -568,6 +595,8 @@ class ProductViewSetTests(APITestCase):
         ids = [p["id"] for p in results]
         self.assertIn(product.id, ids)
         self.assertNotIn(other_store_product.id, ids)
+        # Absolute, as ProductSerializer renders them with the request
+        self.assertTrue(results[0]["picture"].startswith("http://testserver/"))
 
     def test_my_products_filtered_by_unavailable(self):
         other_user, other_store, _ = TestHelpers.create_seller(
@@ -715,6 +744,420 @@ class ProductViewSetTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
 
+class ProductListQueryCountTests(APITestCase):
+    """Pins the number of queries of the product list endpoints to a constant."""
+
+    def setUp(self):
+        self.user, self.store, self.business_owner = TestHelpers.create_seller()
+        self.base_url = reverse('product-list')
+        self.tags = [Tag.objects.create(name=name) for name in ("new", "sale")]
+
+    def create_products(self, count):
+        start_date, end_date = TestHelpers.get_active_offer_dates()
+        for index in range(count):
+            if index % 2:
+                data = TestHelpers.get_valid_product_data_with_size(
+                    product_name=f"Sized {index}",
+                    sizes=TestHelpers.get_paritally_available_sizes())
+            else:
+                data = TestHelpers.add_offer_to_product_data(
+                    TestHelpers.get_valid_product_data_without_sizes(
+                        product_name=f"Plain {index}", price='50.00'),
+                    start_date, end_date, '40.00')
+            product = TestHelpers.creat_product(data, self.user, self.store)
+            product.tags.add(*self.tags)
+            self.user.favourite_products.add(product)
+
+    def test_list_page_query_count_is_constant(self):
+        self.create_products(10)
+        # count, page, sizes, tags
+        with self.assertNumQueries(4):
+            response = self.client.get(self.base_url)
+        self.assertEqual(len(response.data['results']), 10)
+
+        self.create_products(10)
+        with self.assertNumQueries(4):
+            self.client.get(self.base_url, {"page": 2})
+
+    def test_list_page_query_count_authenticated(self):
+        self.create_products(10)
+        self.client.force_authenticate(user=self.user)
+        # count, page, sizes, tags, favourite ids
+        with self.assertNumQueries(5):
+            response = self.client.get(self.base_url, {"sort": "-price"})
+        results = response.data['results']
+        self.assertTrue(all(product['is_favourite'] for product in results))
+        self.assertEqual(results[0]['tags'], ["new", "sale"])
+        plain = next(product for product in results if 'available_quantity' in product)
+        self.assertEqual(plain['current_price'], "40.00")
+
+    def test_my_products_and_favourites_query_count(self):
+        self.create_products(10)
+        self.client.force_authenticate(user=self.user)
+        # count, page, sizes, tags
+        with self.assertNumQueries(4):
+            self.client.get(reverse('product-my-products'))
+        # favourites, sizes, tags
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('favourites'))
+        self.assertEqual(len(response.data), 10)
+
+
+@override_settings(PRODUCT_LIST_CACHE_SECONDS=60)
+class ProductListCacheTests(APITestCase):
+    """Cached product list responses and their invalidation."""
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.store, self.business_owner = TestHelpers.create_seller()
+        self.base_url = reverse('product-list')
+        self.products = [
+            TestHelpers.creat_product(
+                TestHelpers.get_valid_product_data_without_sizes(
+                    product_name=f"Product {index}", available_quantity=2),
+                self.user, self.store)
+            for index in range(3)
+        ]
+
+    def test_repeated_query_is_served_from_cache(self):
+        first = self.client.get(self.base_url, {"category": "Electronics", "sort": "price"})
+        # Same params in another order
+        with self.assertNumQueries(0):
+            second = self.client.get(self.base_url, {"sort": "price", "category": "Electronics"})
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(second.data['results']), 3)
+
+        with self.assertNumQueries(4):
+            self.client.get(self.base_url, {"category": "Electronics", "sort": "-price"})
+
+    def test_product_change_invalidates_cache(self):
+        self.client.get(self.base_url)
+        product = self.products[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            product.product_name = "Renamed"
+            product.save()
+        response = self.client.get(self.base_url)
+        names = [item['product_name'] for item in response.data['results']]
+        self.assertIn("Renamed", names)
+
+    def test_stock_update_invalidates_cache(self):
+        self.client.get(self.base_url, {"availability": "unavailable"})
+        with self.captureOnCommitCallbacks(execute=True):
+            StockService.reserve_stock_conditional(self.products[0].id, 2)
+        response = self.client.get(self.base_url, {"availability": "unavailable"})
+        self.assertEqual([item['id'] for item in response.data['results']],
+                         [self.products[0].id])
+
+    def test_not_modified_is_answered_before_serializing(self):
+        etag = self.client.get(self.base_url)['ETag']
+        with mock.patch.object(ProductListSerializer, 'to_representation') as to_representation, \
+                self.assertNumQueries(0):
+            response = self.client.get(self.base_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        to_representation.assert_not_called()
+
+        # Favourites are per user and part of the ETag
+        self.user.favourite_products.add(self.products[1])
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.base_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            StockService.reserve_stock_conditional(self.products[0].id, 1)
+        response = self.client.get(self.base_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_authenticated_user_gets_cached_page_with_favourites(self):
+        self.client.get(self.base_url)
+        self.user.favourite_products.add(self.products[1])
+        self.client.force_authenticate(user=self.user)
+        # favourite ids
+        with self.assertNumQueries(1):
+            response = self.client.get(self.base_url)
+        favourites = {item['id']: item['is_favourite'] for item in response.data['results']}
+        self.assertEqual(favourites, {
+            self.products[0].id: False,
+            self.products[1].id: True,
+            self.products[2].id: False,
+        })
+        # The overlay is not stored in the cache
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.base_url)
+        self.assertFalse(any(item['is_favourite'] for item in response.data['results']))
+
+
+class ProductConditionalGetTests(APITestCase):
+    """ETag / If-None-Match on the product retrieve and list endpoints."""
+
+    def setUp(self):
+        self.user, self.store, self.business_owner = TestHelpers.create_seller()
+        self.product = TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_without_sizes(available_quantity=5),
+            self.user, self.store)
+        self.url = reverse('product-detail', args=[self.product.id])
+
+    def test_retrieve_not_modified_skips_serializer(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        with mock.patch.object(ProductSerializer, 'to_representation') as to_representation:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        to_representation.assert_not_called()
+
+    def test_retrieve_etag_changes_with_stock_and_favourite(self):
+        etag = self.client.get(self.url)['ETag']
+        StockService.reserve_stock_conditional(self.product.id, 1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['available_quantity'], 4)
+
+        etag = response['ETag']
+        self.user.favourite_products.add(self.product)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['is_favourite'])
+
+    def test_list_not_modified(self):
+        url = reverse('product-list')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.product.product_name = "Renamed"
+        self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ProductBulkUpdateTests(APITestCase):
+    """PATCH /products/bulk-update/ applying price and stock changes in bulk."""
+
+    def setUp(self):
+        self.user, self.store, self.business_owner = TestHelpers.create_seller()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('product-bulk-update')
+        self.plain = TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_without_sizes(
+                product_name="Plain", price='20.00', available_quantity=0),
+            self.user, self.store)
+        self.sized = TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_with_size(product_name="Sized"),
+            self.user, self.store)
+
+    def create_plain_products(self, count):
+        return [
+            TestHelpers.creat_product(
+                TestHelpers.get_valid_product_data_without_sizes(
+                    product_name=f"Bulk {index}", available_quantity=1),
+                self.user, self.store)
+            for index in range(count)
+        ]
+
+    def test_bulk_update_price_stock_and_sizes(self):
+        payload = {"products": [
+            {"id": self.plain.id, "price": "15.00", "available_quantity": 8},
+            {"id": self.sized.id, "sizes": [{"size": "M", "available_quantity": 0}]},
+        ]}
+        with mock.patch("products.tasks.write_product_history_task.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], sorted([self.plain.id, self.sized.id]))
+        # One history batch; ids enqueued by the rolled back setUp may ride along
+        delay.assert_called_once()
+        self.assertLessEqual({self.plain.id, self.sized.id}, set(delay.call_args.args[0]))
+
+        self.plain.refresh_from_db()
+        self.assertEqual(self.plain.price, Decimal("15.00"))
+        self.assertEqual(self.plain.effective_price, Decimal("15.00"))
+        self.assertEqual(self.plain.available_quantity, 8)
+        self.assertEqual(self.plain.availability_status, Product.AVAILABLE)
+        self.sized.refresh_from_db()
+        self.assertEqual(self.sized.sizes.get(size="M").available_quantity, 0)
+        self.assertEqual(self.sized.availability_status, Product.PARTIALLY_AVAILABLE)
+
+    def test_bulk_update_bumps_updated_at(self):
+        updated_at = {product.pk: product.updated_at for product in (self.plain, self.sized)}
+        payload = {"products": [
+            {"id": self.plain.id, "available_quantity": 4},
+            {"id": self.sized.id, "sizes": [{"size": "M", "available_quantity": 1}]},
+        ]}
+        response = self.client.patch(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for product in (self.plain, self.sized):
+            product.refresh_from_db()
+            self.assertGreater(product.updated_at, updated_at[product.pk])
+        self.assertEqual(self.plain.available_quantity, 4)
+        self.assertEqual(self.sized.sizes.get(size="M").available_quantity, 1)
+
+    def test_bulk_update_query_count_is_constant(self):
+        payload = {"products": [
+            {"id": product.id, "price": "9.00", "available_quantity": 5}
+            for product in self.create_plain_products(3)]}
+        with CaptureQueriesContext(connection) as small:
+            self.client.patch(self.url, payload, format='json')
+
+        payload = {"products": [
+            {"id": product.id, "price": "9.00", "available_quantity": 5}
+            for product in self.create_plain_products(30)]}
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.patch(self.url, payload, format='json')
+        self.assertEqual(len(response.data['updated']), 30)
+        self.assertEqual(len(large), len(small))
+
+    def test_bulk_update_rejects_foreign_products(self):
+        other, other_store, _ = TestHelpers.create_seller(
+            email="other@example.com", store_name="Other")
+        foreign = TestHelpers.creat_product(
+            TestHelpers.get_valid_product_data_without_sizes(product_name="Foreign"),
+            other, other_store)
+        payload = {"products": [
+            {"id": self.plain.id, "available_quantity": 3},
+            {"id": foreign.id, "available_quantity": 3},
+        ]}
+        response = self.client.patch(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.plain.refresh_from_db()
+        self.assertEqual(self.plain.available_quantity, 0)
+
+    def test_bulk_update_errors(self):
+        cases = [
+            ({"products": [{"id": 999999, "price": "5.00"}]}, status.HTTP_404_NOT_FOUND),
+            ({"products": [{"id": self.sized.id, "available_quantity": 3}]},
+             status.HTTP_400_BAD_REQUEST),
+            ({"products": [{"id": self.sized.id, "sizes": [
+                {"size": "XXL", "available_quantity": 3}]}]}, status.HTTP_400_BAD_REQUEST),
+            ({"products": [{"id": self.plain.id}]}, status.HTTP_400_BAD_REQUEST),
+            ({"products": [{"id": self.plain.id, "price": "1.00"},
+                           {"id": self.plain.id, "price": "2.00"}]}, status.HTTP_400_BAD_REQUEST),
+            ({"products": []}, status.HTTP_400_BAD_REQUEST),
+        ]
+        for payload, expected in cases:
+            response = self.client.patch(self.url, payload, format='json')
+            self.assertEqual(response.status_code, expected, payload)
+
+
+class ProductListIndexTests(APITestCase):
+    """The common product list queries are answered from an index (EXPLAIN)."""
+
+    def setUp(self):
+        self.user, self.store, self.business_owner = TestHelpers.create_seller()
+        for index in range(5):
+            TestHelpers.creat_product(
+                TestHelpers.get_valid_product_data_without_sizes(
+                    product_name=f"Product {index}"),
+                self.user, self.store)
+
+    def get_plan(self, params):
+        view = ProductViewSet(action="list")
+        view.request = Request(APIRequestFactory().get("/", params))
+        return view.get_queryset().explain()
+
+    def test_list_queries_use_indexes(self):
+        cases = [
+            ({"sort": "recent"}, "product_recent_idx"),
+            ({"category": "Electronics", "sort": "recent"}, "product_category_recent_idx"),
+            ({"classification": "Men", "sort": "recent"}, "product_class_recent_idx"),
+            ({"store": self.store.id, "sort": "recent"}, "product_store_recent_idx"),
+            ({"sort": "price"}, "product_price_idx"),
+            ({"category": "Electronics", "sort": "-price"}, "product_category_price_idx"),
+            ({"has_offer": "true", "sort": "price"}, "product_price_idx"),
+        ]
+        for params, index in cases:
+            with self.subTest(params=params):
+                plan = self.get_plan(params)
+                self.assertIn(index, plan)
+                # Rows come out of the index in order: no sort step
+                self.assertNotIn("TEMP B-TREE", plan.upper())
+                self.assertNotIn("FILESORT", plan.upper())
+
+
+class ProductListCursorPaginationTests(APITestCase):
+    """Keyset pagination of the product list (`?pagination=cursor`)."""
+
+    def setUp(self):
+        self.user, self.store, self.business_owner = TestHelpers.create_seller()
+        self.base_url = reverse('product-list')
+        start_date, end_date = TestHelpers.get_active_offer_dates()
+        for index in range(25):
+            data = TestHelpers.get_valid_product_data_without_sizes(
+                product_name=f"Product {index}", price=f"{10 + index % 4}.00")
+            if index % 3 == 0:
+                data = TestHelpers.add_offer_to_product_data(
+                    data, start_date, end_date, '5.00')
+            TestHelpers.creat_product(data, self.user, self.store)
+
+    def walk(self, params):
+        ids = []
+        response = self.client.get(self.base_url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(product['id'] for product in response.data['results'])
+            if not response.data['next']:
+                return ids, response
+            response = self.client.get(response.data['next'])
+
+    def test_walk_default_sort_covers_every_product_once(self):
+        ids, _ = self.walk({"pagination": "cursor"})
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_walk_price_sort_with_ties(self):
+        ids, _ = self.walk({"pagination": "cursor", "sort": "-price"})
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(len(set(ids)), 25)
+        prices = [Product.objects.get(pk=pk).current_price for pk in ids]
+        self.assertEqual(prices, sorted(prices, reverse=True))
+
+    def test_previous_cursor_returns_previous_page(self):
+        first = self.client.get(self.base_url, {"pagination": "cursor", "sort": "price"})
+        second = self.client.get(first.data['next'])
+        self.assertIsNone(first.data['previous'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual([product['id'] for product in back.data['results']],
+                         [product['id'] for product in first.data['results']])
+
+    def test_deep_page_query_count_without_count_or_offset(self):
+        response = self.client.get(self.base_url, {"pagination": "cursor"})
+        response = self.client.get(response.data['next'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(response.data['next'])
+        # page, sizes, tags
+        self.assertEqual(len(queries.captured_queries), 3)
+        self.assertEqual(len(response.data['results']), 5)
+        page_sql = queries.captured_queries[0]['sql'].upper()
+        self.assertNotIn('COUNT(', page_sql)
+        self.assertNotIn('OFFSET', page_sql)
+
+    def test_invalid_cursor_and_sort(self):
+        response = self.client.get(self.base_url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        # Tampered cursors: valid base64 JSON of the wrong shape or types
+        row = Product.objects.values("created_at", "id").first()
+        values = [row["created_at"].isoformat(), str(row["id"])]
+        for tampered in ([], "x", {"v": values}, {"v": values, "r": "1"}, {"v": values, "r": None},
+                         {"v": "ab", "r": 0}, {"v": [1, 2], "r": 0}, {"v": [{}, []], "r": 0},
+                         {"v": ["not a date", values[1]], "r": 0}, {"v": values[:1], "r": 0},
+                         # Out of the range of the columns
+                         {"v": [values[0], "9" * 30], "r": 0}, {"v": [values[0], "-" + "9" * 30], "r": 0}):
+            cursor = base64.urlsafe_b64encode(json.dumps(tampered).encode()).decode()
+            response = self.client.get(self.base_url, {"cursor": cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, tampered)
+        cursor = base64.urlsafe_b64encode(json.dumps({"v": ["1" * 30, values[1]], "r": 0}).encode()).decode()
+        response = self.client.get(self.base_url, {"cursor": cursor, "sort": "price"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        cursor = base64.urlsafe_b64encode(json.dumps({"v": values, "r": 0}).encode()).decode()
+        self.assertEqual(self.client.get(self.base_url, {"cursor": cursor}).status_code, status.HTTP_200_OK)
+        response = self.client.get(self.base_url, {"pagination": "cursor", "sort": "product_name"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class DeleteProductSizeViewTests(APITestCase):
     def setUp(self):
         # Create a user and store
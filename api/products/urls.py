@@ -6,6 +6,8 @@ from .views.favourites_view import (
     FavouriteProductsView,
     AddToFavouritesView,
     RemoveFromFavouritesView)
+from .views.history_view import ProductHistoryView
+from .views.import_view import ProductImportDetailView, ProductImportView
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
@@ -19,6 +21,15 @@ urlpatterns = [
     path('<int:product_id>/offers/delete/',
          DeleteProductOfferView.as_view(),
          name='delete-product-offer'),
+    path('<int:product_id>/history/',
+         ProductHistoryView.as_view(),
+         name='product-history'),
+    path("import/",
+         ProductImportView.as_view(),
+         name="product-import"),
+    path("import/<int:import_id>/",
+         ProductImportDetailView.as_view(),
+         name="product-import-detail"),
     path("favourites/",
          FavouriteProductsView.as_view(),
          name="favourites"),
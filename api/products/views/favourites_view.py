@@ -6,7 +6,7 @@ from rest_framework import status
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 
 from products.models import Product
-from products.serializers import ProductSerializer
+from products.serializers import ProductListSerializer
 logger = logging.getLogger('accounts_favourites')
 
 
@@ -18,8 +18,9 @@ class FavouriteProductsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        favourites = request.user.favourite_products.all()
-        serializer = ProductSerializer(favourites, many=True)
+        favourites = ProductListSerializer.values(
+            request.user.favourite_products.for_listing())
+        serializer = ProductListSerializer(favourites)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -0,0 +1,77 @@
+import logging
+from django.db.models import Q
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import PageNumberPagination
+from rest_framework import status
+from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParameter
+
+from products.models import Product, ProductHistory
+from products.serializers import ProductHistorySerializer
+from products.services.history_service import diff_history
+logger = logging.getLogger('products_views')
+
+
+class ProductHistoryView(APIView):
+    """
+    Lists the history snapshots of a product, newest first, each with the
+    fields that changed since the previous snapshot.
+    Only the product owner can perform this action.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Product History",
+        description="""
+        Paginated history of a product, newest snapshot first.
+
+        - Each snapshot has a `changes` object mapping every field that changed
+          since the previous snapshot to its `old` and `new` value.
+        - `changes` is null for the first snapshot of the product.
+        - Only the **product owner** can see the history.
+        """,
+        parameters=[OpenApiParameter(name="page", required=False, type=int)],
+        responses={
+            200: OpenApiResponse(ProductHistorySerializer(many=True),
+                                 description="Paginated history snapshots."),
+            403: OpenApiResponse(description="User does not own this product."),
+            404: OpenApiResponse(description="Product not found."),
+        },
+    )
+    def get(self, request, product_id):
+        product = Product.objects.all_with_deleted().filter(pk=product_id).first()
+        if product is None:
+            return Response({"detail": "Product not found."},
+                            status=status.HTTP_404_NOT_FOUND)
+        if product.owner_id_id != request.user.id:
+            logger.critical(
+                "User %s attempted to read the history of product %s without permission.",
+                request.user.id,
+                product.id,
+            )
+            return Response(
+                {"detail": "You do not have permission to view this product's history."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        queryset = ProductHistory.objects.filter(
+            product_id=product.id).order_by("-recorded_at", "-id")
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        snapshots = ProductHistorySerializer(page, many=True).data
+
+        # The snapshot preceding the last one on the page, to diff against
+        previous = None
+        if page:
+            last = page[-1]
+            older = queryset.filter(
+                Q(recorded_at__lt=last.recorded_at)
+                | Q(recorded_at=last.recorded_at, id__lt=last.id)).first()
+            if older is not None:
+                previous = ProductHistorySerializer(older).data
+
+        for index, snapshot in enumerate(snapshots):
+            older = snapshots[index + 1] if index + 1 < len(snapshots) else previous
+            snapshot["changes"] = diff_history(older, snapshot) if older else None
+        return paginator.get_paginated_response(snapshots)
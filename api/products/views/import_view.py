@@ -0,0 +1,103 @@
+import logging
+import os
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework import status
+from drf_spectacular.utils import extend_schema, OpenApiResponse
+
+from products.models import ProductImport
+from products.serializers import ProductImportSerializer
+from products.tasks import import_products_task
+logger = logging.getLogger('products_views')
+
+
+class ProductImportView(APIView):
+    """
+    Uploads a CSV or JSONL file of products to be created in the seller's
+    store by a background task.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+    EXTENSIONS = {
+        ".csv": ProductImport.CSV,
+        ".jsonl": ProductImport.JSONL,
+        ".ndjson": ProductImport.JSONL,
+    }
+
+    @extend_schema(
+        summary="Bulk Import Products",
+        description="""
+        Upload a `file` of products (`.csv`, `.jsonl` or `.ndjson`).
+
+        - Each row has the fields of a product without `picture` and `offer`:
+          `product_name`, `product_description`, `price`, `category`, `has_sizes`,
+          `available_quantity` (without sizes) or `sizes`, and optionally
+          `brand`, `color`, `classification`, `properties` and `tags`.
+        - In CSV files `sizes`, `tags` and `properties` are JSON strings.
+        - The file is processed in the background; poll the returned import
+          for its progress and the errors of rejected rows.
+        """,
+        request={"multipart/form-data": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+        }},
+        responses={
+            202: OpenApiResponse(ProductImportSerializer, description="Import queued."),
+            400: OpenApiResponse(description="Missing or unsupported file, or user has no store."),
+        },
+    )
+    def post(self, request):
+        business_owner = getattr(request.user, "business_owner_profile", None)
+        store = business_owner.store if business_owner else None
+        if not business_owner or not store:
+            return Response({"message": "No store found for this user."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"file": "This field is required."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        extension = os.path.splitext(upload.name)[1].lower()
+        file_format = self.EXTENSIONS.get(extension)
+        if file_format is None:
+            return Response(
+                {"file": "Unsupported file extension. Allowed: csv, jsonl, ndjson."},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        product_import = ProductImport.objects.create(
+            owner=request.user, store=store, file=upload, file_format=file_format)
+        try:
+            import_products_task.delay(product_import.id)
+        except Exception as e:
+            logger.error(f"Could not queue product import {product_import.id}: {e}")
+            product_import.status = ProductImport.FAILED
+            product_import.detail = "The import could not be queued."
+            product_import.save(update_fields=["status", "detail"])
+        logger.info(
+            f"Product import {product_import.id} uploaded by user {request.user.id}")
+        product_import.refresh_from_db()
+        return Response(ProductImportSerializer(product_import).data,
+                        status=status.HTTP_202_ACCEPTED)
+
+
+class ProductImportDetailView(APIView):
+    """Progress and errors of a bulk import. Only the uploader can see it."""
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Bulk Import Status",
+        responses={
+            200: OpenApiResponse(ProductImportSerializer, description="Import status."),
+            404: OpenApiResponse(description="Import not found."),
+        },
+    )
+    def get(self, request, import_id):
+        product_import = ProductImport.objects.filter(
+            pk=import_id, owner=request.user).first()
+        if product_import is None:
+            return Response({"detail": "Import not found."},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response(ProductImportSerializer(product_import).data,
+                        status=status.HTTP_200_OK)
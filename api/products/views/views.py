@@ -1,5 +1,10 @@
+import hashlib
+import json
 import logging
 from typing import Literal
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from rest_framework.decorators import action
 from rest_framework import viewsets, permissions, status
 from rest_framework.views import APIView
@@ -7,12 +12,30 @@ from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParameter
 from products.models import Offer, Product, Size
-from products.serializers import ProductSerializer
-from django.utils.timezone import now
-from django.db.models import Case, When, F, DecimalField, Q
+from products.pagination import KeysetPagination
+from products.services.bulk_update_service import ProductBulkUpdateService
+from products.services.listing_cache_service import (
+    get_cached_listing, get_listing_cache_key, set_cached_listing)
+from products.serializers import (
+    ProductBulkUpdateSerializer, ProductListSerializer, ProductSerializer)
 logger = logging.getLogger("products_views")
 
 
+def compute_etag(*parts):
+    """Quoted ETag of JSON-serializable parts (datetimes and decimals as str)."""
+    digest = hashlib.sha256(
+        json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def get_not_modified_response(request, etag):
+    """`304 Not Modified` when `If-None-Match` matches the ETag, else None."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+    return response
+
+
 @extend_schema(
     description="""
     Product CRUD operations.
@@ -22,6 +45,7 @@ logger = logging.getLogger("products_views")
     - **GET /products/{id}/**: Retrieve product with optional favourite info
     - **PATCH /products/{id}/**: Update product (authenticated owner only)
     - **DELETE /products/{id}/**: Delete product (soft delete by owner)
+    - **PATCH /products/bulk-update/**: Update price and stock of many owned products
     """,
     summary="Product CRUD",
 )
@@ -73,30 +97,29 @@ class ProductViewSet(viewsets.ModelViewSet):
                          required=False, type=str,
                          enum=["available", "partially_available", "unavailable"],
                          description="Filter by availability status. Can be repeated for multiple values (e.g. `?availability=available&availability=partially_available`)"),
+        OpenApiParameter(
+            name="pagination", required=False, type=str, enum=["cursor"],
+            description="`cursor` switches to keyset pagination: `next`/`previous` cursor links and no total count. "
+                        "Sorting is limited to `recent`, `price`, `created_at`, `updated_at` and `id`."),
+        OpenApiParameter(
+            name="cursor", required=False, type=str,
+            description="Opaque cursor from a `next`/`previous` link (implies `pagination=cursor`)"),
     ]
 
     def get_queryset(self):
         """Override to filter by category and optionally sort by price, recent, or both. Only alive products."""
-        queryset = self.queryset.select_related(
-            'offer').prefetch_related('sizes')
+        queryset = self.queryset.for_listing()
         category = self.request.query_params.get("category")
         classification = self.request.query_params.get("classification")
         store_id = self.request.query_params.get("store")
         has_offer = self.request.query_params.get("has_offer")
-        sort = self.request.query_params.get("sort")
         availability = self.request.query_params.getlist("availability")
 
         if availability:
-            availability_q = Q()
-            base_qs = Product.objects.only("pk")
-            if "available" in availability:
-                availability_q |= Q(pk__in=base_qs.available())
-            if "partially_available" in availability:
-                availability_q |= Q(pk__in=base_qs.partially_available())
-            if "unavailable" in availability:
-                availability_q |= Q(pk__in=base_qs.unavailable())
-
-            queryset = queryset.filter(availability_q)
+            valid_statuses = dict(Product.AVAILABILITY_CHOICES)
+            statuses = [value for value in availability if value in valid_statuses]
+            if statuses:
+                queryset = queryset.filter(availability_status__in=statuses)
 
         if category:
             queryset = queryset.filter(category=category)
@@ -108,47 +131,55 @@ class ProductViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(store=store_id)
 
         if has_offer and has_offer.lower() == "true":
-            queryset = queryset.filter(
-                offer__start_date__lte=now(),
-                offer__end_date__gte=now()
-            )
+            queryset = queryset.filter(has_active_offer=True)
 
-        # sort param can be: 'recent', 'price', '-price', 'price,-created_at', etc. (comma-separated list)
-        if sort:
-            field_map = {
-                "recent": "-created_at",
-                "-recent": "created_at",
-                "price": "current_price_",
-                "-price": "-current_price_",
-            }
-            valid_fields = set(
-                f.name for f in Product._meta.get_fields() if hasattr(f, 'attname'))
-            sort_fields = []
-            for field in sort.split(","):
-                field = field.strip()
-                mapped = field_map.get(field)
-                if mapped:
-                    sort_fields.append(mapped)
-                elif field.lstrip("-") in valid_fields:
-                    sort_fields.append(field)
-                # else: ignore unknown fields
-            if sort_fields:
-                if 'current_price_' in sort_fields or '-current_price_' in sort_fields:
-                    queryset = queryset.annotate(
-                        current_price_=Case(
-                            When(
-                                offer__start_date__lte=now(),
-                                offer__end_date__gte=now(),
-                                then=F("offer__offer_price")
-                            ),
-                            default=F("price"),
-                            output_field=DecimalField()
-                        )
-                    )
-                queryset = queryset.order_by(*sort_fields)
+        sort_fields = self.get_sort_fields()
+        if sort_fields:
+            queryset = queryset.order_by(*sort_fields)
 
         return queryset
 
+    def get_sort_fields(self):
+        """
+        Parse the `sort` param into order_by() fields.
+
+        The param can be: 'recent', 'price', '-price', 'price,-created_at', etc.
+        (comma-separated list). Unknown fields are ignored.
+        """
+        sort = self.request.query_params.get("sort")
+        if not sort:
+            return []
+        field_map = {
+            "recent": "-created_at",
+            "-recent": "created_at",
+            "price": "effective_price",
+            "-price": "-effective_price",
+        }
+        valid_fields = set(
+            f.name for f in Product._meta.get_fields() if hasattr(f, 'attname'))
+        sort_fields = []
+        for field in sort.split(","):
+            field = field.strip()
+            mapped = field_map.get(field)
+            if mapped:
+                sort_fields.append(mapped)
+            elif field.lstrip("-") in valid_fields:
+                sort_fields.append(field)
+        return sort_fields
+
+    @property
+    def paginator(self):
+        """
+        Keyset pagination when `?pagination=cursor` or a `cursor` is given,
+        page numbers otherwise.
+        """
+        if (not hasattr(self, "_paginator") and self.request is not None
+                and self.action in ["list", "my_products"]):
+            params = self.request.query_params
+            if params.get("pagination") == "cursor" or "cursor" in params:
+                self._paginator = KeysetPagination()
+        return super().paginator
+
     @extend_schema(
         request=ProductSerializer,
         responses={
@@ -188,7 +219,8 @@ class ProductViewSet(viewsets.ModelViewSet):
             404: OpenApiResponse(description="Product not found."),
         },
         summary="Retrieve Product",
-        description="Retrieve a single product by ID. Adds `is_favourite` if user is authenticated.",
+        description="Retrieve a single product by ID. Adds `is_favourite` if user is authenticated. "
+                    "Returns an `ETag`; a matching `If-None-Match` gets `304 Not Modified`.",
     )
     def retrieve(self, request, *args, **kwargs):
         try:
@@ -197,15 +229,39 @@ class ProductViewSet(viewsets.ModelViewSet):
             return Response({"detail": "Product not found."},
                             status=status.HTTP_404_NOT_FOUND)
 
-        product_data = ProductSerializer(product).data
-        if request.user.is_authenticated:
-            product_data["is_favourite"] = request.user.favourite_products.filter(
-                pk=product.pk
-            ).exists()
-        else:
-            product_data["is_favourite"] = False
+        is_favourite = (request.user.is_authenticated
+                        and request.user.favourite_products.filter(pk=product.pk).exists())
+        etag = self.get_product_etag(product, is_favourite)
+        # Checked before serializing
+        not_modified = get_not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
 
-        return Response(product_data, status=status.HTTP_200_OK)
+        product_data = ProductSerializer(product).data
+        product_data["is_favourite"] = is_favourite
+        response = Response(product_data, status=status.HTTP_200_OK)
+        response["ETag"] = etag
+        return response
+
+    @staticmethod
+    def get_product_etag(product, is_favourite):
+        """
+        ETag of the retrieve response, built from the loaded product row,
+        sizes, tags and offer. Stock and picture variant changes bypass
+        `updated_at`, so those fields are part of it; the offer state
+        depends on the time.
+        """
+        offer = getattr(product, "offer", None)
+        return compute_etag(
+            product.pk, product.updated_at, product.picture_variants,
+            product.available_quantity,
+            product.reserved_quantity, product.availability_status,
+            [(size.size, size.available_quantity, size.reserved_quantity)
+             for size in product.sizes.all()],
+            [tag.name for tag in product.tags.all()],
+            offer and (offer.updated_at, offer.is_active),
+            is_favourite,
+        )
 
     @extend_schema(
         responses={
@@ -278,33 +334,94 @@ class ProductViewSet(viewsets.ModelViewSet):
         - **has_offer**: Filter by active offers (true/false)
         - **sort**: Sort results (comma-separated fields, e.g. `-price,created_at`)
         - **availability**: Filter by availability status. Can be repeated for multiple values (e.g. `?availability=available&availability=partially_available`)
+        - **pagination=cursor**: Keyset pagination with `next`/`previous` cursors and no `count`
         - **is_favourite**: Added to each product if user is authenticated
+
+        Responses are cached per query string and invalidated on any product, size, offer or stock change.
+        Each page has an `ETag`; a matching `If-None-Match` gets `304 Not Modified`.
         """,
         parameters=query_parameters
     )
     def list(self, request, *args, **kwargs):
-        products = self.get_queryset()
-        # Apply DRF pagination
-        page = self.paginate_queryset(products)
-        if page is not None:
-            serialized_products = ProductSerializer(page, many=True).data
-        else:
-            serialized_products = ProductSerializer(products, many=True).data
-
+        # Pages are cached without `is_favourite`, which is per user
+        cache_key = get_listing_cache_key(request)
+        favourite_ids = set()
         if request.user.is_authenticated:
             favourite_ids = set(
                 request.user.favourite_products.values_list("id", flat=True)
             )
-            for product_data in serialized_products:
-                product_data["is_favourite"] = product_data["id"] in favourite_ids
-        else:
-            for product_data in serialized_products:
-                product_data["is_favourite"] = False
 
+        etag = None
+        if cache_key is not None:
+            # The key holds the query params and the listing generation, which
+            # every change to listed data bumps, so it is checked before the
+            # page is read or serialized
+            etag = compute_etag(cache_key, sorted(favourite_ids))
+            not_modified = get_not_modified_response(request, etag)
+            if not_modified is not None:
+                return not_modified
+
+        data = get_cached_listing(cache_key)
+        if data is None:
+            data = self.get_listing_data()
+            set_cached_listing(cache_key, data)
+
+        serialized_products = data["results"] if isinstance(data, dict) else data
+        for product_data in serialized_products:
+            product_data["is_favourite"] = product_data["id"] in favourite_ids
+
+        if etag is None:
+            # No generation without the cache: derived from the page itself
+            etag = compute_etag(data)
+            not_modified = get_not_modified_response(request, etag)
+            if not_modified is not None:
+                return not_modified
+        response = Response(data, status=status.HTTP_200_OK)
+        response["ETag"] = etag
+        return response
+
+    def get_listing_data(self):
+        """Serialized (and, if paginated, wrapped) product list page."""
+        products = ProductListSerializer.values(self.get_queryset())
+        # Apply DRF pagination
+        page = self.paginate_queryset(products)
         if page is not None:
-            return self.get_paginated_response(serialized_products)
+            serialized_products = ProductListSerializer(page).data
+            return self.get_paginated_response(serialized_products).data
+        return ProductListSerializer(products).data
 
-        return Response(serialized_products, status=status.HTTP_200_OK)
+    @extend_schema(
+        request=ProductBulkUpdateSerializer,
+        responses={
+            200: OpenApiResponse(description="Ids of the products that changed."),
+            400: OpenApiResponse(description="Validation error or unknown size."),
+            403: OpenApiResponse(description="User does not own every product."),
+            404: OpenApiResponse(description="A product does not exist."),
+        },
+        summary="Bulk update price and stock",
+        description="Update the `price`, `available_quantity` or size quantities of up to "
+                    f"{ProductBulkUpdateService.MAX_ITEMS} of the user's products in one request. "
+                    "Values replace the stored ones; sizes must already exist. "
+                    "Either every change is applied or none.",
+        tags=["products"]
+    )
+    @action(detail=False, methods=["patch"], url_path="bulk-update", url_name="bulk-update")
+    def bulk_update(self, request):
+        serializer = ProductBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            updated = ProductBulkUpdateService.apply(
+                request.user, serializer.validated_data["products"])
+        except PermissionDenied as e:
+            return Response({"detail": str(e)}, status=status.HTTP_403_FORBIDDEN)
+        except Product.DoesNotExist as e:
+            return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except (Size.DoesNotExist, ValidationError) as e:
+            message = e.messages[0] if isinstance(e, ValidationError) else str(e)
+            return Response({"detail": message}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {"message": "Products updated successfully", "updated": updated},
+            status=status.HTTP_200_OK)
 
     @extend_schema(
         summary="List authenticated user's products",
@@ -323,13 +440,13 @@ class ProductViewSet(viewsets.ModelViewSet):
         user = request.user
         if not user.account_type == 'seller':
             return Response({"detail": "This user is not a seller."}, status=403)
-        qs = self.get_queryset().filter(owner_id=user.id)
+        qs = ProductListSerializer.values(
+            self.get_queryset().filter(owner_id=user.id))
+        context = self.get_serializer_context()
         page = self.paginate_queryset(qs)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(qs, many=True)
-        return Response(serializer.data)
+            return self.get_paginated_response(ProductListSerializer(page, context=context).data)
+        return Response(ProductListSerializer(qs, context=context).data)
 
 
 class DeleteProductSizeView(APIView):
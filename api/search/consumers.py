@@ -13,30 +13,41 @@ class AutocompleteConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer for real-time autocomplete suggestions.
     This consumer listens for incoming WebSocket connections and receives search queries
-    from the client. Upon receiving a query, it performs an Elasticsearch search on the
-    Document using a combination of match, match_phrase_prefix, and fuzzy queries
-    to provide both exact and similar suggestions.
+    from the client. Upon receiving a query, it looks up the products whose name has
+    words starting with the query's words (indexed as prefixes, see `ProductDocument`),
+    falling back to a fuzzy search to provide similar suggestions.
 
     It supports role-based filtering
+
+    Searches are debounced per connection: a query is searched once no newer
+    message arrived for `DEBOUNCE_SECONDS`, and a newer message cancels the
+    pending or in-flight search of the previous one, so only the last of
+    quickly typed queries is answered. Every response carries the sequence
+    id (`seq`) of the message it answers: the client's own if sent, else the
+    message's number on the connection.
     
     Logging is used for connection events, received queries, and errors.
     Expected client message format:
         {
             "query": "<search string>",
             "size": <number of suggestions, optional>
-            "type":"<autocomplete type, e.g., 'product'>"
+            "type":"<autocomplete type, e.g., 'product'>",
+            "seq": <sequence id, optional>
         }
     Response format:
         {
+            "seq": <sequence id>,
             "suggestions": [<list of suggested items names>]
         }
     If no suggestions are found:
         {
+            "seq": <sequence id>,
             "suggestions": [],
             "message": "No similar products were found."
         }
     If an error occurs:
         {
+            "seq": <sequence id>,
             "error": "<error message>"
         }
     """
@@ -44,6 +55,7 @@ class AutocompleteConsumer(AsyncWebsocketConsumer):
     MAX_SIZE = 15
     DEFAULT_SIZE = 10
     TIMEOUT_SECONDS = 60
+    DEBOUNCE_SECONDS = 0.15
 
     async def connect(self):
         # Assign authenticated user from JWT middleware
@@ -54,6 +66,8 @@ class AutocompleteConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
+        self.sequence = 0
+        self.search_task = None
         await self.accept()
         self.inactivity_task = create_task(self.start_inactivity_timer())
         logger.info(f"Connected: user {self.user.id}")
@@ -62,6 +76,7 @@ class AutocompleteConsumer(AsyncWebsocketConsumer):
         logger.info(f"Disconnected: {close_code}")
         if hasattr(self, 'inactivity_task'):
             self.inactivity_task.cancel()
+        self.cancel_search()
 
     async def receive(self, text_data):
         # Reset inactivity timer
@@ -69,8 +84,14 @@ class AutocompleteConsumer(AsyncWebsocketConsumer):
             self.inactivity_task.cancel()
         self.inactivity_task = create_task(self.start_inactivity_timer())
 
+        # A newer message supersedes the previous query
+        self.cancel_search()
+        self.sequence += 1
+        seq = self.sequence
+
         try:
             data = json.loads(text_data)
+            seq = data.get('seq', seq)
             query = re.sub(r'[^\w\s\-]', '', data.get('query', '')).strip()
             raw_size = data.get('size', self.DEFAULT_SIZE)
 
@@ -86,86 +107,91 @@ class AutocompleteConsumer(AsyncWebsocketConsumer):
             search_type = data.get('type', 'product')
 
             if not query:
-                await self.send(text_data=json.dumps({'suggestions': [], 'message': 'Empty query'}))
+                await self.send(text_data=json.dumps({'seq': seq, 'suggestions': [], 'message': 'Empty query'}))
                 return
 
             # Search based on type, add types here as needed
             if search_type == "product":
-                # If business owner → search own products, else → global search
-                if await self.is_business_owner(self.user):
-                    store_id = await self.get_user_store_id(self.user)
-                    response = await self.business_owner_autocomplete(query, size, store_id)
-                else:
-                    response = await self.product_autocomplete(query, size)
-
-                await self.send(text_data=json.dumps(response))
+                self.search_task = create_task(self.answer(seq, query, size))
             else:
-                await self.send(text_data=json.dumps({'error': 'Unknown search type'}))
+                await self.send(text_data=json.dumps({'seq': seq, 'error': 'Unknown search type'}))
+
+        except Exception as e:
+            logger.error(f"Error: {e}")
+            await self.send(text_data=json.dumps({'seq': seq, 'error': str(e)}))
 
+    async def answer(self, seq, query, size):
+        """
+        Search `query` after the debounce window and send the suggestions,
+        unless a newer message cancels it first.
+        """
+        try:
+            await sleep(self.DEBOUNCE_SECONDS)
+            # If business owner → search own products, else → global search
+            store_id = await self.get_owner_store_id()
+            if store_id is not None:
+                response = await self.business_owner_autocomplete(query, size, store_id)
+            else:
+                response = await self.product_autocomplete(query, size)
+            await self.send(text_data=json.dumps({'seq': seq, **response}))
+        except CancelledError:
+            # Superseded: the result of a search already sent to Elasticsearch is dropped
+            pass
         except Exception as e:
             logger.error(f"Error: {e}")
-            await self.send(text_data=json.dumps({'error': str(e)}))
+            await self.send(text_data=json.dumps({'seq': seq, 'error': str(e)}))
+
+    def cancel_search(self):
+        if getattr(self, 'search_task', None):
+            self.search_task.cancel()
+            self.search_task = None
 
     async def product_autocomplete(self, query, size):
         # Search across all products
-        search = ProductDocument.search().query(
-            "bool",
-            should=[
-                {
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["product_name", "product_description", "category"],
-                        "fuzziness": "AUTO",
-                        "type": "best_fields"  # or "most_fields"
-                    }
-                },
-                {
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["product_name", "product_description", "category"],
-                        "type": "phrase_prefix"  # adds prefix matching for autocomplete
-                    }
-                }
-            ],
-            minimum_should_match=1
-        )[:size]
-
-        results = await sync_to_async(search.execute)()
-        suggestions = [hit.product_name for hit in results]
+        suggestions = await self.suggest(query, size)
         return {'suggestions': suggestions} if suggestions else {
             'suggestions': [], 'message': 'No similar products found.'}
 
     async def business_owner_autocomplete(self, query, size, store_id):
         # Filter products to the owner's store only
-        search = ProductDocument.search().query(
-            "bool",
-            must=[{"term": {"store_id": store_id}}],
-            should=[
-                {
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["product_name", "product_description", "category"],
-                        "fuzziness": "AUTO",
-                        "type": "best_fields"  # or "most_fields"
-                    }
-                },
-                {
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["product_name", "product_description", "category"],
-                        "type": "phrase_prefix"  # adds prefix matching for autocomplete
-                    }
-                }
-            ],
-            minimum_should_match=1
-        )[:size]
-
-
-        results = await sync_to_async(search.execute)()
-        suggestions = [hit.product_name for hit in results]
+        suggestions = await self.suggest(query, size, store_id)
         return {'suggestions': suggestions} if suggestions else {
             'suggestions': [], 'message': 'No similar products found in your store.'}
 
+    async def suggest(self, query, size, store_id=None):
+        """
+        Names of the products whose name has words starting with the words of
+        `query`; if there are none, of the products fuzzily matching it (typos).
+        """
+        results = await sync_to_async(self.build_search(query, size, store_id).execute)()
+        if not results:
+            results = await sync_to_async(self.build_search(query, size, store_id, fuzzy=True).execute)()
+        return [hit.product_name for hit in results]
+
+    @staticmethod
+    def build_search(query, size, store_id=None, fuzzy=False):
+        """
+        Autocomplete search of `query`.
+
+        The prefix search matches `product_name.autocomplete`, where the
+        prefixes are indexed (see `ProductDocument`), so it is a term lookup
+        per word. The fuzzy search is the slower fallback.
+        """
+        search = ProductDocument.search().exclude("term", is_deleted=True).source(["product_name"])
+        if store_id is not None:
+            search = search.filter("term", store_id=store_id)
+        if fuzzy:
+            search = search.query(
+                "multi_match",
+                query=query,
+                fields=["product_name", "product_description", "category"],
+                fuzziness="AUTO",
+            )
+        else:
+            search = search.query(
+                "match", **{"product_name.autocomplete": {"query": query, "operator": "and"}})
+        return search[:size]
+
     async def start_inactivity_timer(self):
         try:
             await sleep(self.TIMEOUT_SECONDS)
@@ -174,6 +200,14 @@ class AutocompleteConsumer(AsyncWebsocketConsumer):
         except CancelledError:
             pass
 
+    async def get_owner_store_id(self):
+        """Store of the user if a business owner, else None; looked up once per connection."""
+        if not hasattr(self, 'owner_store_id'):
+            self.owner_store_id = None
+            if await self.is_business_owner(self.user):
+                self.owner_store_id = await self.get_user_store_id(self.user)
+        return self.owner_store_id
+
     @sync_to_async
     def is_business_owner(self, user):
         return BusinessOwner.objects.filter(user=user).exists()
@@ -1,27 +1,113 @@
+from django.core.exceptions import ObjectDoesNotExist
 from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
-from django.db.models.signals import post_delete
-from django.dispatch import receiver
-from products.models import Product
+from elasticsearch.dsl import analyzer, token_filter
+from products.models import Offer, Product, Size
 
+# Prefixes of every word, indexed for autocomplete (see `AutocompleteConsumer`):
+# a keystroke becomes a plain term lookup instead of a query-time prefix or
+# fuzzy expansion
+autocomplete = analyzer(
+    'autocomplete',
+    tokenizer='standard',
+    filter=['lowercase', 'asciifolding',
+            token_filter('autocomplete_edge_ngram', 'edge_ngram', min_gram=1, max_gram=20)],
+)
+# Queries are not split into prefixes themselves
+autocomplete_search = analyzer(
+    'autocomplete_search', tokenizer='standard', filter=['lowercase', 'asciifolding'])
 
-from products.models import Product
 
 @registry.register_document
 class ProductDocument(Document):
-    store_id = fields.IntegerField(attr='store.id')
-    
+    """
+    Search document of a product.
+
+    Besides the searched text fields, it carries everything the search
+    result card shows (see `ProductSearchResultSerializer`), so results are
+    rendered from the hits' `_source` without reading the database. Prices
+    are stored as strings in `_source` and the offer with its period, so the
+    current price is computed when rendering and offers start and end
+    without re-indexing.
+
+    `product_name.autocomplete` holds the prefixes of the name's words for
+    as-you-type suggestions.
+    """
+    product_name = fields.TextField(fields={
+        'autocomplete': fields.TextField(analyzer=autocomplete, search_analyzer=autocomplete_search),
+    })
+    store_id = fields.IntegerField(attr='store_id')
+    price = fields.ScaledFloatField(scaling_factor=100)
+    offer = fields.ObjectField(properties={
+        'offer_price': fields.ScaledFloatField(scaling_factor=100),
+        'start_date': fields.DateField(),
+        'end_date': fields.DateField(),
+    })
+    brand = fields.KeywordField()
+    color = fields.KeywordField()
+    classification = fields.KeywordField()
+    picture = fields.KeywordField(index=False)
+    picture_variants = fields.ObjectField(enabled=False)
+    availability = fields.KeywordField(attr='availability_status')
+    has_sizes = fields.BooleanField()
+    sizes = fields.ObjectField(multi=True, properties={
+        'size': fields.KeywordField(),
+        'in_stock': fields.BooleanField(),
+    })
+    tags = fields.KeywordField(multi=True)
+    is_deleted = fields.BooleanField()
+
     class Index:
         name = 'products'
         settings = {'number_of_shards': 1,'number_of_replicas': 0}
 
     class Django:
         model = Product
-        fields = ['product_name','product_description','category']
+        fields = ['product_description','category']
+        related_models = [Offer, Size]
+        # Chunked iteration, required to prefetch sizes and tags
+        queryset_pagination = 500
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('offer').prefetch_related('sizes', 'tags')
+
+    def get_instances_from_related(self, related_instance):
+        return related_instance.product
 
     def get_id(self, obj):
         return str(obj.pk)
-    
-@receiver(post_delete, sender=Product)
-def delete_product_from_index(sender, instance, **kwargs):
-    registry.delete(instance)
\ No newline at end of file
+
+    def prepare_price(self, instance):
+        return str(instance.price)
+
+    def prepare_offer(self, instance):
+        try:
+            offer = instance.offer
+        except ObjectDoesNotExist:
+            return None
+        if offer == self._related_instance_to_ignore:
+            return None
+        return {
+            'offer_price': str(offer.offer_price),
+            'start_date': offer.start_date.isoformat(),
+            'end_date': offer.end_date.isoformat(),
+        }
+
+    def prepare_picture(self, instance):
+        return instance.picture.url if instance.picture else None
+
+    def prepare_picture_variants(self, instance):
+        storage = instance.picture.storage
+        return {name: storage.url(path) for name, path in instance.picture_variants.items()}
+
+    def prepare_sizes(self, instance):
+        if not instance.has_sizes:
+            return []
+        return [
+            {'size': size.size, 'in_stock': size.available_quantity > 0}
+            for size in instance.sizes.all()
+            if size != self._related_instance_to_ignore
+        ]
+
+    def prepare_tags(self, instance):
+        return [tag.name for tag in instance.tags.all()]
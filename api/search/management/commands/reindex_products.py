@@ -0,0 +1,218 @@
+# search/management/commands/reindex_products.py
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections as db_connections
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+from elasticsearch.dsl.connections import connections
+from elasticsearch.helpers import bulk
+from products.models import Product
+from products.services.search_index_service import BUILDING_KEY_PREFIX
+from search.documents import ProductDocument
+
+# Seconds between two saves of the resume point
+PROGRESS_INTERVAL = 5
+# Live changes stop going to an abandoned rebuild after this many seconds
+BUILDING_SECONDS = 10 * 60
+
+
+def _init_worker():
+    # Forked workers must not share the parent's database or HTTP connections
+    db_connections.close_all()
+    connections.create_connection("default", **settings.ELASTICSEARCH_DSL["default"])
+
+
+def index_chunk(index_name, product_ids):
+    """
+    Index the products of `product_ids` into `index_name` with one bulk
+    request; ids of deleted products are deleted from it.
+
+    Returns:
+        tuple: Last id of the chunk, documents written, failed documents.
+    """
+    document = ProductDocument()
+    products = list(document.get_queryset().filter(pk__in=product_ids))
+    actions = [{"_op_type": "index", "_index": index_name,
+                "_id": document.generate_id(product), "_source": document.prepare(product)}
+               for product in products]
+    alive = {product.pk for product in products}
+    actions.extend({"_op_type": "delete", "_index": index_name, "_id": product_id}
+                   for product_id in product_ids if product_id not in alive)
+    written, errors = bulk(document._get_connection(), actions, chunk_size=len(actions) or 1,
+                           raise_on_error=False, refresh=False)
+    # Deleting documents that were never indexed is not a failure
+    failed = [error for error in errors
+              if not ("delete" in error and error["delete"].get("status") == 404)]
+    return product_ids[-1], written, len(failed)
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the products search index into a new versioned index and switch the "
+            "index alias to it atomically, so search keeps working during the rebuild")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Products per bulk request (default: 500)')
+        parser.add_argument('--processes', type=int, default=4,
+                            help='Worker processes; 1 indexes in this process (default: 4)')
+        parser.add_argument('--resume', metavar='INDEX',
+                            help='Continue an interrupted rebuild into INDEX after its last indexed id')
+        parser.add_argument('--keep-old', action='store_true',
+                            help='Keep the indices the alias pointed to instead of deleting them')
+
+    def handle(self, *args, **options):
+        alias = ProductDocument._index._name
+        client = ProductDocument._get_connection()
+        chunk_size = options['chunk_size']
+        if chunk_size < 1 or options['processes'] < 1:
+            raise CommandError("--chunk-size and --processes must be positive.")
+
+        if options['resume']:
+            index_name = options['resume']
+            if not client.indices.exists(index=index_name):
+                raise CommandError(f"Index {index_name} does not exist.")
+            meta = client.indices.get_mapping(index=index_name)[index_name]["mappings"].get("_meta", {})
+            progress = meta.get("reindex")
+            if not progress:
+                raise CommandError(f"Index {index_name} was not built by this command.")
+            started_at = parse_datetime(progress["started_at"])
+            last_pk = progress["last_pk"]
+            self.stdout.write(f"Resuming {index_name} after product {last_pk}.")
+        else:
+            started_at = now()
+            last_pk = 0
+            index_name = f"{alias}-{started_at:%Y%m%d%H%M%S}"
+            index = ProductDocument._index.clone(name=index_name)
+            # Refreshing while loading only slows the load down
+            index.settings(refresh_interval="-1")
+            index.create()
+            self.stdout.write(f"Created index {index_name}.")
+        # Live changes are written to the new index too while it loads
+        self.save_progress(client, index_name, started_at, last_pk)
+
+        # Deleted products are left out: the new index starts empty
+        product_ids = list(ProductDocument().get_queryset().filter(pk__gt=last_pk).order_by(
+            "pk").values_list("pk", flat=True).iterator(chunk_size=10000))
+        chunks = [product_ids[start:start + chunk_size]
+                  for start in range(0, len(product_ids), chunk_size)]
+        self.stdout.write(f"Indexing {len(product_ids)} products in {len(chunks)} chunks "
+                          f"with {options['processes']} processes.")
+
+        start = time.perf_counter()
+        written, failed = self.load(client, index_name, started_at, chunks, options['processes'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"Indexed {written} documents in {elapsed:.1f}s "
+                          f"({written / elapsed if elapsed else 0:.0f} docs/s).")
+        if failed:
+            raise CommandError(
+                f"{failed} documents failed; the alias was not switched. Rerun with "
+                f"--resume {index_name} after fixing the cause.")
+
+        # Catch up with changes made while loading, then once more for
+        # changes made during the first catch-up
+        catch_up_at = now()
+        self.catch_up(index_name, started_at)
+        client.indices.put_settings(index=index_name, settings={"index": {
+            "refresh_interval": None,
+            "number_of_replicas": ProductDocument._index._settings.get("number_of_replicas", 1),
+        }})
+        client.indices.refresh(index=index_name)
+        old_indices = self.switch_alias(client, alias, index_name)
+        cache.delete(f"{BUILDING_KEY_PREFIX}:{alias}")
+        self.catch_up(index_name, catch_up_at)
+
+        removed = [] if options['keep_old'] else old_indices
+        if removed:
+            client.indices.delete(index=",".join(removed))
+        self.stdout.write(self.style.SUCCESS(
+            f"Alias {alias} now points to {index_name}; removed {len(removed)} old indices."))
+
+    def load(self, client, index_name, started_at, chunks, processes):
+        """
+        Index the chunks, saving the last id up to which every chunk is done
+        as the resume point. Returns the documents written and failed.
+        """
+        written = failed = 0
+        done = {}
+        next_chunk = 0
+        saved_at = time.monotonic()
+        start = time.perf_counter()
+
+        def advance(last_id, chunk_written, chunk_failed):
+            nonlocal written, failed, next_chunk, saved_at
+            written += chunk_written
+            failed += chunk_failed
+            done[last_id] = not chunk_failed
+            last_pk = None
+            # The resume point only moves past chunks that all succeeded
+            while next_chunk < len(chunks) and done.get(chunks[next_chunk][-1]):
+                last_pk = chunks[next_chunk][-1]
+                next_chunk += 1
+            if last_pk is not None and time.monotonic() - saved_at >= PROGRESS_INTERVAL:
+                self.save_progress(client, index_name, started_at, last_pk)
+                saved_at = time.monotonic()
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"{written} documents, {written / elapsed:.0f} docs/s, "
+                                  f"resume point {last_pk}.")
+
+        try:
+            if processes == 1:
+                for chunk in chunks:
+                    advance(*index_chunk(index_name, chunk))
+            else:
+                # Workers open their own connections
+                db_connections.close_all()
+                with ProcessPoolExecutor(processes, initializer=_init_worker) as pool:
+                    futures = [pool.submit(index_chunk, index_name, chunk) for chunk in chunks]
+                    try:
+                        for future in as_completed(futures):
+                            advance(*future.result())
+                    except BaseException:
+                        pool.shutdown(cancel_futures=True)
+                        raise
+        except KeyboardInterrupt:
+            self.stderr.write(f"Interrupted; resume with --resume {index_name}.")
+            raise
+        finally:
+            if next_chunk:
+                self.save_progress(client, index_name, started_at, chunks[next_chunk - 1][-1])
+        return written, failed
+
+    def catch_up(self, index_name, since):
+        """Re-index products saved since `since`, removing those deleted since."""
+        product_ids = list(Product.objects.all_with_deleted().filter(
+            updated_at__gte=since).order_by("pk").values_list("pk", flat=True))
+        failed = sum(index_chunk(index_name, product_ids[start:start + 500])[2]
+                     for start in range(0, len(product_ids), 500))
+        if failed:
+            self.stderr.write(f"{failed} changed products could not be indexed; "
+                              "they are indexed again on their next change.")
+        if product_ids:
+            self.stdout.write(f"Caught up with {len(product_ids)} changed products.")
+
+    @staticmethod
+    def save_progress(client, index_name, started_at, last_pk):
+        client.indices.put_mapping(index=index_name, meta={"reindex": {
+            "started_at": started_at.isoformat(), "last_pk": last_pk}})
+        cache.set(f"{BUILDING_KEY_PREFIX}:{ProductDocument._index._name}", index_name,
+                  timeout=BUILDING_SECONDS)
+
+    @staticmethod
+    def switch_alias(client, alias, index_name):
+        """
+        Point `alias` at `index_name` in one atomic request. A concrete index
+        named like the alias (built before aliases were used) is removed in
+        the same request. Returns the indices the alias pointed to.
+        """
+        actions = [{"add": {"index": index_name, "alias": alias}}]
+        old_indices = []
+        if client.indices.exists_alias(name=alias):
+            old_indices = [name for name in client.indices.get_alias(name=alias) if name != index_name]
+            actions = [{"remove": {"index": name, "alias": alias}} for name in old_indices] + actions
+        elif client.indices.exists(index=alias):
+            actions.insert(0, {"remove_index": {"index": alias}})
+        client.indices.update_aliases(actions=actions)
+        return old_indices
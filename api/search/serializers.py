@@ -1,8 +1,46 @@
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
 from rest_framework import serializers
 from products.serializers import ProductSerializer
 
 
+class ProductSearchSizeSerializer(serializers.Serializer):
+    size = serializers.CharField()
+    in_stock = serializers.BooleanField()
+
+
+class ProductSearchResultSerializer(serializers.Serializer):
+    """
+    Search result card of a product, rendered from the `_source` of its
+    Elasticsearch hit (see `ProductDocument`) with the hit id as `id`.
+    """
+    id = serializers.IntegerField()
+    product_name = serializers.CharField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    current_price = serializers.SerializerMethodField()
+    brand = serializers.CharField(allow_null=True)
+    category = serializers.CharField()
+    classification = serializers.CharField(allow_null=True)
+    color = serializers.CharField(allow_null=True)
+    picture = serializers.CharField(allow_null=True)
+    picture_variants = serializers.DictField(child=serializers.CharField())
+    availability = serializers.CharField()
+    has_sizes = serializers.BooleanField()
+    sizes = ProductSearchSizeSerializer(many=True)
+    tags = serializers.ListField(child=serializers.CharField())
+    store = serializers.IntegerField(source="store_id")
+
+    def get_current_price(self, source):
+        # Computed here: offers start and end without the document changing
+        offer = source.get("offer")
+        if offer and parse_datetime(offer["start_date"]) <= now() <= parse_datetime(offer["end_date"]):
+            price = offer["offer_price"]
+        else:
+            price = source["price"]
+        return self.fields["price"].to_representation(price)
+
+
 class ProductSearchSerializer(serializers.Serializer):
     results = ProductSerializer(many=True)
     page = serializers.IntegerField()
-    total = serializers.IntegerField()
\ No newline at end of file
+    total = serializers.IntegerField()
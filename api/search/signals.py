@@ -0,0 +1,62 @@
+from django.db import models
+from django_elasticsearch_dsl.signals import BaseSignalProcessor
+from products.models import Product, Size
+from products.services.search_index_service import enqueue_product_indexing
+from .documents import ProductDocument
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """
+    Signal processor that queues changed products for re-indexing instead of
+    writing to Elasticsearch within the request.
+
+    Saves and deletes of products, of the models their document reads
+    (`ProductDocument.Django.related_models`) and of product tags record the
+    product id; the ids are pushed in bulk by `index_products_task` after
+    the transaction commits (see `enqueue_product_indexing`).
+
+    Product and size saves that write stock fields only (see `StockService`)
+    are not queued unless the availability changed.
+    """
+    # Fields whose writes alone leave the product's document unchanged. The
+    # availability is compared, and size stock flips re-index the product
+    # from `Product.refresh_availability`.
+    STOCK_FIELDS = {"available_quantity", "reserved_quantity", "updated_at", "availability_status"}
+
+    def setup(self):
+        models.signals.post_save.connect(self.handle_save)
+        models.signals.post_delete.connect(self.handle_delete)
+        models.signals.m2m_changed.connect(self.handle_m2m_changed)
+
+    def teardown(self):
+        models.signals.post_save.disconnect(self.handle_save)
+        models.signals.post_delete.disconnect(self.handle_delete)
+        models.signals.m2m_changed.disconnect(self.handle_m2m_changed)
+
+    def handle_save(self, sender, instance, update_fields=None, **kwargs):
+        if update_fields and set(update_fields) <= self.STOCK_FIELDS:
+            if sender is Size:
+                return
+            if sender is Product and instance.availability_status == getattr(
+                    instance, "_loaded_availability_status", None):
+                return
+        self.enqueue(instance)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        self.enqueue(instance)
+
+    def handle_m2m_changed(self, sender, instance, action, reverse=False, pk_set=None, **kwargs):
+        if sender is not Product.tags.through or not action.startswith("post_"):
+            return
+        if not reverse:
+            enqueue_product_indexing([instance.pk])
+        elif pk_set:
+            # Products added to or removed from a tag
+            enqueue_product_indexing(pk_set)
+
+    @staticmethod
+    def enqueue(instance):
+        if isinstance(instance, Product):
+            enqueue_product_indexing([instance.pk])
+        elif isinstance(instance, tuple(ProductDocument.django.related_models)):
+            enqueue_product_indexing([instance.product_id])
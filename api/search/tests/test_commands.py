@@ -0,0 +1,66 @@
+import io
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+from products.models import Product
+from search.documents import ProductDocument
+from stores.models import Store
+
+
+@override_settings(ELASTICSEARCH_DSL_AUTOSYNC=False)
+class ReindexProductsCommandTests(TestCase):
+    """
+    Rebuilds the products index behind its alias against the Elasticsearch
+    instance used by the search view tests.
+    """
+
+    def setUp(self):
+        self.client = ProductDocument._get_connection()
+        self.alias = ProductDocument._index._name
+        user = get_user_model().objects.create_user(
+            email="seller@example.com", password="testpass123", is_active=True)
+        store = Store.objects.create(name="Store", description="Store", location="City")
+        self.products = [
+            Product.objects.create(
+                product_name=f"Product {index}", product_description="Description",
+                price=10, category="Shoes", available_quantity=1, reserved_quantity=0,
+                owner_id=user, store=store)
+            for index in range(3)
+        ]
+
+    def reindex(self, **options):
+        call_command("reindex_products", processes=1, chunk_size=2, stdout=io.StringIO(), **options)
+        return list(self.client.indices.get_alias(name=self.alias))
+
+    def test_alias_switches_to_the_new_index(self):
+        first, = self.reindex()
+        self.assertTrue(first.startswith(f"{self.alias}-"))
+        self.assertEqual(self.client.count(index=self.alias)["count"], 3)
+
+        self.products[0].delete()
+        second, = self.reindex()
+        self.assertNotEqual(first, second)
+        self.assertFalse(self.client.indices.exists(index=first))
+        self.assertEqual(self.client.count(index=self.alias)["count"], 2)
+        # Loaded with refresh disabled; restored before the switch
+        self.assertNotEqual(self.client.indices.get_settings(index=second)[second]["settings"]
+                            ["index"].get("refresh_interval"), "-1")
+
+    def test_resume_continues_after_the_last_indexed_product(self):
+        first, = self.reindex()
+        index_name = f"{self.alias}-resumed"
+        ProductDocument._index.clone(name=index_name).create()
+        # Started after the products were saved: nothing to catch up with
+        self.client.indices.put_mapping(index=index_name, meta={"reindex": {
+            "started_at": (now() + timedelta(minutes=1)).isoformat(),
+            "last_pk": self.products[1].pk}})
+
+        second, = self.reindex(resume=index_name, keep_old=True)
+        self.assertEqual(second, index_name)
+        self.assertTrue(self.client.indices.exists(index=first))
+        self.client.indices.refresh(index=index_name)
+        # Only the product after the resume point
+        self.assertEqual(self.client.count(index=index_name)["count"], 1)
+        self.client.indices.delete(index=first)
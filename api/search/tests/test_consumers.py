@@ -1,9 +1,19 @@
 import pytest
 import json
 import logging
+import random
+import statistics
+from asyncio import sleep
+from types import SimpleNamespace
 from channels.testing import WebsocketCommunicator
-from django.test import override_settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
 from api.asgi import application
+from products.management.commands.seed_products import BRANDS, PRODUCT_TEMPLATES
+from products.models import Product
+from search.consumers import AutocompleteConsumer
+from search.documents import ProductDocument
+from stores.models import Store
 
 logger = logging.getLogger("search_tests")
 
@@ -50,4 +60,139 @@ async def test_product_autocomplete_consumer(monkeypatch):
     assert data["suggestions"] == ["Test Product 1", "Test Product 2"]
 
     await communicator.disconnect()
-    logger.info("WebSocket disconnected")
\ No newline at end of file
+    logger.info("WebSocket disconnected")
+
+
+
+async def connect_autocomplete(monkeypatch, suggest):
+    """
+    Connect an authenticated non business owner to the consumer, with
+    `suggest` answering its searches.
+    """
+    async def get_owner_store_id(self):
+        return None
+
+    monkeypatch.setattr(AutocompleteConsumer, "suggest", suggest)
+    monkeypatch.setattr(AutocompleteConsumer, "get_owner_store_id", get_owner_store_id)
+    communicator = WebsocketCommunicator(AutocompleteConsumer.as_asgi(), "/ws/autocomplete/")
+    communicator.scope["user"] = SimpleNamespace(id=1, is_authenticated=True)
+    connected, _ = await communicator.connect()
+    assert connected
+    return communicator
+
+
+@pytest.mark.asyncio
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+async def test_quick_queries_are_debounced(monkeypatch):
+    """Only the last of queries typed within the debounce window is searched."""
+    searched = []
+
+    async def suggest(self, query, size, store_id=None):
+        searched.append(query)
+        return [f"{query} product"]
+
+    communicator = await connect_autocomplete(monkeypatch, suggest)
+    for query in ("s", "sn", "sne"):
+        await communicator.send_to(text_data=json.dumps({"query": query, "type": "product"}))
+
+    data = json.loads(await communicator.receive_from())
+    assert data == {"seq": 3, "suggestions": ["sne product"]}
+    assert searched == ["sne"]
+    assert await communicator.receive_nothing(timeout=AutocompleteConsumer.DEBOUNCE_SECONDS * 2)
+    await communicator.disconnect()
+
+
+@pytest.mark.asyncio
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+async def test_superseded_search_is_cancelled(monkeypatch):
+    """A search in flight when a newer query arrives is never answered."""
+    async def suggest(self, query, size, store_id=None):
+        if query == "lap":
+            await sleep(1)
+        return [f"{query} product"]
+
+    communicator = await connect_autocomplete(monkeypatch, suggest)
+    await communicator.send_to(text_data=json.dumps({"query": "lap", "seq": "a"}))
+    await sleep(AutocompleteConsumer.DEBOUNCE_SECONDS * 2)
+    await communicator.send_to(text_data=json.dumps({"query": "laptop", "seq": "b"}))
+
+    data = json.loads(await communicator.receive_from())
+    assert data == {"seq": "b", "suggestions": ["laptop product"]}
+    assert await communicator.receive_nothing(timeout=1.2)
+    await communicator.disconnect()
+
+class AutocompleteBenchmark(TestCase):
+    """
+    Compares the Elasticsearch time (`took`) of the keystrokes of a few
+    names for the former fuzzy + phrase prefix query and the prefix lookup
+    on `product_name.autocomplete`, over a catalogue like the one of
+    `seed_products`.
+    """
+    products = 2000
+    keystrokes = ["sneakers", "smartwatch", "laptop", "nike sn", "apple smartp"]
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email="seller@example.com", password="testpass123", is_active=True)
+        store = Store.objects.create(name="Store", description="Store", location="City")
+        random.seed(0)
+        catalogue = []
+        for index in range(self.products):
+            template = random.choice(PRODUCT_TEMPLATES)
+            catalogue.append(Product(
+                product_name=f"{random.choice(BRANDS[template['category']])} {template['name']} {index + 1}",
+                product_description=template["description"],
+                price=template["base_price"],
+                effective_price=template["base_price"],
+                category=template["category"],
+                available_quantity=10,
+                reserved_quantity=0,
+                owner_id=user,
+                store=store,
+            ))
+        self.catalogue = Product.objects.bulk_create(catalogue)
+        ProductDocument().update(self.catalogue, refresh=True)
+
+    def tearDown(self):
+        ProductDocument().update(self.catalogue, action="delete", refresh=True, raise_on_error=False)
+
+    @staticmethod
+    def legacy_search(query, size):
+        return ProductDocument.search().query(
+            "bool",
+            should=[
+                {"multi_match": {"query": query, "fuzziness": "AUTO", "type": "best_fields",
+                                 "fields": ["product_name", "product_description", "category"]}},
+                {"multi_match": {"query": query, "type": "phrase_prefix",
+                                 "fields": ["product_name", "product_description", "category"]}},
+            ],
+            minimum_should_match=1,
+        )[:size]
+
+    def took(self, build_search):
+        """Median `took` in ms of every keystroke of the names, run 3 times."""
+        timings = []
+        for _ in range(3):
+            for name in self.keystrokes:
+                for length in range(1, len(name) + 1):
+                    query = name[:length].strip()
+                    if query:
+                        timings.append(build_search(query, AutocompleteConsumer.DEFAULT_SIZE)
+                                       .execute().took)
+        return statistics.median(timings)
+
+    def test_autocomplete_benchmark(self):
+        # Warm up both queries
+        self.took(self.legacy_search)
+        self.took(AutocompleteConsumer.build_search)
+
+        legacy = self.took(self.legacy_search)
+        prefix = self.took(AutocompleteConsumer.build_search)
+        logging.getLogger("search_tests").info(
+            "Autocomplete over %d products: fuzzy + phrase prefix %sms, edge n-gram %sms (median took)",
+            self.products, legacy, prefix)
+        self.assertLessEqual(prefix, legacy)
+
+        names = [hit.product_name for hit in AutocompleteConsumer.build_search("nike sn", 5).execute()]
+        self.assertTrue(names)
+        self.assertTrue(all(name.startswith("Nike Sneakers") for name in names))
@@ -1,10 +1,17 @@
 import logging
+from datetime import timedelta
+from decimal import Decimal
 from django.test import TestCase
+from django.utils.timezone import now
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
 from stores.models import Store
-from products.models import Product
+from elasticsearch.dsl.response import Response
+from products.models import Offer, Product, ProductTag, Size, Tag
+from products.serializers import ProductSerializer
 from search.documents import ProductDocument
+from search.serializers import ProductSearchResultSerializer
+from search.views import ProductSearchView
 from rest_framework_simplejwt.tokens import RefreshToken
 from accounts.models import BusinessOwner
 
@@ -135,3 +142,95 @@ class ProductSearchViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data.get('results'), [])
         self.assertEqual(response.data.get('total'), 0)
+
+    def test_cards_are_rendered_from_source_in_ranking_order(self):
+        ProductTag.objects.create(product=self.p2, tag=Tag.objects.create(name="android"))
+        ProductDocument().update(self.p2)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/search/products/',
+                                       {'q': 'Galaxy smartphone', 'p': 1, 'fields': 'card'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.p2.id, self.p1.id])
+        card = response.data['results'][0]
+        self.assertEqual(card['price'], "899.99")
+        self.assertEqual(card['current_price'], "899.99")
+        self.assertEqual(card['availability'], Product.AVAILABLE)
+        self.assertEqual(card['store'], self.other_store.id)
+        self.assertEqual(card['tags'], ["android"])
+
+    def test_results_are_full_products_in_ranking_order(self):
+        response = self.client.get('/api/v1/search/products/', {'q': 'Galaxy smartphone', 'p': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.p2.id, self.p1.id])
+        self.assertEqual(response.data['results'][0], ProductSerializer(self.p2).data)
+
+    def test_soft_deleted_products_are_not_found(self):
+        self.p2.delete()
+        ProductDocument().update(Product.objects.all_with_deleted().get(pk=self.p2.pk))
+        response = self.client.get('/api/v1/search/products/', {'q': 'smartphone', 'p': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.p1.id])
+
+
+class ProductSearchResultSerializerTests(TestCase):
+    """
+    Renders search cards from prepared documents, as the search view does
+    with the `_source` of hits, without an Elasticsearch round trip.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="seller@example.com", password="testpass123", is_active=True)
+        self.store = Store.objects.create(name="Store", description="Store", location="City")
+        self.product = Product.objects.create(
+            product_name="Running shoe", product_description="Light shoe", price=Decimal("80.00"),
+            category="Shoes", available_quantity=None, reserved_quantity=None, has_sizes=True,
+            owner_id=self.user, store=self.store,
+        )
+        Size.objects.create(product=self.product, size="42", available_quantity=3, reserved_quantity=0)
+        Size.objects.create(product=self.product, size="43", available_quantity=0, reserved_quantity=0)
+
+    def render(self):
+        document = ProductDocument()
+        product = document.get_queryset().get(pk=self.product.pk)
+        source = document.prepare(product)
+        source["id"] = product.pk
+        return ProductSearchResultSerializer().to_representation(source)
+
+    def test_card_fields(self):
+        card = self.render()
+        self.assertEqual(card["id"], self.product.pk)
+        self.assertEqual(card["price"], "80.00")
+        self.assertEqual(card["store"], self.store.id)
+        self.assertEqual(card["sizes"], [{"size": "42", "in_stock": True},
+                                         {"size": "43", "in_stock": False}])
+        self.assertIsNone(card["picture"])
+
+    def test_current_price_follows_offer_period(self):
+        offer = Offer.objects.create(product=self.product, offer_price=Decimal("60.00"),
+                                     start_date=now() - timedelta(days=1),
+                                     end_date=now() + timedelta(days=1))
+        self.assertEqual(self.render()["current_price"], "60.00")
+
+        offer.end_date = now() - timedelta(hours=1)
+        offer.save()
+        self.assertEqual(self.render()["current_price"], "80.00")
+
+    def test_hits_without_card_fields_are_rendered_as_cards(self):
+        current = ProductDocument().prepare(ProductDocument().get_queryset().get(pk=self.product.pk))
+        stale = Product.objects.create(
+            product_name="Trail shoe", product_description="Grippy shoe", price=Decimal("95.00"),
+            category="Shoes", available_quantity=4, reserved_quantity=0,
+            owner_id=self.user, store=self.store,
+        )
+        response = Response(ProductDocument.search(), {"hits": {"total": {"value": 3}, "hits": [
+            {"_id": str(stale.pk), "_index": "products",
+             "_source": {"product_name": stale.product_name, "category": stale.category}},
+            {"_id": str(self.product.pk), "_index": "products", "_source": current},
+            {"_id": "0", "_index": "products", "_source": {"product_name": "Gone"}},
+        ]}})
+        cards = ProductSearchView().render_cards(response)
+        self.assertEqual([card["id"] for card in cards], [stale.pk, self.product.pk])
+        self.assertEqual(set(cards[0]), set(cards[1]))
+        self.assertEqual(cards[0]["price"], "95.00")
+        self.assertEqual(cards[0]["availability"], Product.AVAILABLE)
@@ -1,5 +1,5 @@
 import logging
-from products.serializers import ProductSerializer
+from products.serializers import ProductListSerializer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -8,7 +8,7 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from accounts.models import BusinessOwner
 from products.models import Product
 from .documents import ProductDocument
-from .serializers import ProductSearchSerializer
+from .serializers import ProductSearchResultSerializer, ProductSearchSerializer
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParameter
 
 logger = logging.getLogger('search_views')
@@ -17,6 +17,9 @@ logger = logging.getLogger('search_views')
     parameters=[
         OpenApiParameter(name='q', description='Search query string', required=False, type=str),
         OpenApiParameter(name='p', description='Page number (default: 1)', required=False, type=int),
+        OpenApiParameter(name='fields', description='`card` to return search cards rendered from the '
+                                                    'search index instead of the full product representation',
+                         required=False, type=str),
     ],
     responses={
         200: OpenApiResponse(
@@ -37,6 +40,10 @@ logger = logging.getLogger('search_views')
     - Anonymous and buyer users: Search all available products.
     - Authenticated business owners: Search is limited to their own store's products.
     
+    Results keep the relevance order and are the full product representation read
+    from the database. With `fields=card` they are search cards rendered straight
+    from the search index instead, without reading the database.
+
     JWT authentication (via header or cookie) is optional and used to determine access level.
     """,
     summary="Product Search with Role-Based Filtering"
@@ -54,6 +61,7 @@ class ProductSearchView(APIView):
     Accepts:
         - 'q': Search query string
         - 'p': Page number (default is 1)
+        - 'fields': `card` to render results from the search index (see `render_cards`)
     
     Returns:
         - 200 OK: JSON with paginated search results (12 per page), current page, and total count.
@@ -68,6 +76,7 @@ class ProductSearchView(APIView):
         try:
             query = request.GET.get('q', '')
             page = int(request.GET.get('p', 1))
+            cards = request.GET.get('fields', '') == 'card'
 
             if not query.strip():
                 logger.info("Search query is empty.")
@@ -85,7 +94,7 @@ class ProductSearchView(APIView):
                 query=query,
                 fields=['product_name', 'product_description', 'category'],
                 fuzziness='AUTO',
-            )
+            ).exclude("term", is_deleted=True)
 
             # Check if the authenticated user is a business owner
             user = request.user
@@ -100,22 +109,53 @@ class ProductSearchView(APIView):
             else:
                 logger.info("Unauthenticated user search.")
 
-            results = base_query[start:end].execute()
-            total = results.hits.total.value if hasattr(results.hits.total, 'value') else results.hits.total
+            response = base_query[start:end].execute()
+            total = response.hits.total.value if hasattr(response.hits.total, 'value') else response.hits.total
 
-            product_ids = [hit.meta.id for hit in results]
-            products = Product.objects.filter(id__in=product_ids)
+            if cards:
+                results = self.render_cards(response)
+            else:
+                results = self.hydrate([int(hit.meta.id) for hit in response])
 
-            serializer = ProductSearchSerializer({
-                "results": products,
-                "page": page,
-                "total": total
-            })
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            data = {"results": results, "page": page, "total": total}
+            return Response(data, status=status.HTTP_200_OK)
 
         except Exception as e:
             logger.error(f"Search error: {str(e)}", exc_info=True)
             return Response(
                 {"message": "An error occurred while searching for products."},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+    def render_cards(self, response):
+        """
+        Search cards of the hits, in ranking order, rendered from their
+        `_source`. Hits indexed before the document carried the card fields
+        get their card prepared from the database instead, so every result
+        has the same shape; products gone from the database are left out.
+        """
+        sources = {}
+        for hit in response:
+            source = hit.to_dict(skip_empty=False)
+            source["id"] = int(hit.meta.id)
+            sources[source["id"]] = source
+        stale_ids = [product_id for product_id, source in sources.items()
+                     if "availability" not in source]
+        if stale_ids:
+            document = ProductDocument()
+            for product in document.get_queryset().filter(id__in=stale_ids):
+                sources[product.pk] = {**document.prepare(product), "id": product.pk}
+
+        card = ProductSearchResultSerializer()
+        return [card.to_representation(source) for source in sources.values()
+                if "availability" in source]
+
+    def hydrate(self, product_ids):
+        """
+        Full representations of the products (see `ProductListSerializer`)
+        in the order of `product_ids`; products gone from the database are
+        left out.
+        """
+        rows = ProductListSerializer.values(Product.objects.filter(id__in=product_ids))
+        items = {item["id"]: item for item in ProductListSerializer(rows).data}
+        return [items[product_id] for product_id in product_ids if product_id in items]
\ No newline at end of file